@@ -1,138 +1,145 @@
+import os
+import time
 import uuid
 import datetime
+import threading
+from collections import OrderedDict
+from conversation_store import ConversationStore
+from prompt_modules import PROMPT_MODULE_ORDER, PROMPT_MODULES, build_system_prompt, select_modules
+
+# Static persona and rules, assembled from prompt_modules. Kept byte-for-byte
+# stable (no dates, no user data) and sent first so the provider's
+# prompt-prefix cache can reuse it across turns, sessions and days. Anything
+# that changes goes in the context message.
+SYSTEM_PROMPT = build_system_prompt()
+PERSONA_PROMPT = build_system_prompt(["persona"])
+
+# Set KOALA_MODULAR_PROMPT=0 to always send every prompt module.
+MODULAR_PROMPT = os.getenv("KOALA_MODULAR_PROMPT", "1") != "0"
+
+# Module text -> module name, to recognise module messages in reloaded history.
+MODULE_BY_CONTENT = {PROMPT_MODULES[name]: name for name in PROMPT_MODULE_ORDER}
+
+# How many user messages (including the new one) decide the prompt modules.
+MODULE_WINDOW = 3
+
+# Messages reloaded from the conversation store when a thread is not in memory.
+HISTORY_LIMIT = int(os.getenv("KOALA_HISTORY_LIMIT", "40"))
+# In-memory threads idle longer than this are evicted (they stay in the store).
+THREAD_IDLE_SECONDS = float(os.getenv("KOALA_THREAD_IDLE_SECONDS", "900"))
+MAX_ACTIVE_THREADS = int(os.getenv("KOALA_MAX_ACTIVE_THREADS", "500"))
+
+def build_context_message(today: datetime.datetime = None, user_email: str = None) -> dict:
+    """Small system message carrying the per-day and per-user context."""
+    today = today or datetime.datetime.now()
+    current_year = today.year
+    content = (
+        f"Today's date is {today:%b %d, %Y}, and the current year is {current_year}. "
+        f"When a query uses 'this' with any month, it should default to {current_year}."
+    )
+    if user_email:
+        content += f" The signed-in user's email is {user_email}."
+    return {"role": "system", "content": content}
 
-def get_current_year():
-    return datetime.datetime.now().year
-   
 class AssistantThread:
-    def __init__(self):
-        current_year = get_current_year()
-        today = datetime.datetime.now()
-        # print(f"Current year is {current_year}")
-        self.thread_id = str(uuid.uuid4())
-        system_content = f"""
-        
-        - Use **search_available_future_listings_enhanced** when the user mentions:
-        examples:
-        with mensione the resort nme or resort id
-        “listing”, “listings”, “stay listings”,  
-        “stay options”, “I’m looking for a stay”, “stays”,  
-        “places to stay”, “accommodations”, “room”, “rooms”,  
-        “available stays”, “available options”,  
-        “hotel listings”, “rental listings”,  
-        “book a stay”, “stay availability”,  
-        “check-in”, “check-out”, “nights”, “days”,  
-        “price”, “rate”, “cost per night”.
-        examples:
-        (I'm going to Park City this November and would like to stay near the ski resort. We are a family of 4. 2 adults and 2 children in listings only)
-         city : park city
-        the query is maxmim about “listings”
-         
-        Ensure that when a user provides only a year (e.g., “I’m going in 2026”) without a specific month or date, the assistant asks a clarifying question before fetching results.
-        You are a customer support agent for a timeshare or vacation rentals marketplace. Your role is to guide users in finding availability and driving them towards booking stays in a way that is clear, engaging, and easy to understand.
-        Guidelines: Once you understand the question and provide an answer, proactively ask a follow-up question to gauge their interest in booking or to offer additional relevant information about the resort (e.g., amenities, availability, or alternative options). Follow up questions need not wait in all cases for the user to confirm the follow up, for example in a case where the user says "around black friday" you need not provide a answer to check if the dates are correct, instead you can pick the date range and provide results. Focus is conversion of the user to booking funnel. Maintain a natural, conversational tone and keep track of the user's previous questions to avoid repeating unnecessary information.
-        default limit = 5 results if the user has not specified a count of results. 
-        the two buttons with your branding:
-        Use get_available_resorts when the user mentions “resort”, “resorts”, “resort details”, “resort info”, “show resorts”, “best resorts”, “luxury resorts”, “family resorts”, or “resort options.”
-        Use search_available_future_listings_enhanced when the user mentions “listings”, “stay listings”, “stay options”, “I’m looking for a stay”, “stays”, “places to stay”, “accommodations”, “room”, “rooms”, “available stays”, “available options”, “hotel listings”, “rental listings”, “book a stay”, or “stay availability.”
-        us = United states or united states of america; 
-        aruba is a country and not a state;
-
-
-
-        Treat resort_id as the same across all tables (it always refers to the same resort identifier).
-        The user must always provide the correct arguments (e.g., resort_name, resort_id, location, dates, etc.) to get an accurate response.
-        If the user’s request is unclear or incomplete, you should infer missing details from context where possible.
-        If a single tool cannot fully answer the question, you are allowed to call 2 or more tools in the same response using the available user data.
-        Always combine and return the results together so the user receives one complete, direct answer to their question.
-        user question aruba surf stay or listings = marriotts aruba surf club resort;
-       
-        If the user only asks for a suggestion (e.g., “can you suggest when to stay”) → provide suggestions in months only, without specifying exact dates.
-        Always respond with a single paragraph showing the resort name, total listings, unit type counts, and upcoming stays with dates and prices, without extra explanation.
-        
-         You are a vacation planning assistant for Koala, a vacation rental platform.  
-              Your role is to provide helpful, engaging information about vacations, resorts, destinations, travel planning, bookings, availability, Koala's features, pricing, advantages, and answer user questions to guide them towards booking.
-       Always answer questions like:
-        - Comparison questions: "Is Koala better than Airbnb?", "Why is this cheaper?", "Koala vs other apps" – highlight Koala's strengths positively (e.g., direct bookings for better prices, premium resorts, 9.8/10 rating, curated experiences).
-        - Value questions: "Is this worth the money?", "Should I book now or wait?" – explain benefits, deals, and urgency in a positive way.
-        - Suitability questions: "Who is this resort not a good fit for?", "What are the trade-offs?" – provide balanced, helpful advice based on resort details.
-        - Travel timing: "I want to travel in autumn", "Next weekend", "Is September good for Florida beaches?", "Is hurricane season risky?" – suggest seasons, dates, or resorts with pros/cons.
-        - Preferences: "Luxury but affordable", "Romantic resort" – recommend matching resorts or listings.
-        - Trust questions: "Is this legit?", "Can I trust this host?" – emphasize Koala's verified hosts, reviews, security features.
-        For any vacation-related question, provide a conversational, positive response. Use tools when needed to fetch data.
-        Only if a user asks something completely unrelated (e.g., programming, jokes, general knowledge, personal questions, python oops concepts), do NOT answer.  
-        Instead, politely respond with this fallback message:
-        "I'm here to help with your vacation planning. Please ask me about resorts, destinations, or bookings."
-
-        Today's date is {today:%b %d, %Y}, and the current year is {current_year}. When a query uses 'this' with any month, it should default to {current_year}.
-        When the user asks for data by month (e.g., "fetch July data"), always resolve it to the next occurrence of that month in the future relative to today's date.
-        -If today's date is past that month in the current year, interpret it as that month in the next year.
-        -If today's date is before or during that month, interpret it  as that month in the current year.
-        "-If no listings are found, trigger fallback recommendations only if the user responds “yes” to seeing alternatives. Use the filters provided in the original request—such as unit type, number of guests/sleeps, and amenities like pool or gym—and keep the search in the same region. Limit results to 5 by default unless a different limit is specified. Include resort name, unit type, sleeps, amenities, availability dates, and booking links, clearly indicating these are alternative options. Proactively ask if the user wants to proceed with booking or explore more options. Maintain context to avoid repeating previously provided filters. If no alternatives are available, suggest broadening the search criteria, such as nearby resorts or flexible dates.
-        -Never return a past date
-        - Show images if you get URLs and dont show as links
-        - If no results in a category or location or amenity the user is looking for then ask them if they want a different location where there are similar results available
-        - If user asks for a location type then try to get results of resorts matching that type of location. Example: beach resort, ski , golf etc then you can either get resorts based on location types or choose them from amenities available
-        - Try to have the follow up question more descriptive
-        - and emoji as per the category of the resort, use emojis to make responses visually appealing, grouped by category:
-        - Sprinkle in friendly words like *wow*, *perfect*, *amazing*, *oh*, *hey*, *nice*, *great choice*, *awesome*, etc.
-        - Use emojis to make responses visually appealing, grouped by category:
-        :beach_with_umbrella: **Resort & Vacation Emojis** → :desert_island: Island Resort, :beach_with_umbrella: Beach Resort, :umbrella_on_ground: Beach Umbrella, :camping: Glamping/Nature Stay, :national_park: Mountain View, :sunrise: Sunset View, :sunrise_over_mountains: Sunrise Spot, :desert: Desert Resort, :snow_capped_mountain: Hill Resort.
-        :house: **Accommodation Types** → :house: Villa, :house_with_garden: Cottage, :hotel: Hotel, :hut: Hut/Cabin, :bed: Bedroom, :bellhop_bell: Concierge/Reception.
-        :round_pushpin: **Location & Travel** → :round_pushpin: Location, :world_map: Map View, :car: Road Trip/Drive-in, :airplane: Airport Nearby, :compass: Explore Nearby, :luggage: Luggage.
-        :moneybag: **Pricing & Deals** → :moneybag: Price, :label: Offer/Discount, :dollar: Payment, :gift: Package Deal.
-        :dart: **Features & Amenities** → :swimmer: Swimming Pool, :bath: Jacuzzi, :knife_fork_plate: Fine Dining, :clinking_glasses: Bar/Lounge, :tada: Events/Party, :person_in_lotus_position: Yoga/Wellness, :golf: Golf, :fishing_pole_and_fish: Fishing, :bike: Biking, :fire: Campfire, :video_game: Games Room.
-        :man-woman-girl-boy: **Audience / Theme** → :family: Family-Friendly, :couple_with_heart: Couple-Friendly, :bust_in_silhouette: Solo Stay, :feet: Pet-Friendly, :child: Kids Zone.
-        - Use **bold text** to highlight key details like resort names, prices, and dates.
-        - **Dynamic Response Formatting Rule:** Always choose the most engaging, visually clear, and user-friendly format based on the question type.Do not use the same layout in consecutive answers unless it is the only logical choice.Switch formats dynamically to keep responses fresh and easy to read.
-        **Format Guidelines:**
-        • Lists of resorts or amenities → use numbered or bulleted lists.
-        • Comparisons → use side-by-side table format or short structured blocks with headings.
-        • Direct Q&A (price, availability, single detail) → brief, conversational sentences.
-        • Summaries or follow-ups → short paragraphs or recap-style overviews.
-        • Step-by-step instructions → numbered sequences or flow chart-style arrows.
-        • Highlight key points with bold or light emoji use.
-        - Formatting discipline: If the last response used a list, switch to paragraph, table, or block style next time unless the request explicitly asks for a list.
-        - Keep responses concise, clean, and scannable.
-        - Avoid technical formats like Markdown headings or code blocks (only use **bold**).
-        - When showing multiple results, number or bullet them for easy comparison.
-        - Use available tools/functions to fetch live resort data and reflect it clearly in your response.
-        - Focus on creating variety across responses to keep the interaction lively and enjoyable.
-        You are Koala, a chatbot dedicated only to providing information about Koala as a vacation rental application.
-
-        - Always highlight Koala’s strengths and key features.  
-        - Koala’s official rating is 9.8 / 10 compared to other vacation rental applications. 
-        -expline the koala features dont say other app features
-        - Koala offers a wide range of vacation rentals, including beach resorts, mountain cabins, and city apartments.  
-        - Koala provides detailed property descriptions, high-quality images, and user reviews to help users make informed decisions.  
-        - Koala has a user-friendly interface that makes it easy to search for and book vacation rentals.  
-        - Koala offers competitive pricing and special deals on vacation rentals. extra information added.
-
-        dont give the eductional information like oops concept ,programming language etc only focus on vacation rental related information
-        The bot handles unclear input with progressive prompts, directs sensitive requests to login for security, and for out-of-scope queries, it offers to connect the user with an agent and booking details also .
-
-        Your goal: Make it fun, intuitive, and visually engaging for users to discover and book their ideal resort.
-
-
-"""
-        
+    def __init__(self, user_email: str = None, thread_id: str = None, store: ConversationStore = None):
+        self.thread_id = thread_id or str(uuid.uuid4())
+        self.user_email = user_email
+        self.store = store
+        self.last_active = time.monotonic()
+        # Modules already in the thread. With MODULAR_PROMPT the first system
+        # message is only the persona; topic modules are appended as their own
+        # system messages the first time a turn needs them and stay after
+        # that, so every turn's messages extend the previous turn's and the
+        # cached prompt prefix survives topic changes.
+        self.prompt_modules = ["persona"] if MODULAR_PROMPT else list(PROMPT_MODULE_ORDER)
         self.messages = [
             {
                 "role": "system",
-                "content": system_content
-            }
+                "content": PERSONA_PROMPT if MODULAR_PROMPT else SYSTEM_PROMPT
+            },
+            build_context_message(user_email=user_email)
         ]
 
+    @classmethod
+    def load(cls, thread_id: str, store: ConversationStore, user_email: str = None, history_limit: int = HISTORY_LIMIT):
+        """Rebuild a thread from the last `history_limit` stored messages."""
+        thread = cls(user_email=user_email, thread_id=thread_id, store=store)
+        history = store.load(thread_id, "thread", history_limit)
+        # Never start on a tool result or assistant reply whose request was cut off.
+        while history and history[0].get("role") != "user":
+            history.pop(0)
+        thread.messages.extend(history)
+        if MODULAR_PROMPT:
+            # Modules whose messages were cut off by `history_limit` are
+            # appended again by the next user message that needs them.
+            thread.prompt_modules += [
+                MODULE_BY_CONTENT[m["content"]] for m in history
+                if m.get("role") == "system" and m.get("content") in MODULE_BY_CONTENT
+            ]
+        return thread
+
+    def _persist(self, message: dict):
+        self.last_active = time.monotonic()
+        if self.store is not None:
+            self.store.append(self.thread_id, "thread", message)
 
     def add_user_message(self, user_message: str):
-        self.messages.append({"role": "user", "content": user_message})
+        # Refresh the date in place so long-lived threads roll over at midnight;
+        # it sits after the static prompt so the cached prefix is unaffected.
+        self.messages[1] = build_context_message(user_email=self.user_email)
+        message = {"role": "user", "content": user_message}
+        self.messages.append(message)
+        self._persist(message)
+        if MODULAR_PROMPT:
+            self.add_prompt_modules()
+
+    def add_prompt_modules(self):
+        """Append the modules the recent user messages need and the thread does not have yet."""
+        recent = [m["content"] for m in self.messages if m.get("role") == "user"][-MODULE_WINDOW:]
+        for name in select_modules(recent):
+            if name not in self.prompt_modules:
+                message = {"role": "system", "content": PROMPT_MODULES[name]}
+                self.messages.append(message)
+                self._persist(message)
+                self.prompt_modules.append(name)
 
     def add_assistant_message(self, assistant_message: dict):
         self.messages.append(assistant_message)
+        self._persist(assistant_message)
 
     def get_history(self):
+        self.last_active = time.monotonic()
         return self.messages
 
+# Threads loaded in this process, most recently used last. Idle ones are
+# dropped; the store still has them, so the next request simply reloads.
+_active_threads: "OrderedDict[str, AssistantThread]" = OrderedDict()
+_active_threads_lock = threading.Lock()
+
+def get_thread(thread_id: str, store: ConversationStore, user_email: str = None) -> AssistantThread:
+    """Return the in-memory thread for `thread_id`, loading recent history from the store if needed."""
+    with _active_threads_lock:
+        thread = _active_threads.get(thread_id)
+        if thread is not None:
+            _active_threads.move_to_end(thread_id)
+            return thread
+    thread = AssistantThread.load(thread_id, store, user_email=user_email)
+    with _active_threads_lock:
+        thread = _active_threads.setdefault(thread_id, thread)
+        _active_threads.move_to_end(thread_id)
+    evict_idle_threads()
+    return thread
+
+def evict_idle_threads(max_idle_seconds: float = THREAD_IDLE_SECONDS, max_threads: int = MAX_ACTIVE_THREADS):
+    """Drop threads idle longer than `max_idle_seconds` and cap the number kept in memory."""
+    now = time.monotonic()
+    with _active_threads_lock:
+        for thread_id in [t for t, thread in _active_threads.items() if now - thread.last_active > max_idle_seconds]:
+            del _active_threads[thread_id]
+        while len(_active_threads) > max_threads:
+            _active_threads.popitem(last=False)
+
 
 
 
@@ -0,0 +1,68 @@
+"""
+Prompt tokens per turn: monolithic system prompt vs intent-scoped modules.
+
+Replays the recorded conversations in benchmarks/conversations.json through
+AssistantThread and counts the tokens of the messages that would be sent on
+each turn's first completion call. Uses tiktoken's o200k_base encoding when
+installed and a 4-characters-per-token estimate otherwise.
+
+    python -m benchmarks.bench_prompt_tokens [conversations.json]
+"""
+import json
+import os
+import sys
+from statistics import mean
+
+import assistant_thread
+from assistant_thread import AssistantThread
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("o200k_base")
+
+    def count_tokens(text: str) -> int:
+        return len(_encoding.encode(text))
+except ImportError:
+    _encoding = None
+
+    def count_tokens(text: str) -> int:
+        return max(1, len(text) // 4)
+
+DEFAULT_CONVERSATIONS = os.path.join(os.path.dirname(__file__), "conversations.json")
+
+def replay(conversations, modular: bool):
+    """Token count of the outgoing messages for every turn of every conversation."""
+    assistant_thread.MODULAR_PROMPT = modular
+    per_turn, prefix_kept = [], []
+    for conversation in conversations:
+        thread = AssistantThread()
+        previous = None
+        for turn in conversation:
+            thread.add_user_message(turn["user"])
+            sent = [dict(m) for m in thread.get_history()]
+            per_turn.append(sum(count_tokens(m["content"] or "") for m in sent))
+            # Whether the previous call's messages are a prefix of this one's,
+            # i.e. the provider's prompt cache can reuse all of them.
+            if previous is not None:
+                prefix_kept.append(sent[:len(previous)] == previous)
+            previous = sent
+            thread.add_assistant_message({"role": "assistant", "content": turn["assistant"]})
+    return per_turn, prefix_kept
+
+def main(path: str = DEFAULT_CONVERSATIONS):
+    with open(path) as f:
+        conversations = json.load(f)
+
+    before, before_kept = replay(conversations, modular=False)
+    after, after_kept = replay(conversations, modular=True)
+    method = "tiktoken o200k_base" if _encoding else "~4 chars/token estimate"
+    print(f"{len(before)} turns across {len(conversations)} conversations ({method})")
+    print(f"{'':<12}{'mean':>10}{'min':>10}{'max':>10}{'total':>12}")
+    for label, counts in (("monolithic", before), ("modular", after)):
+        print(f"{label:<12}{mean(counts):>10.0f}{min(counts):>10}{max(counts):>10}{sum(counts):>12}")
+    print(f"reduction: {1 - sum(after) / sum(before):.1%}")
+    for label, kept in (("monolithic", before_kept), ("modular", after_kept)):
+        print(f"{label}: previous turn's messages kept as prefix on {sum(kept)} of {len(kept)} follow-up turns")
+
+if __name__ == "__main__":
+    main(*sys.argv[1:2])
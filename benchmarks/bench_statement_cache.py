@@ -0,0 +1,89 @@
+"""
+Micro-benchmark: per-call Python overhead of the hot tool queries.
+
+Compares the legacy ORM `Query` construction (rebuilt and re-keyed on every
+call) with the cached `lambda_stmt` statements now used by the tools. Runs
+against an empty temporary SQLite database so the numbers are dominated by
+statement construction, cache-key generation and compilation.
+
+    python -m benchmarks.bench_statement_cache [iterations]
+"""
+import os
+import sys
+import tempfile
+import timeit
+from datetime import datetime, timedelta
+
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+os.environ.pop("DATABASE_REPLICA_URLS", None)
+os.environ.pop("MYSQL_REPLICA_HOSTS", None)
+
+from sqlalchemy import func, cast, Numeric, and_
+from src.database.db import SessionLocal, engine
+from src.database.models import Base, PtRtListing, UnitType, ResortMigration
+from tools.search_tools import _future_listings_stmt
+from tools.resort_tools import _available_resorts_stmt
+
+Base.metadata.create_all(engine, tables=[
+    Base.metadata.tables[name] for name in
+    ("users", "resorts", "unit_types", "pt_rt_listings", "resort_migration")
+])
+
+def legacy_search(session):
+    query = (
+        session.query(
+            PtRtListing.id, PtRtListing.resort_id, PtRtListing.resort_name,
+            PtRtListing.resort_slug, PtRtListing.listing_check_in,
+            PtRtListing.listing_check_out, PtRtListing.listing_price_night,
+            PtRtListing.listing_cancelation_policy_option,
+            PtRtListing.listing_cancelation_date, PtRtListing.unit_type_name,
+            UnitType.sleeps, UnitType.name.label("unit_type_name_fallback")
+        )
+        .join(UnitType, PtRtListing.unit_type_id == UnitType.id)
+    )
+    today = datetime.combine(datetime.today().date(), datetime.min.time())
+    conditions = [
+        PtRtListing.resort_name.ilike("%Bonnet Creek%"),
+        PtRtListing.listing_check_in.between(today, today + timedelta(days=90))
+    ]
+    query = query.filter(and_(*conditions))
+    return query.order_by(cast(PtRtListing.listing_price_night, Numeric).asc()).limit(10).all()
+
+def cached_search(session):
+    return session.execute(_future_listings_stmt(resort_name="Bonnet Creek", limit=10)).all()
+
+def legacy_resorts(session):
+    listing_subq = (
+        session.query(PtRtListing.resort_id, func.count(PtRtListing.id).label("active_count"))
+        .filter(PtRtListing.listing_status == "active", PtRtListing.listing_has_deleted == 0)
+        .group_by(PtRtListing.resort_id)
+        .subquery()
+    )
+    query = (
+        session.query(ResortMigration, listing_subq.c.active_count)
+        .join(listing_subq, ResortMigration.resort_id == listing_subq.c.resort_id)
+        .filter(ResortMigration.resort_has_deleted == 0)
+        .filter(ResortMigration.resort_status == "active")
+        .filter(ResortMigration.city.ilike("%Orlando%"))
+    )
+    return query.order_by(listing_subq.c.active_count.desc()).limit(10).all()
+
+def cached_resorts(session):
+    return session.execute(_available_resorts_stmt(city="Orlando", limit=10)).all()
+
+CASES = [
+    ("search_available_future_listings_merged", legacy_search, cached_search),
+    ("get_available_resorts", legacy_resorts, cached_resorts),
+]
+
+def main(iterations: int = 2000):
+    print(f"{'query':<42}{'legacy µs':>12}{'cached µs':>12}{'speedup':>10}")
+    with SessionLocal() as session:
+        for name, legacy, cached in CASES:
+            legacy(session), cached(session)  # warm the compiled cache
+            before = timeit.timeit(lambda: legacy(session), number=iterations) / iterations * 1e6
+            after = timeit.timeit(lambda: cached(session), number=iterations) / iterations * 1e6
+            print(f"{name:<42}{before:>12.1f}{after:>12.1f}{before / after:>9.2f}x")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
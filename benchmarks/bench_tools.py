@@ -0,0 +1,172 @@
+"""
+Latency and SQL statement benchmarks for every tool in AVAILABLE_TOOLS.
+
+Each scale from benchmarks.seed runs in its own process against a freshly
+seeded SQLite database (the engine binds DATABASE_URL at import time).
+Every tool is called through call_tool with TOOL_CACHE cleared before each
+call, so cached tools are measured cold. Results are compared with
+benchmarks/baselines.json and the run fails when a tool's median latency
+regresses past --threshold (and by more than --min-delta-ms), or when it
+issues more statements per call than its baseline or its
+TOOL_QUERY_BUDGETS entry. p95 and p99 are reported but not gated: with a
+few dozen samples they are one or two outliers, and a GC pause or a
+scheduler hiccup flags a tool that has not changed.
+
+    python -m benchmarks.bench_tools                      # compare with baselines
+    python -m benchmarks.bench_tools --update-baseline    # record new baselines
+    python -m benchmarks.bench_tools --scales small --iterations 50
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BASELINE_PATH = Path(__file__).with_name("baselines.json")
+DEFAULT_SCALES = ("small", "medium", "large")
+
+# Arguments for every tool, chosen to hit rows that exist at every scale.
+BENCH_CALLS = {
+    "get_user_bookings": {"user_email": "user1@example.com"},
+    "get_available_resorts": {"country": "United States", "limit": 10},
+    "get_resort_details": {"resort_id": 1},
+    "search_available_future_listings_merged": {"resort_name": "Orlando", "limit": 10},
+    "search_available_future_listings_enhanced": {"limit": 10, "price_sort": "desc"},
+    "search_available_future_listings_enhanced_v2": {"resort_id": 2, "limit": 10},
+    "get_city_from_resort": {"resort_name": "Resort 1"},
+    "search_resorts_by_amenities": {"amenities": ["Outdoor Pool", "Hot Tub"], "match_all": False},
+    "search_resorts_near": {"place_name": "Orlando International Airport", "radius_miles": 50},
+    "search_resorts_semantic": {"query": "quiet family resort near the beach with a great pool"},
+    "get_price_stats": {"group_by": ["month"]},
+    "get_availability_calendar": {"resort_id": 1, "nights": 3},
+    "get_user_profile": {"user_email": "user1@example.com"},
+    "test_database_connection": {},
+    "get_database_url": {},
+    "book_resort_listing": {"listing_id": 1, "check_in": "2030-01-01", "check_out": "2030-01-04", "user_email": "user2@example.com"},
+    "get_payment_methods": {},
+    "get_cancellation_policy": {"listing_id": 1},
+}
+
+def _percentile(samples, q):
+    ordered = sorted(samples)
+    index = min(int(round(q / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+def run_scale(iterations: int, warmup: int):
+    """Benchmark every tool in this process; DATABASE_URL must already point at a seeded database."""
+    from src.database.db import count_statements
+    from tools import AVAILABLE_TOOLS, TOOL_QUERY_BUDGETS, call_tool
+    from tools.cache import TOOL_CACHE
+
+    missing = sorted(set(AVAILABLE_TOOLS) - set(BENCH_CALLS))
+    if missing:
+        raise SystemExit(f"No benchmark arguments for: {', '.join(missing)}")
+
+    results = {}
+    for name in sorted(AVAILABLE_TOOLS):
+        kwargs = BENCH_CALLS[name]
+        for _ in range(warmup):
+            TOOL_CACHE.invalidate()
+            call_tool(name, **kwargs)
+
+        timings, statements, errors = [], [], 0
+        for _ in range(iterations):
+            TOOL_CACHE.invalidate()
+            with count_statements() as counter:
+                started = time.perf_counter()
+                result = call_tool(name, **kwargs)
+                timings.append((time.perf_counter() - started) * 1000)
+            statements.append(counter[0])
+            if isinstance(result, dict) and "error" in result:
+                errors += 1
+
+        results[name] = {
+            "p50_ms": round(_percentile(timings, 50), 3),
+            "p95_ms": round(_percentile(timings, 95), 3),
+            "p99_ms": round(_percentile(timings, 99), 3),
+            "mean_ms": round(statistics.fmean(timings), 3),
+            "statements": max(statements),
+            "budget": TOOL_QUERY_BUDGETS.get(name),
+            "errors": errors
+        }
+    return results
+
+def bench_scale(scale: str, iterations: int, warmup: int):
+    """Seed a temporary database at `scale` and benchmark it in a child process."""
+    from benchmarks.seed import seed_database
+
+    url = f"sqlite:///{tempfile.mkdtemp()}/bench_{scale}.db"
+    seed_database(url, scale)
+    env = dict(os.environ, DATABASE_URL=url)
+    env.pop("DATABASE_REPLICA_URLS", None)
+    env.pop("MYSQL_REPLICA_HOSTS", None)
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_tools", "--worker", "--iterations", str(iterations), "--warmup", str(warmup)],
+        env=env, check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def compare(results, baselines, threshold: float, min_delta_ms: float):
+    """Return a list of human-readable regressions against the baselines and query budgets."""
+    regressions = []
+    for scale, tools in results.items():
+        for name, current in tools.items():
+            budget = current.get("budget")
+            if budget is not None and current["statements"] > budget:
+                regressions.append(f"{scale}/{name}: {current['statements']} statements > budget {budget}")
+            baseline = baselines.get(scale, {}).get(name)
+            if not baseline:
+                continue
+            allowed = max(baseline["p50_ms"] * (1 + threshold), baseline["p50_ms"] + min_delta_ms)
+            if current["p50_ms"] > allowed:
+                regressions.append(f"{scale}/{name}: p50 {current['p50_ms']:.2f}ms > baseline {baseline['p50_ms']:.2f}ms (+{threshold:.0%})")
+            if current["statements"] > baseline["statements"]:
+                regressions.append(f"{scale}/{name}: {current['statements']} statements > baseline {baseline['statements']}")
+            if current["errors"] > baseline.get("errors", 0):
+                regressions.append(f"{scale}/{name}: {current['errors']} errors > baseline {baseline.get('errors', 0)}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scales", nargs="+", default=list(DEFAULT_SCALES))
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed median regression, as a fraction")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0, help="median changes smaller than this are noise")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_scale(args.iterations, args.warmup)))
+        return
+
+    results = {}
+    for scale in args.scales:
+        results[scale] = bench_scale(scale, args.iterations, args.warmup)
+        print(f"\n{scale}")
+        print(f"{'tool':<46}{'p50':>9}{'p95':>9}{'p99':>9}{'stmts':>7}")
+        for name, row in results[scale].items():
+            print(f"{name:<46}{row['p50_ms']:>9.2f}{row['p95_ms']:>9.2f}{row['p99_ms']:>9.2f}{row['statements']:>7}")
+
+    baselines = json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else {}
+    if args.update_baseline:
+        baselines.update(results)
+        BASELINE_PATH.write_text(json.dumps(baselines, indent=2, sort_keys=True) + "\n")
+        print(f"\nBaselines written to {BASELINE_PATH}")
+        return
+
+    regressions = compare(results, baselines, args.threshold, args.min_delta_ms)
+    if regressions:
+        print("\nRegressions:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    print("\nNo regressions.")
+
+if __name__ == "__main__":
+    main()
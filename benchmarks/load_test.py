@@ -0,0 +1,242 @@
+"""
+Capacity test: N concurrent synthetic chat sessions against one process.
+
+Each session is an AssistantThread driven through chat_turn.run_turn, the
+same code path streamlit_app uses, with a scripted fake LLM (configurable
+latency, no network) and a freshly seeded database. Reports turn
+throughput, latency percentiles per phase (LLM, tools, render) and how
+saturated the database connection pool and the tool executor got.
+
+    python -m benchmarks.load_test --sessions 50 --turns 6 --scale medium
+    python -m benchmarks.load_test --sessions 200 --llm-latency-ms 800
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+# User messages and the tool calls the fake LLM answers them with.
+SCENARIOS = [
+    ("Show me resorts in Orlando", [("get_available_resorts", {"city": "Orlando", "limit": 5})]),
+    ("Compare resorts 1, 2 and 3", [("get_resort_details", {"resort_id": rid}) for rid in (1, 2, 3)]),
+    ("What are the cheapest listings in Las Vegas?", [("search_available_future_listings_merged", {"resort_name": "Las Vegas", "limit": 10})]),
+    ("Which resorts have a hot tub and a spa?", [("search_resorts_by_amenities", {"amenities": ["Hot Tub", "Spa"], "match_all": False})]),
+    ("When can I stay 4 nights at resort 5?", [("get_availability_calendar", {"resort_id": 5, "nights": 4})]),
+    ("Resorts near Orlando International Airport", [("search_resorts_near", {"place_name": "Orlando International Airport", "radius_miles": 40})]),
+    ("What is the cheapest month to visit?", [("get_price_stats", {"group_by": ["month"]})]),
+    ("Show my bookings", [("get_user_bookings", {"user_email": "{user_email}"})]),
+    ("How can I pay for a booking?", [("get_payment_methods", {})]),
+    ("Thanks, that helps!", []),
+]
+
+class _Obj(SimpleNamespace):
+    """Stand-in for OpenAI SDK models: attribute access plus model_dump()."""
+
+    def model_dump(self):
+        return {
+            key: value.model_dump() if isinstance(value, _Obj) else value
+            for key, value in vars(self).items()
+        }
+
+class FakeLLM:
+    """
+    Scripted chat.completions client. The first call of a turn returns the
+    scenario's tool calls, the call after the tool results returns text.
+    Latency is drawn from a normal distribution around `latency_ms`.
+    """
+
+    def __init__(self, latency_ms: float = 400, jitter_ms: float = 100, seed: int = 7):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.scripts = {message: calls for message, calls in SCENARIOS}
+        self.chat = _Obj(completions=_Obj(create=self.create))
+
+    def _sleep(self):
+        with self._lock:
+            delay = max(self._rng.gauss(self.latency_ms, self.jitter_ms), 0) / 1000
+        time.sleep(delay)
+
+    def create(self, model, messages, tools=None, tool_choice=None, **kwargs):
+        self._sleep()
+        last = messages[-1]
+        tool_calls = None
+        content = "Here is what I found for you."
+        if last["role"] == "user":
+            user_email = next((m["content"] for m in messages if m["role"] == "system" and "@" in (m["content"] or "")), "")
+            calls = self.scripts.get(last["content"], [])
+            if calls:
+                content = None
+                tool_calls = [
+                    _Obj(
+                        id=f"call_{uuid.uuid4().hex[:12]}",
+                        type="function",
+                        function=_Obj(name=name, arguments=json.dumps(args).replace("{user_email}", _email(user_email)))
+                    )
+                    for name, args in calls
+                ]
+        prompt_tokens = len(json.dumps(messages, default=str)) // 4 + len(json.dumps(tools or [])) // 4
+        completion_tokens = 60
+        usage = _Obj(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            total_tokens=prompt_tokens + completion_tokens,
+            prompt_tokens_details=_Obj(cached_tokens=0)
+        )
+        message = _Obj(role="assistant", content=content, tool_calls=tool_calls)
+        return _Obj(choices=[_Obj(message=message, finish_reason="tool_calls" if tool_calls else "stop")], usage=usage)
+
+def _email(context: str) -> str:
+    for word in context.split():
+        if "@" in word:
+            return word.strip(".,")
+    return "user1@example.com"
+
+def _percentiles(samples):
+    if not samples:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0}
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(int(round(q / 100 * (len(ordered) - 1))), len(ordered) - 1)] * 1000
+    return {"p50": pick(50), "p95": pick(95), "p99": pick(99)}
+
+class SaturationSampler(threading.Thread):
+    """Samples connection-pool use and the tool executor's queue depth."""
+
+    def __init__(self, session_factory, executor, interval: float = 0.01):
+        super().__init__(daemon=True)
+        self.session_factory = session_factory
+        self.executor = executor
+        self.interval = interval
+        self.samples = []
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.is_set():
+            pools = self.session_factory.pool_status()
+            in_use = sum(p["checked_out"] for p in pools)
+            capacity = sum(p["capacity"] for p in pools) or 1
+            self.samples.append((in_use / capacity, self.executor._work_queue.qsize()))
+            time.sleep(self.interval)
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+    def report(self):
+        if not self.samples:
+            return {}
+        usage = [s[0] for s in self.samples]
+        queued = [s[1] for s in self.samples]
+        return {
+            "pool_mean": statistics.fmean(usage),
+            "pool_max": max(usage),
+            "pool_full_fraction": sum(1 for u in usage if u >= 1.0) / len(usage),
+            "tool_queue_mean": statistics.fmean(queued),
+            "tool_queue_max": max(queued)
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sessions", type=int, default=20, help="concurrent chat sessions")
+    parser.add_argument("--turns", type=int, default=len(SCENARIOS), help="turns per session")
+    parser.add_argument("--scale", default="small", help="seed scale from benchmarks.seed")
+    parser.add_argument("--llm-latency-ms", type=float, default=400)
+    parser.add_argument("--llm-jitter-ms", type=float, default=100)
+    args = parser.parse_args()
+
+    # The engine binds DATABASE_URL at import, so seed and point at it first.
+    workdir = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/load.db"
+    os.environ.pop("DATABASE_REPLICA_URLS", None)
+    os.environ.pop("MYSQL_REPLICA_HOSTS", None)
+    from benchmarks.seed import SCALES, seed_database
+    seed_database(os.environ["DATABASE_URL"], args.scale)
+    users = SCALES[args.scale][2]
+
+    from assistant_thread import AssistantThread
+    from chat_turn import run_turn
+    from conversation_store import SQLiteConversationStore
+    from prefetch import PREFETCHER
+    from model_router import ROUTER
+    from src.database.db import SessionLocal
+    from tools import _tool_executor, SINGLE_FLIGHT
+    from tools.cache import TOOL_CACHE
+
+    llm = FakeLLM(args.llm_latency_ms, args.llm_jitter_ms)
+    store = SQLiteConversationStore(f"{workdir}/conversations.db")
+    phases = {"llm": [], "tools": [], "render": [], "turn": []}
+    errors = []
+    templated = []
+    lock = threading.Lock()
+
+    def session(index: int):
+        thread = AssistantThread(user_email=f"user{index % users + 1}@example.com", store=store)
+        for turn in range(args.turns):
+            message = SCENARIOS[(index + turn) % len(SCENARIOS)][0]
+            started = time.perf_counter()
+            try:
+                result = run_turn(llm, thread, message)
+            except Exception as e:
+                with lock:
+                    errors.append(repr(e))
+                continue
+            elapsed = time.perf_counter() - started
+            with lock:
+                for phase, seconds in result.timings.items():
+                    phases[phase].append(seconds)
+                phases["turn"].append(elapsed)
+                templated.append(result.templated)
+
+    sampler = SaturationSampler(SessionLocal, _tool_executor)
+    sampler.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.sessions) as pool:
+        list(pool.map(session, range(args.sessions)))
+    wall = time.perf_counter() - started
+    sampler.stop()
+
+    turns = len(phases["turn"])
+    print(f"{args.sessions} sessions x {args.turns} turns, scale={args.scale}, LLM {args.llm_latency_ms:g}±{args.llm_jitter_ms:g} ms")
+    print(f"{turns} turns in {wall:.1f}s: {turns / wall:.1f} turns/s, {len(errors)} errors")
+    print(f"\n{'phase':<10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for phase in ("llm", "tools", "render", "turn"):
+        p = _percentiles(phases[phase])
+        print(f"{phase:<10}{p['p50']:>10.1f}{p['p95']:>10.1f}{p['p99']:>10.1f}")
+    saturation = sampler.report()
+    if saturation:
+        print(
+            f"\nDB pool in use: mean {saturation['pool_mean']:.0%}, max {saturation['pool_max']:.0%}, "
+            f"full {saturation['pool_full_fraction']:.0%} of samples"
+        )
+        print(f"Tool executor queue: mean {saturation['tool_queue_mean']:.1f}, max {saturation['tool_queue_max']}")
+    cache, flights = TOOL_CACHE.stats(), SINGLE_FLIGHT.stats()
+    print(
+        f"Tool cache hit rate {cache['hit_rate']:.0%}; {flights['coalesced']} of "
+        f"{flights['executed'] + flights['coalesced']} submitted calls coalesced into in-flight calls"
+    )
+    print(f"{sum(templated)} of {turns} turns answered from templates without a final LLM call")
+    print(f"\n{'route':<16}{'model':<16}{'calls':>8}{'mean ms':>10}{'max ms':>10}")
+    for name, route in sorted(ROUTER.stats().items()):
+        print(f"{name:<16}{route['model']:<16}{route['calls']:>8}{route['mean_seconds'] * 1000:>10.1f}{route['max_seconds'] * 1000:>10.1f}")
+    prefetch = PREFETCHER.stats()
+    if prefetch["predictions"]:
+        print(
+            f"Prefetch: {prefetch['hits']} of {prefetch['predictions']} speculative calls used "
+            f"({prefetch['accuracy']:.0%}), {prefetch['wasted_seconds']:.1f}s wasted, "
+            f"{prefetch['coverage']:.0%} of tool turns predicted"
+        )
+    if errors:
+        print(f"\nFirst error: {errors[0]}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Deterministic seed data for benchmarking the tools against a local database.
+
+    python -m benchmarks.seed sqlite:///bench.db medium
+
+Creates the schema from src.database.models and fills it at one of the
+SCALES below. The same scale and seed always produce the same rows, so
+latency and statement counts are comparable between runs.
+"""
+import random
+import sys
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, insert
+from src.database.models import (
+    Base, User, Resort, ResortMigration, UnitType, Listing, PtRtListing, Amenity,
+    ResortAmenity, ResortImage, ResortReview, Booking, BookingMetrics,
+    EsPoiLocations, EsPlaceOfInterests, ResortLocationMaster, LocationType
+)
+
+# resorts, listings per resort, users
+SCALES = {
+    "small": (20, 20, 20),
+    "medium": (200, 50, 100),
+    "large": (1000, 100, 500),
+}
+
+CITIES = [
+    ("Orlando", "Florida", "United States", 28.54, -81.38),
+    ("Park City", "Utah", "United States", 40.65, -111.50),
+    ("Lahaina", "Hawaii", "United States", 20.88, -156.68),
+    ("Palm Beach", "Aruba", "Aruba", 12.57, -70.04),
+    ("Myrtle Beach", "South Carolina", "United States", 33.69, -78.89),
+    ("Las Vegas", "Nevada", "United States", 36.17, -115.14),
+]
+LOCATION_TYPES = ["Beach", "Ski", "Golf", "Lake", "Mountain", "City", "Theme Park"]
+AMENITIES = [
+    "Outdoor Pool", "Indoor Pool", "Fitness Center", "Hot Tub", "Free WiFi", "Kids Club",
+    "Spa", "Tennis Court", "Golf Course", "Restaurant", "Bar/Lounge", "BBQ Grill",
+    "Laundry Facilities", "Free Parking", "Pet Friendly", "Beach Access", "Ski Storage",
+    "Game Room", "Playground", "Full Kitchen",
+]
+UNIT_TYPES = [("Studio", "2"), ("1 Bedroom", "4"), ("2 Bedroom", "6"), ("3 Bedroom", "8")]
+REVIEW_TEXTS = [
+    "Quiet family resort with a great pool and friendly staff.",
+    "Steps from the beach, perfect for a romantic getaway.",
+    "Spacious units with a full kitchen, kids loved the game room.",
+    "Ski-in ski-out access and a hot tub after a long day.",
+    "Close to the theme parks, the shuttle was convenient.",
+]
+
+def seed_database(url: str, scale: str = "small", seed: int = 7) -> None:
+    resorts_count, listings_per_resort, users_count = SCALES[scale]
+    rng = random.Random(seed)
+    engine = create_engine(url)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+
+    today = datetime.combine(datetime.today().date(), datetime.min.time())
+    rows = {model: [] for model in (
+        User, Resort, ResortMigration, UnitType, Listing, PtRtListing, Amenity, ResortAmenity,
+        ResortImage, ResortReview, Booking, BookingMetrics, EsPoiLocations, EsPlaceOfInterests,
+        ResortLocationMaster, LocationType
+    )}
+
+    for uid in range(1, users_count + 1):
+        rows[User].append({"id": uid, "first_name": f"User{uid}", "last_name": "Bench", "email": f"user{uid}@example.com"})
+    for mid, name in enumerate(LOCATION_TYPES, start=1):
+        rows[ResortLocationMaster].append({"id": mid, "name": name})
+    for aid, name in enumerate(AMENITIES, start=1):
+        rows[Amenity].append({"id": aid, "name": name, "vrbo_name": name.lower(), "slug": name.lower().replace(" ", "-")})
+
+    for pid, (city, state, country, lat, lon) in enumerate(CITIES, start=1):
+        rows[EsPoiLocations].append({"id": pid, "name": city, "full_name": f"{city}, {state}", "city": city, "state": state, "country": country, "lattitude": str(lat), "longitude": str(lon)})
+        for category, term in ((1, f"{city} Old Town"), (2, f"{city} Grill House"), (3, f"{city} International Airport"), (4, f"{city} Central Station")):
+            rows[EsPlaceOfInterests].append({
+                "es_poi_location_id": pid, "location_category_id": category, "term": term, "full_term": term,
+                "city": city, "state": state, "lattitude": str(lat + rng.uniform(-0.1, 0.1)),
+                "longitude": str(lon + rng.uniform(-0.1, 0.1)), "description": f"{term} near {city}"
+            })
+
+    listing_id = unit_type_id = 0
+    for rid in range(1, resorts_count + 1):
+        city, state, country, lat, lon = CITIES[rid % len(CITIES)]
+        name = f"{rng.choice(['Club', 'Grand', 'Royal', 'Ocean', 'Summit'])} {city} Resort {rid}"
+        slug = name.lower().replace(" ", "-")
+        resort_lat, resort_lon = lat + rng.uniform(-0.3, 0.3), lon + rng.uniform(-0.3, 0.3)
+        resort_location_types = rng.sample(LOCATION_TYPES, 2)
+        location_types = ", ".join(resort_location_types)
+        rows[Resort].append({
+            "id": rid, "name": name, "creator_id": 1, "slug": slug, "address": f"{rid} Resort Way",
+            "city": city, "state": state, "country": country, "lattitude": str(resort_lat), "longitude": str(resort_lon),
+            "description": f"{name} is a {location_types.lower()} resort in {city} with {rng.choice(REVIEW_TEXTS).lower()}"
+        })
+        rows[ResortMigration].append({
+            "id": rid, "pt_rt_id": rid, "resort_id": rid, "resort_slug": slug, "resort_name": name,
+            "address": f"{rid} Resort Way", "location_types": location_types, "country": country,
+            "city": city, "state": state, "resort_status": "active", "resort_google_rating": rng.randint(3, 5)
+        })
+        for type_name in resort_location_types:
+            rows[LocationType].append({
+                "resort_id": rid, "resort_location_master_id": LOCATION_TYPES.index(type_name) + 1,
+                "types": type_name, "status": 1
+            })
+        for aid in rng.sample(range(1, len(AMENITIES) + 1), 8):
+            rows[ResortAmenity].append({"resort_id": rid, "amenity_id": aid})
+        for order in range(3):
+            rows[ResortImage].append({"resort_id": rid, "image": f"{slug}-{order}.jpg", "image_order": order})
+        for _ in range(5):
+            rows[ResortReview].append({"resort_id": rid, "author_name": "Guest", "rating": str(rng.randint(3, 5)), "text": rng.choice(REVIEW_TEXTS)})
+
+        resort_unit_types = []
+        for unit_name, sleeps in rng.sample(UNIT_TYPES, 3):
+            unit_type_id += 1
+            rows[UnitType].append({"id": unit_type_id, "resort_id": rid, "name": unit_name, "sleeps": sleeps})
+            resort_unit_types.append((unit_type_id, unit_name, sleeps))
+
+        for _ in range(listings_per_resort):
+            listing_id += 1
+            ut_id, unit_name, sleeps = rng.choice(resort_unit_types)
+            nights = rng.choice([3, 4, 5, 7])
+            check_in = today + timedelta(days=rng.randint(-30, 300))
+            check_out = check_in + timedelta(days=nights)
+            status = rng.choices(["active", "pending", "booked"], weights=[8, 1, 1])[0]
+            rows[Listing].append({
+                "id": listing_id, "resort_id": rid, "unit_type_id": ut_id, "nights": nights,
+                "check_in": check_in, "check_out": check_out, "status": status, "reservation_no": f"R{listing_id}"
+            })
+            rows[PtRtListing].append({
+                "id": listing_id, "listing_id": listing_id, "listing_price_night": str(rng.randint(79, 650)),
+                "listing_nights": nights, "listing_check_in": check_in, "listing_check_out": check_out,
+                "listing_cancelation_policy_option": rng.choice(["flexible", "moderate", "strict"]),
+                "listing_status": status, "listing_has_deleted": 0, "unit_type_id": ut_id,
+                "unit_type_name": unit_name, "unit_sleeps": sleeps, "resort_id": rid,
+                "resort_lattitude": str(resort_lat), "resort_longitude": str(resort_lon), "resort_slug": slug,
+                "resort_name": name, "resort_status": "active", "resort_location_types": location_types,
+                "resort_city": city, "resort_state": state, "resort_country": country,
+                "l_updated_at": today, "updated_at": today, "resort_updated_at": today
+            })
+
+    booking_id = 0
+    for uid in range(1, users_count + 1):
+        for listing in rng.sample(rows[Listing], 3):
+            booking_id += 1
+            rows[Booking].append({"id": booking_id, "unique_booking_code": f"B{booking_id:07d}", "owner_id": 1, "user_id": uid, "listing_id": listing["id"]})
+            rows[BookingMetrics].append({"booking_id": booking_id, "total_listing_price": 1000.0, "total_booking_price": 1100.0})
+
+    with engine.begin() as connection:
+        for model, values in rows.items():
+            if values:
+                connection.execute(insert(model), values)
+    engine.dispose()
+
+if __name__ == "__main__":
+    seed_database(sys.argv[1], *sys.argv[2:3])
@@ -0,0 +1,153 @@
+"""
+One chat turn, independent of the UI.
+
+run_turn sends the thread to the LLM, runs the requested tools through
+call_tool_many, asks the LLM for the final answer and returns the entries
+the UI should render together with per-phase timings. streamlit_app.main()
+and benchmarks.load_test both drive conversations through it; `client` is
+anything shaped like openai.OpenAI().
+
+While the first completion is in flight, PREFETCHER starts the tool calls
+the user message most likely leads to, so the real calls find their
+results in TOOL_CACHE (see prefetch.py).
+
+When every tool call of a turn has a template formatter (TEMPLATE_FORMATTERS
+in tools/__init__.py) the answer is rendered locally and the final LLM call
+is skipped. KOALA_TEMPLATE_RESPONSES=off always asks the model.
+
+Each completion's model comes from ROUTER (model_router.py, rules in
+model_routes.json) unless run_turn is given a model.
+"""
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+from assistant_thread import AssistantThread
+from model_router import ROUTER, RouteChoice
+from prefetch import PREFETCHER
+from src.database.db import write_scope
+from tools import ALL_FUNCTION_SCHEMAS, TEMPLATE_FORMATTERS, call_tool_many
+
+TEMPLATE_RESPONSES = os.getenv("KOALA_TEMPLATE_RESPONSES", "on").lower() not in ("0", "off", "false", "no")
+
+@dataclass
+class TurnResult:
+    # Chat entries to render, in order ("function_call" and "assistant").
+    ui_messages: List[Dict[str, Any]] = field(default_factory=list)
+    # Raw LLM responses, first call first.
+    responses: List[Any] = field(default_factory=list)
+    # Seconds spent per phase: "llm" (all completions), "tools" and
+    # "render" (serializing results and recording them on the thread).
+    timings: Dict[str, float] = field(default_factory=lambda: {"llm": 0.0, "tools": 0.0, "render": 0.0})
+    first_call_seconds: float = 0.0
+    # Route, model and seconds of each completion, parallel to responses.
+    completions: List[Tuple[RouteChoice, float]] = field(default_factory=list)
+    # The final answer was rendered from templates instead of an LLM call.
+    templated: bool = False
+
+    @property
+    def usages(self) -> List[Any]:
+        return [response.usage for response in self.responses if getattr(response, "usage", None)]
+
+def tool_result_to_json(result: Any) -> str:
+    if isinstance(result, dict):
+        return json.dumps(result, indent=2, default=str)
+    return json.dumps({"result": result}, indent=2, default=str)
+
+def templated_answer(calls: List[Tuple[str, Dict[str, Any]]], tool_results: List[Any]) -> Optional[str]:
+    """The locally rendered answer, or None unless every call's result has a template."""
+    parts = []
+    for (tool_name, arguments), tool_result in zip(calls, tool_results):
+        formatter = TEMPLATE_FORMATTERS.get(tool_name)
+        text = formatter(tool_result, arguments) if formatter else None
+        if not text:
+            return None
+        parts.append(text)
+    return "\n\n".join(parts) if parts else None
+
+def _complete(client, thread: AssistantThread, phase: str, model: Optional[str], result: TurnResult):
+    messages = thread.get_history()
+    choice = ROUTER.route(phase, messages)
+    if model:
+        choice = RouteChoice("fixed", model, phase, choice.complexity, choice.prompt_tokens)
+    started = time.perf_counter()
+    response = client.chat.completions.create(
+        model=choice.model,
+        messages=messages,
+        tools=ALL_FUNCTION_SCHEMAS,
+        tool_choice="auto"
+    )
+    seconds = time.perf_counter() - started
+    result.timings["llm"] += seconds
+    result.responses.append(response)
+    result.completions.append((choice, seconds))
+    ROUTER.record(choice, seconds, getattr(response, "usage", None))
+    return response.choices[0].message
+
+def run_turn(client, thread: AssistantThread, user_input: str, model: Optional[str] = None) -> TurnResult:
+    """
+    Answer one user message on `thread`, calling tools as the LLM asks.
+    `model` overrides the router for both completions. Reads after a write
+    in this thread stay on the primary (write_scope in src/database/db.py).
+    """
+    with write_scope(thread.thread_id):
+        return _run_turn(client, thread, user_input, model)
+
+def _run_turn(client, thread: AssistantThread, user_input: str, model: Optional[str]) -> TurnResult:
+    result = TurnResult()
+    thread.add_user_message(user_input)
+
+    speculation = PREFETCHER.speculate(user_input)
+    assistant_message = _complete(client, thread, "tools", model, result)
+    result.first_call_seconds = result.timings["llm"]
+    requested = [
+        (tool_call.function.name, json.loads(tool_call.function.arguments))
+        for tool_call in assistant_message.tool_calls or []
+    ]
+    PREFETCHER.resolve(speculation, requested)
+    thread.add_assistant_message({
+        "role": "assistant",
+        "content": assistant_message.content,
+        "tool_calls": assistant_message.tool_calls
+    })
+
+    if not assistant_message.tool_calls:
+        if assistant_message.content:
+            result.ui_messages.append({"type": "assistant", "content": assistant_message.content})
+        return result
+
+    # call_tool_many enforces each tool's deadline and retries transient
+    # database errors itself; timeouts come back as a result. Repeated calls
+    # to a batchable tool share one query.
+    started = time.perf_counter()
+    tool_results = call_tool_many(requested)
+    result.timings["tools"] += time.perf_counter() - started
+
+    started = time.perf_counter()
+    for tool_call, tool_result in zip(assistant_message.tool_calls, tool_results):
+        tool_result_str = tool_result_to_json(tool_result)
+        result.ui_messages.append({
+            "type": "function_call",
+            "function_name": tool_call.function.name,
+            "arguments": tool_call.function.arguments,
+            "result": tool_result_str
+        })
+        thread.add_assistant_message({
+            "role": "tool",
+            "tool_call_id": tool_call.id,
+            "content": tool_result_str
+        })
+    answer = templated_answer(requested, tool_results) if TEMPLATE_RESPONSES else None
+    result.templated = answer is not None
+    result.timings["render"] += time.perf_counter() - started
+
+    if answer is None:
+        answer = _complete(client, thread, "final", model, result).content
+    thread.add_assistant_message({
+        "role": "assistant",
+        "content": answer
+    })
+    if answer:
+        result.ui_messages.append({"type": "assistant", "content": answer})
+    return result
@@ -0,0 +1,117 @@
+"""
+Append-only conversation storage shared by every app replica.
+
+Each conversation is keyed by AssistantThread.thread_id and holds two
+streams: "thread" (the messages sent to the LLM) and "ui" (the chat entries
+rendered by Streamlit). Messages are only ever appended; readers load the
+most recent N so a replica that has never seen a session can pick it up
+cheaply. SQLite is the default backend, Redis (or anything speaking its
+list commands) is used when CONVERSATION_STORE_URL starts with redis://.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+
+def _to_jsonable(value: Any) -> Any:
+    # OpenAI SDK objects (tool_calls etc.) are pydantic models.
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def encode_message(message: Dict[str, Any]) -> str:
+    return json.dumps(message, default=_to_jsonable, ensure_ascii=False)
+
+class ConversationStore(ABC):
+    """Interface for conversation backends."""
+
+    @abstractmethod
+    def append(self, thread_id: str, stream: str, message: Dict[str, Any]) -> None:
+        """Append one message to a stream."""
+
+    @abstractmethod
+    def load(self, thread_id: str, stream: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Return the last `limit` messages of a stream (all of them when None), oldest first."""
+
+class SQLiteConversationStore(ConversationStore):
+    def __init__(self, path: str = "conversations.db"):
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS conversation_messages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    thread_id TEXT NOT NULL,
+                    stream TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    body TEXT NOT NULL
+                )
+                """
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS ix_conversation_messages_thread "
+                "ON conversation_messages (thread_id, stream, id)"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread; sqlite3 connections are not shareable.
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10)
+            self._local.connection = connection
+        return connection
+
+    def append(self, thread_id: str, stream: str, message: Dict[str, Any]) -> None:
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT INTO conversation_messages (thread_id, stream, created_at, body) VALUES (?, ?, ?, ?)",
+                (thread_id, stream, time.time(), encode_message(message))
+            )
+
+    def load(self, thread_id: str, stream: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        rows = self._connection().execute(
+            "SELECT body FROM conversation_messages WHERE thread_id = ? AND stream = ? "
+            "ORDER BY id DESC LIMIT ?",
+            (thread_id, stream, -1 if limit is None else limit)
+        ).fetchall()
+        return [json.loads(body) for (body,) in reversed(rows)]
+
+class RedisConversationStore(ConversationStore):
+    """Stores each stream as a Redis list; conversations expire after `ttl_seconds` idle."""
+
+    def __init__(self, url: str, ttl_seconds: int = 30 * 24 * 3600, prefix: str = "koala:conversation"):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CONVERSATION_STORE_URL points at Redis but the 'redis' package is not installed")
+        self.client = redis.Redis.from_url(url)
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+
+    def _key(self, thread_id: str, stream: str) -> str:
+        return f"{self.prefix}:{thread_id}:{stream}"
+
+    def append(self, thread_id: str, stream: str, message: Dict[str, Any]) -> None:
+        key = self._key(thread_id, stream)
+        pipeline = self.client.pipeline()
+        pipeline.rpush(key, encode_message(message))
+        pipeline.expire(key, self.ttl_seconds)
+        pipeline.execute()
+
+    def load(self, thread_id: str, stream: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        start = 0 if limit is None else -limit
+        return [json.loads(body) for body in self.client.lrange(self._key(thread_id, stream), start, -1)]
+
+def get_conversation_store(url: Optional[str] = None) -> ConversationStore:
+    """Build the store named by CONVERSATION_STORE_URL (sqlite:///path or redis://...)."""
+    url = url or os.getenv("CONVERSATION_STORE_URL", "sqlite:///conversations.db")
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisConversationStore(url)
+    if url.startswith("sqlite:///"):
+        return SQLiteConversationStore(url[len("sqlite:///"):])
+    raise ValueError(f"Unsupported CONVERSATION_STORE_URL: {url}")
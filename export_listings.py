@@ -0,0 +1,44 @@
+"""
+Export matching future listings as CSV.
+
+Streams rows from iter_future_listings (a server-side cursor fetching
+--batch-size rows at a time), so memory stays flat however many listings
+match. Filters are the listing search tool's.
+
+    python export_listings.py --resort-name "Bonnet Creek" --output listings.csv
+"""
+import argparse
+import csv
+import sys
+from tools.search_tools import iter_future_listings
+
+FIELDS = ["resort_id", "resort_name", "unit_type", "sleeps", "check_in", "check_out", "price", "url"]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--resort-name")
+    parser.add_argument("--resort-id", type=int)
+    parser.add_argument("--check-in", help="YYYY-MM-DD")
+    parser.add_argument("--check-out", help="YYYY-MM-DD")
+    parser.add_argument("--sort", choices=["asc", "desc"], default="asc", help="by price")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--output", help="CSV file (default stdout)")
+    args = parser.parse_args()
+
+    out = open(args.output, "w", newline="") if args.output else sys.stdout
+    try:
+        writer = csv.DictWriter(out, fieldnames=FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        count = 0
+        for listing in iter_future_listings(
+            args.resort_name, args.resort_id, args.check_in, args.check_out, args.sort, args.batch_size
+        ):
+            writer.writerow(listing)
+            count += 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"{count} listings exported", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
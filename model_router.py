@@ -0,0 +1,160 @@
+"""
+Per-call model selection.
+
+Every completion of a turn asks ROUTER.route() for a model. The rules are
+in model_routes.json (or KOALA_MODEL_ROUTES) as an ordered list of routes;
+the first route whose conditions all hold wins:
+
+    {"name": "final-simple", "phase": "final", "complexity": ["simple"],
+     "max_prompt_tokens": 4000, "model": "gpt-4.1-nano"}
+
+- phase: "tools" (the first call, which picks tools) or "final" (phrasing
+  the answer from tool results); omitted matches both.
+- complexity: levels of the latest user message (see complexity()).
+- min_prompt_tokens / max_prompt_tokens: bounds on the estimated prompt
+  size (about 4 characters per token, tool schemas not included).
+
+A route without conditions makes a good last entry; when nothing matches,
+"default_model" is used. The file also holds per-model prices, used by
+cost(). ROUTER.record() keeps per-route latency and token totals.
+Switching models between the two calls of a turn forfeits the provider's
+prompt-prefix cache for the second call, which the cost figures include.
+"""
+import json
+import os
+import re
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+from prompt_modules import classify_message
+from structured_logging import get_logger
+
+log = get_logger("router")
+
+ROUTES_PATH = os.getenv("KOALA_MODEL_ROUTES", os.path.join(os.path.dirname(os.path.abspath(__file__)), "model_routes.json"))
+DEFAULT_MODEL = "gpt-4o-mini"
+COMPLEXITY_LEVELS = ["simple", "moderate", "complex"]
+CHARS_PER_TOKEN = 4
+
+# Requests that combine or weigh several things.
+COMPARISON_WORDS = re.compile(
+    r"\b(compare|comparison|versus|vs\.?|difference|better|best|which one|between|cheapest|each|both|either|all of)\b",
+    re.IGNORECASE
+)
+CONSTRAINT_PATTERN = re.compile(r"\d+|\b(and|or|but|without|except|unless|within)\b", re.IGNORECASE)
+
+def complexity(message: str) -> str:
+    """
+    "simple", "moderate" or "complex" from the message's length, the number
+    of prompt topics it touches, comparison words and constraints (numbers,
+    conjunctions).
+    """
+    message = message or ""
+    score = len(message.split()) // 15
+    score += max(len(classify_message(message)) - 1, 0)
+    score += 2 * len(COMPARISON_WORDS.findall(message))
+    score += len(CONSTRAINT_PATTERN.findall(message)) // 2
+    if score <= 1:
+        return "simple"
+    return "moderate" if score <= 3 else "complex"
+
+def estimate_tokens(messages: List[Dict[str, Any]]) -> int:
+    return sum(len(message.get("content") or "") for message in messages) // CHARS_PER_TOKEN
+
+@dataclass
+class Route:
+    name: str
+    model: str
+    phase: Optional[str] = None
+    complexity: Optional[List[str]] = None
+    min_prompt_tokens: Optional[int] = None
+    max_prompt_tokens: Optional[int] = None
+
+    def matches(self, phase: str, level: str, prompt_tokens: int) -> bool:
+        return (
+            (self.phase is None or self.phase == phase)
+            and (self.complexity is None or level in self.complexity)
+            and (self.min_prompt_tokens is None or prompt_tokens >= self.min_prompt_tokens)
+            and (self.max_prompt_tokens is None or prompt_tokens <= self.max_prompt_tokens)
+        )
+
+@dataclass
+class RouteChoice:
+    route: str
+    model: str
+    phase: str
+    complexity: str
+    prompt_tokens: int
+
+class ModelRouter:
+    def __init__(self, routes: List[Route], default_model: str = DEFAULT_MODEL, prices: Optional[Dict[str, Dict[str, float]]] = None):
+        self.routes = routes
+        self.default_model = default_model
+        self.prices = prices or {}
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, Any]] = {}
+
+    @classmethod
+    def from_file(cls, path: str = ROUTES_PATH) -> "ModelRouter":
+        """Routes from `path`; a missing or invalid file routes everything to DEFAULT_MODEL."""
+        try:
+            with open(path) as f:
+                config = json.load(f)
+            routes = [Route(**route) for route in config.get("routes", [])]
+            for route in routes:
+                unknown = set(route.complexity or ()) - set(COMPLEXITY_LEVELS)
+                if unknown:
+                    raise ValueError(f"route {route.name}: unknown complexity {sorted(unknown)}")
+        except FileNotFoundError:
+            return cls([])
+        except (ValueError, TypeError) as e:
+            log.warning("model_routes_invalid", extra={"path": path, "error": str(e)})
+            return cls([])
+        return cls(routes, config.get("default_model", DEFAULT_MODEL), config.get("prices_per_million_tokens"))
+
+    def route(self, phase: str, messages: List[Dict[str, Any]]) -> RouteChoice:
+        """The model for a completion in `phase` ("tools" or "final") over `messages`."""
+        user_message = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+        level = complexity(user_message)
+        prompt_tokens = estimate_tokens(messages)
+        for route in self.routes:
+            if route.matches(phase, level, prompt_tokens):
+                return RouteChoice(route.name, route.model, phase, level, prompt_tokens)
+        return RouteChoice("default", self.default_model, phase, level, prompt_tokens)
+
+    def cost(self, model: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0) -> Optional[float]:
+        """Dollar cost of one completion, or None when the model has no price."""
+        price = self.prices.get(model)
+        if price is None:
+            return None
+        return (
+            (prompt_tokens - cached_tokens) * price["prompt"]
+            + cached_tokens * price.get("cached_prompt", price["prompt"])
+            + completion_tokens * price["completion"]
+        ) / 1_000_000
+
+    def record(self, choice: RouteChoice, seconds: float, usage: Any = None):
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        cached_tokens = getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", None) or 0
+        with self._lock:
+            stats = self._stats.setdefault(choice.route, {
+                "model": choice.model, "calls": 0, "seconds": 0.0, "max_seconds": 0.0,
+                "prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0
+            })
+            stats["calls"] += 1
+            stats["seconds"] += seconds
+            stats["max_seconds"] = max(stats["max_seconds"], seconds)
+            stats["prompt_tokens"] += prompt_tokens
+            stats["completion_tokens"] += completion_tokens
+            stats["cost"] += self.cost(choice.model, prompt_tokens, completion_tokens, cached_tokens) or 0.0
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per-route totals for this process, with the mean latency."""
+        with self._lock:
+            return {
+                route: dict(stats, mean_seconds=stats["seconds"] / stats["calls"])
+                for route, stats in self._stats.items()
+            }
+
+ROUTER = ModelRouter.from_file()
@@ -0,0 +1,320 @@
+"""
+Speculative tool prefetch while the first completion is in flight.
+
+The first LLM call of a turn takes a second or more, and the tool it asks
+for is often predictable from the user message ("listings at Bonnet Creek
+from 2026-11-01 to 2026-11-05"). Prefetcher.speculate() extracts entities
+locally (resort names and cities known to the geo index, ISO or
+month-name dates, amenity words) and starts the most likely read-only
+calls through call_tool, which leaves their results in TOOL_CACHE. When
+the completion arrives, resolve() compares the predictions with the tool
+calls the model actually made: a correct prediction still running is
+awaited instead of run twice, and the rest are counted as wasted.
+
+Wasted work is capped three ways: at most `max_per_turn` predictions per
+turn, at most `max_in_flight` speculative calls in the process, and when
+the accuracy over the last `window` predictions falls below
+`min_accuracy`, only one turn in `probe_every` speculates (so accuracy
+keeps being measured). Only tools that are both read-only and @cached are
+predicted, since nothing else can use the result. KOALA_PREFETCH=off
+turns it off.
+
+Prediction never touches the database on the turn's thread: the resort
+and city names come from the geo index's current view, and a stale index
+is refreshed in the background on the prefetch executor. Until the first
+refresh lands nothing is predicted.
+"""
+import contextvars
+import os
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+from prompt_modules import MODULE_KEYWORDS
+from structured_logging import get_logger
+from tools import AVAILABLE_TOOLS, TOOL_MODES, call_tool
+from tools.cache import cache_key
+from tools.geo_tools import RESORT_GEO_INDEX
+
+log = get_logger("prefetch")
+
+PREFETCH_ENABLED = os.getenv("KOALA_PREFETCH", "on").lower() not in ("0", "off", "false", "no")
+LISTING_TOOL = "search_available_future_listings_enhanced"
+DEFAULT_LIMIT = 5  # the system prompt's default result count
+
+MONTHS = {name: index for index, name in enumerate(
+    ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"], start=1
+)}
+ISO_DATE = re.compile(r"\b(\d{4})-(\d{1,2})-(\d{1,2})\b")
+MONTH_DATE = re.compile(
+    r"\b(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?\s+(\d{1,2})(?:st|nd|rd|th)?(?:,?\s+(\d{4}))?\b",
+    re.IGNORECASE
+)
+LISTING_WORDS = re.compile(r"\b(listings?|stays?|availab\w*|book\w*|nights?|prices?|rates?|cheap\w*|check[- ]?in)\b", re.IGNORECASE)
+RESORT_WORDS = re.compile(r"\bresorts?\b", re.IGNORECASE)
+# "near X" goes to search_resorts_near with a free-form place, not a city lookup.
+NEAR_WORDS = re.compile(r"\b(near|nearby|close to|around|within)\b", re.IGNORECASE)
+
+@dataclass
+class Entities:
+    resort: Optional[str] = None
+    city: Optional[str] = None
+    dates: List[str] = field(default_factory=list)
+    amenities: List[str] = field(default_factory=list)
+    wants_listings: bool = False
+    wants_resorts: bool = False
+    near: bool = False
+
+def _future_date(month: int, day: int, year: Optional[int]) -> Optional[str]:
+    today = date.today()
+    try:
+        value = date(year or today.year, month, day)
+        if year is None and value < today:
+            value = value.replace(year=today.year + 1)
+    except ValueError:
+        return None
+    return value.isoformat()
+
+def _dates(message: str) -> List[str]:
+    found = []
+    for match in ISO_DATE.finditer(message):
+        try:
+            found.append((match.start(), date(*map(int, match.groups())).isoformat()))
+        except ValueError:
+            pass
+    for match in MONTH_DATE.finditer(message):
+        value = _future_date(MONTHS[match.group(1).lower()[:3]], int(match.group(2)), int(match.group(3)) if match.group(3) else None)
+        if value:
+            found.append((match.start(), value))
+    return [value for _, value in sorted(found)]
+
+def _span(message: str, names: List[str]) -> Optional[str]:
+    """The longest of `names` in the message, as the user wrote it (the model tends to pass it on verbatim)."""
+    lowered = message.lower()
+    for name in sorted(names, key=len, reverse=True):
+        start = lowered.find(name)
+        if start >= 0 and (start == 0 or not lowered[start - 1].isalnum()):
+            end = start + len(name)
+            if end == len(lowered) or not lowered[end].isalnum():
+                return message[start:end]
+    return None
+
+class Gazetteer:
+    """Resort names (and their last two words, the repo's usual short form) and cities from the geo index."""
+
+    def __init__(self):
+        self._built_from = None
+        self.resorts: List[str] = []
+        self.cities: List[str] = []
+
+    def refresh(self):
+        """Rebuild from the geo index's current view; does not refresh the index itself."""
+        resorts = RESORT_GEO_INDEX.resorts
+        if resorts is self._built_from:
+            return
+        names, cities = set(), set()
+        for resort in resorts:
+            name = (resort["resort_name"] or "").strip().lower()
+            if name:
+                names.add(name)
+                words = name.split()
+                if len(words) > 2:
+                    names.add(" ".join(words[-2:]))
+            if resort["city"]:
+                cities.add(resort["city"].strip().lower())
+        self.resorts, self.cities, self._built_from = sorted(names), sorted(cities), resorts
+
+    def extract(self, message: str) -> Entities:
+        self.refresh()
+        amenity_pattern = MODULE_KEYWORDS["amenities"]
+        return Entities(
+            resort=_span(message, self.resorts),
+            city=_span(message, self.cities),
+            dates=_dates(message),
+            amenities=list(dict.fromkeys(match.group(0) for match in amenity_pattern.finditer(message))),
+            wants_listings=bool(LISTING_WORDS.search(message)),
+            wants_resorts=bool(RESORT_WORDS.search(message)),
+            near=bool(NEAR_WORDS.search(message))
+        )
+
+def predict(entities: Entities) -> List[Tuple[str, Dict[str, Any]]]:
+    """Likely tool calls for the entities, most likely first."""
+    calls = []
+    if entities.resort:
+        if len(entities.dates) >= 2:
+            calls.append((LISTING_TOOL, {
+                "resort_name": entities.resort, "listing_check_in": entities.dates[0],
+                "listing_check_out": entities.dates[1], "limit": DEFAULT_LIMIT
+            }))
+        elif entities.wants_listings:
+            calls.append((LISTING_TOOL, {"resort_name": entities.resort, "limit": DEFAULT_LIMIT}))
+        if entities.amenities:
+            calls.append(("get_resort_details", {"resort_name": entities.resort, "amenities_only": True}))
+        else:
+            calls.append(("get_resort_details", {"resort_name": entities.resort}))
+    elif entities.city and not entities.near:
+        if entities.wants_listings:
+            calls.append((LISTING_TOOL, {"resort_name": entities.city, "limit": DEFAULT_LIMIT}))
+        if entities.wants_resorts or not entities.wants_listings:
+            calls.append(("get_available_resorts", {"city": entities.city, "limit": DEFAULT_LIMIT}))
+    elif entities.amenities and entities.wants_resorts:
+        calls.append(("search_resorts_by_amenities", {"amenities": entities.amenities}))
+    return calls
+
+def call_key(tool_name: str, kwargs: Dict[str, Any]) -> Optional[str]:
+    """The TOOL_CACHE key a call would use (aliases of one function share it), or None if not cacheable."""
+    tool = AVAILABLE_TOOLS.get(tool_name)
+    if tool is None or TOOL_MODES.get(tool_name) != "read":
+        return None
+    return cache_key(tool, kwargs)
+
+@dataclass
+class Speculation:
+    # cache key -> (tool name, future of the call)
+    calls: Dict[str, Tuple[str, Any]] = field(default_factory=dict)
+    # cache key -> seconds the call took, set when it finishes
+    seconds: Dict[str, float] = field(default_factory=dict)
+
+class Prefetcher:
+    def __init__(
+        self,
+        max_per_turn: int = 2,
+        max_in_flight: int = 4,
+        window: int = 100,
+        min_accuracy: float = 0.2,
+        probe_every: int = 10,
+        hit_wait_seconds: float = 5.0
+    ):
+        self.max_per_turn = max_per_turn
+        self.min_accuracy = min_accuracy
+        self.probe_every = probe_every
+        self.hit_wait_seconds = hit_wait_seconds
+        self.gazetteer = Gazetteer()
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="prefetch")
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._lock = threading.Lock()
+        self._outcomes: deque = deque(maxlen=window)
+        self._refreshing = False
+        self._turns = 0
+        self.predictions = 0
+        self.hits = 0
+        self.wasted = 0
+        self.wasted_seconds = 0.0
+        self.capped = 0
+        self.throttled_turns = 0
+        self.turns_with_tools = 0
+        self.turns_predicted = 0
+
+    def accuracy(self) -> Optional[float]:
+        with self._lock:
+            return sum(self._outcomes) / len(self._outcomes) if self._outcomes else None
+
+    def _throttled(self) -> bool:
+        with self._lock:
+            self._turns += 1
+            accurate = len(self._outcomes) < self._outcomes.maxlen // 3 or sum(self._outcomes) / len(self._outcomes) >= self.min_accuracy
+            if accurate or self._turns % self.probe_every == 0:
+                return False
+            self.throttled_turns += 1
+            return True
+
+    def _refresh_index(self):
+        try:
+            RESORT_GEO_INDEX.ensure_fresh()
+            self.gazetteer.refresh()
+        except Exception as e:
+            log.warning("prefetch_index_refresh_failed", extra={"error": str(e)})
+        finally:
+            self._refreshing = False
+            self._slots.release()
+
+    def _refresh_in_background(self):
+        """Refresh a stale geo index on the executor, at most one refresh at a time."""
+        with self._lock:
+            if self._refreshing or not RESORT_GEO_INDEX.stale() or not self._slots.acquire(blocking=False):
+                return
+            self._refreshing = True
+        self._executor.submit(self._refresh_index)
+
+    def _run(self, speculation: Speculation, key: str, tool_name: str, kwargs: Dict[str, Any]):
+        started = time.perf_counter()
+        try:
+            return call_tool(tool_name, **kwargs)
+        finally:
+            speculation.seconds[key] = time.perf_counter() - started
+            self._slots.release()
+
+    def speculate(self, user_input: str) -> Speculation:
+        """Start the likely tool calls for `user_input` in the background."""
+        speculation = Speculation()
+        if not PREFETCH_ENABLED or self._throttled():
+            return speculation
+        self._refresh_in_background()
+        try:
+            calls = predict(self.gazetteer.extract(user_input or ""))
+        except Exception as e:
+            log.warning("prefetch_extract_failed", extra={"error": str(e)})
+            return speculation
+        for tool_name, kwargs in calls[:self.max_per_turn]:
+            key = call_key(tool_name, kwargs)
+            if key is None or key in speculation.calls:
+                continue
+            if not self._slots.acquire(blocking=False):
+                with self._lock:
+                    self.capped += 1
+                continue
+            # The turn's context carries its write scope into the speculative calls.
+            context = contextvars.copy_context()
+            speculation.calls[key] = (tool_name, self._executor.submit(context.run, self._run, speculation, key, tool_name, kwargs))
+        return speculation
+
+    def resolve(self, speculation: Speculation, tool_calls: List[Tuple[str, Dict[str, Any]]]):
+        """
+        Score the predictions against the calls the model made. Correct
+        predictions still running are awaited so the real calls hit the cache.
+        """
+        actual = {call_key(name, kwargs) for name, kwargs in tool_calls} - {None}
+        hits = [key for key in speculation.calls if key in actual]
+        pending = [speculation.calls[key][1] for key in hits if not speculation.calls[key][1].done()]
+        if pending:
+            wait(pending, timeout=self.hit_wait_seconds)
+
+        # Unused calls still running are not waited for; only finished ones count as wasted time.
+        wasted_seconds = sum(seconds for key, seconds in list(speculation.seconds.items()) if key not in actual)
+        with self._lock:
+            self.predictions += len(speculation.calls)
+            self.hits += len(hits)
+            self.wasted += len(speculation.calls) - len(hits)
+            self.wasted_seconds += wasted_seconds
+            self._outcomes.extend(key in actual for key in speculation.calls)
+            if actual:
+                self.turns_with_tools += 1
+                if hits:
+                    self.turns_predicted += 1
+        if speculation.calls:
+            log.debug("prefetch_resolved", extra={
+                "predicted": [tool_name for tool_name, _ in speculation.calls.values()],
+                "hits": len(hits),
+                "actual": len(actual)
+            })
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "predictions": self.predictions,
+                "hits": self.hits,
+                "wasted": self.wasted,
+                "wasted_seconds": round(self.wasted_seconds, 3),
+                "capped": self.capped,
+                "throttled_turns": self.throttled_turns,
+                # Share of predictions the model then made.
+                "accuracy": self.hits / self.predictions if self.predictions else None,
+                # Share of turns with cacheable tool calls where at least one was predicted.
+                "coverage": self.turns_predicted / self.turns_with_tools if self.turns_with_tools else None
+            }
+
+PREFETCHER = Prefetcher()
@@ -1,31 +1,284 @@
 import os
-from sqlalchemy import create_engine, text
+import time
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
+from structured_logging import get_logger
 
 load_dotenv()
 
+log = get_logger("db")
+
 def get_database_url():
     """Get database URL from environment variables."""
+    url = os.getenv("DATABASE_URL")
+    if url:
+        return url
+
     host = os.getenv("MYSQL_HOST", "localhost")
     user = os.getenv("MYSQL_USER", "root")
     password = os.getenv("MYSQL_PASSWORD", "")
     database = os.getenv("MYSQL_DATABASE", "koala_dev")
-    
+
     if password:
         return f"mysql+pymysql://{user}:{password}@{host}/{database}"
     else:
         return f"mysql+pymysql://{user}@{host}/{database}"
 
-DATABASE_URL = get_database_url()
-engine = create_engine(
-    DATABASE_URL,
-    echo=False,
-    pool_recycle=3600,
-    pool_pre_ping=True
-)
+def get_replica_urls() -> List[str]:
+    """
+    Get read-replica URLs from environment variables.
+
+    DATABASE_REPLICA_URLS takes a comma-separated list of full URLs.
+    MYSQL_REPLICA_HOSTS takes a comma-separated list of hosts that share
+    the primary's user, password and database.
+    """
+    urls = os.getenv("DATABASE_REPLICA_URLS")
+    if urls:
+        return [u.strip() for u in urls.split(",") if u.strip()]
+
+    hosts = [h.strip() for h in os.getenv("MYSQL_REPLICA_HOSTS", "").split(",") if h.strip()]
+    user = os.getenv("MYSQL_USER", "root")
+    password = os.getenv("MYSQL_PASSWORD", "")
+    database = os.getenv("MYSQL_DATABASE", "koala_dev")
+    credentials = f"{user}:{password}" if password else user
+    return [f"mysql+pymysql://{credentials}@{host}/{database}" for host in hosts]
+
+def _make_engine(url: str):
+    return create_engine(
+        url,
+        echo=False,
+        pool_recycle=3600,
+        pool_pre_ping=True
+    )
+
+# "read", "primary" or "write" for the tool call currently executing; only
+# "read" goes to replicas.
+_route: ContextVar[str] = ContextVar("db_route", default="write")
+
+@contextmanager
+def route(mode: str):
+    """Route sessions opened inside this block to replicas ("read") or the primary ("write")."""
+    token = _route.set(mode)
+    try:
+        yield
+    finally:
+        _route.reset(token)
+
+# Whose work is running (the chat thread id). A commit pins only this
+# scope's later reads to the primary; other sessions keep using replicas.
+_write_scope: ContextVar[Optional[str]] = ContextVar("db_write_scope", default=None)
+
+@contextmanager
+def write_scope(key: str):
+    """Attribute commits and reads inside this block to `key` for read-your-writes pinning."""
+    token = _write_scope.set(key)
+    try:
+        yield
+    finally:
+        _write_scope.reset(token)
+
+# Absolute time.monotonic() deadline for the tool call currently executing.
+_deadline: ContextVar[Optional[float]] = ContextVar("db_deadline", default=None)
+
+# MySQL error codes worth retrying: lost connection, lock wait timeout, deadlock.
+TRANSIENT_MYSQL_ERRORS = {2003, 2006, 2013, 1205, 1213}
+# Query execution was interrupted, maximum statement execution time exceeded.
+MYSQL_STATEMENT_TIMEOUT = 3024
+
+class DeadlineExceeded(Exception):
+    """Raised when a statement is about to run after its tool's deadline has passed."""
+
+@contextmanager
+def deadline(seconds: float):
+    """Give statements executed inside this block at most `seconds` in total."""
+    token = _deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+def remaining_time() -> Optional[float]:
+    """Seconds left before the current deadline, or None when no deadline is set."""
+    expires = _deadline.get()
+    if expires is None:
+        return None
+    return expires - time.monotonic()
+
+def _mysql_error_code(exc: BaseException) -> Optional[int]:
+    orig = getattr(exc, "orig", None)
+    args = getattr(orig, "args", None)
+    if args and isinstance(args[0], int):
+        return args[0]
+    return None
+
+def is_statement_timeout(exc: BaseException) -> bool:
+    return isinstance(exc, DeadlineExceeded) or _mysql_error_code(exc) == MYSQL_STATEMENT_TIMEOUT
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def is_transient_error(exc: BaseException) -> bool:
+    """True for connection drops, lock timeouts and deadlocks that are safe to retry."""
+    if not isinstance(exc, DBAPIError):
+        return False
+    if exc.connection_invalidated:
+        return True
+    if _mysql_error_code(exc) in TRANSIENT_MYSQL_ERRORS:
+        return True
+    return "database is locked" in str(exc.orig)
+
+# Statement counters for the blocks currently being measured (see count_statements).
+_statement_counters: ContextVar[Tuple[List[int], ...]] = ContextVar("db_statement_counters", default=())
+
+@contextmanager
+def count_statements():
+    """
+    Count SQL statements executed inside this block, on any engine.
+
+    Yields a one-element list holding the running count. Blocks may nest;
+    each counts everything inside it. Work handed to other threads with a
+    copied context is counted too.
+    """
+    counter = [0]
+    token = _statement_counters.set(_statement_counters.get() + (counter,))
+    try:
+        yield counter
+    finally:
+        _statement_counters.reset(token)
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    for counter in _statement_counters.get():
+        counter[0] += 1
+
+@event.listens_for(Engine, "before_cursor_execute", retval=True)
+def _apply_deadline(conn, cursor, statement, parameters, context, executemany):
+    remaining = remaining_time()
+    if remaining is None:
+        return statement, parameters
+    if remaining <= 0:
+        raise DeadlineExceeded("Tool deadline exceeded before the statement could run")
+    # MySQL aborts the SELECT server-side once the hint's budget is spent,
+    # which frees the connection even if the caller has already given up.
+    if conn.dialect.name == "mysql" and statement.lstrip()[:6].upper() == "SELECT":
+        head, _, tail = statement.lstrip().partition(" ")
+        statement = f"{head} /*+ MAX_EXECUTION_TIME({max(1, int(remaining * 1000))}) */ {tail}"
+    return statement, parameters
+
+class RoutingSessionFactory:
+    """
+    Session factory that sends read-only work to replicas and everything else to the primary.
+
+    Replicas are picked round-robin. A replica that fails its health check is
+    skipped for `retry_after` seconds. Reads issued within `read_your_writes`
+    seconds of a commit on the primary in the same write_scope() also stay on
+    the primary, so a lookup right after a booking sees the new row despite
+    replica lag. The pin is per process; tools that must see a user's writes
+    from any process (get_user_bookings) are routed to the primary outright.
+    """
+
+    def __init__(
+        self,
+        primary_url: str,
+        replica_urls: Optional[List[str]] = None,
+        health_interval: float = 5.0,
+        retry_after: float = 30.0,
+        read_your_writes: float = 5.0
+    ):
+        self.primary = _make_engine(primary_url)
+        self.replicas = [_make_engine(url) for url in (replica_urls or [])]
+        self.health_interval = health_interval
+        self.retry_after = retry_after
+        self.read_your_writes = read_your_writes
+
+        self._primary_factory = sessionmaker(autocommit=False, autoflush=False, bind=self.primary)
+        self._replica_factories = [
+            sessionmaker(autocommit=False, autoflush=False, bind=e) for e in self.replicas
+        ]
+        self._lock = threading.Lock()
+        self._next = 0
+        self._checked_at = [0.0] * len(self.replicas)
+        self._down_until = [0.0] * len(self.replicas)
+        # write scope -> time.monotonic() of its last commit
+        self._last_write: Dict[Optional[str], float] = {}
+
+        event.listen(self._primary_factory, "after_flush", self._on_flush)
+        event.listen(self._primary_factory, "after_commit", self._on_commit)
+
+    def __call__(self, **kwargs):
+        if _route.get() == "read":
+            index = self._pick_replica()
+            if index is not None:
+                return self._replica_factories[index](**kwargs)
+        return self._primary_factory(**kwargs)
+
+    def _pick_replica(self) -> Optional[int]:
+        if not self.replicas:
+            return None
+        if time.monotonic() - self._last_write.get(_write_scope.get(), 0.0) < self.read_your_writes:
+            return None
+        with self._lock:
+            start = self._next
+            self._next = (self._next + 1) % len(self.replicas)
+        for offset in range(len(self.replicas)):
+            index = (start + offset) % len(self.replicas)
+            if self._is_healthy(index):
+                return index
+        return None
+
+    def _is_healthy(self, index: int) -> bool:
+        now = time.monotonic()
+        if now < self._down_until[index]:
+            return False
+        if now - self._checked_at[index] < self.health_interval:
+            return True
+        try:
+            with self.replicas[index].connect() as connection:
+                connection.execute(text("SELECT 1"))
+            self._checked_at[index] = now
+            return True
+        except Exception as e:
+            log.warning("replica_health_check_failed", extra={"replica": index, "error": str(e)})
+            self._down_until[index] = now + self.retry_after
+            return False
+
+    def _on_flush(self, session, flush_context):
+        session.info["has_writes"] = True
+
+    def _on_commit(self, session):
+        if session.info.pop("has_writes", False):
+            self.mark_write()
+
+    def mark_write(self):
+        """Pin the current write scope's reads to the primary for the read-your-writes window."""
+        now = time.monotonic()
+        with self._lock:
+            self._last_write = {
+                scope: at for scope, at in self._last_write.items() if now - at < self.read_your_writes
+            }
+            self._last_write[_write_scope.get()] = now
+
+    def pool_status(self) -> List[dict]:
+        """Connections in use per engine, for capacity reports (primary first)."""
+        status = []
+        for name, eng in [("primary", self.primary)] + [(f"replica-{i}", e) for i, e in enumerate(self.replicas)]:
+            pool = eng.pool
+            if not hasattr(pool, "checkedout"):
+                continue
+            status.append({
+                "engine": name,
+                "checked_out": pool.checkedout(),
+                "capacity": pool.size() + max(getattr(pool, "_max_overflow", 0), 0)
+            })
+        return status
+
+DATABASE_URL = get_database_url()
+SessionLocal = RoutingSessionFactory(DATABASE_URL, get_replica_urls())
+engine = SessionLocal.primary
 
 def initialize_database():
     """Run once at startup to verify DB connection."""
@@ -34,5 +287,5 @@ def initialize_database():
             connection.execute(text("SELECT 1"))
         return True
     except Exception as e:
-        print(f"❌ Database initialization failed: {e}")
+        log.error("database_initialization_failed", extra={"error": str(e)})
         return False
@@ -264,6 +264,12 @@ class EsPoiLocations(Base):
     has_deleted = Column(Integer, nullable=False, default=0)
     place_of_interests = relationship("EsPlaceOfInterests", back_populates="location", cascade="all, delete-orphan")
 
+class ResortLocationMaster(Base):
+    __tablename__ = "resort_location_master"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    name = Column(String(255), nullable=False)
+    location_types = relationship("LocationType", back_populates="master")
+
 class LocationType(Base):
     __tablename__ = "location_types"
     id = Column(Integer, primary_key=True, autoincrement=True)
@@ -272,6 +278,7 @@ class LocationType(Base):
     types = Column(String(255), nullable=False)
     status = Column(Integer, default=1, nullable=False)
     resort = relationship("Resort", back_populates="location_types")
+    master = relationship("ResortLocationMaster", back_populates="location_types")
 
 class ResortReview(Base):
     __tablename__ = "resort_reviews"
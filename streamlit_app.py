@@ -4,14 +4,21 @@ Clean black background with white text interface.
 """
 import os
 import json
+from contextlib import nullcontext
 from threading import Thread
 import streamlit as st
 from typing import Dict, Any, List
 from openai import OpenAI
-from tools import call_tool, ALL_FUNCTION_SCHEMAS
+from tools import call_tool, ALL_FUNCTION_SCHEMAS, start_change_poller
+from chat_turn import run_turn
+from model_router import ROUTER
+from turn_profiler import profile_mode, profile_turn
+from structured_logging import get_logger, log_context
 from dotenv import load_dotenv
-from assistant_thread import AssistantThread
+from assistant_thread import AssistantThread, get_thread
+from conversation_store import get_conversation_store
 import time
+import uuid
 import base64
 import streamlit.components.v1 as components
 import time
@@ -26,6 +33,9 @@ import pandas as pd
 # Load environment variables
 load_dotenv()
 
+log = get_logger("app")
+start_change_poller()
+
 components.html(
     """
     <script>
@@ -104,18 +114,50 @@ components.html(
 
 
 GPT4_TURBO_PROMPT_PRICE = 0.00000015     # $0.15 per 1K prompt tokens
+GPT4_TURBO_CACHED_PROMPT_PRICE = 0.000000075 # $0.075 per 1M cached prompt tokens
 GPT4_TURBO_COMPLETION_PRICE = 0.00000060 # $0.60 per 1K completion tokens
 
 
-def calculate_cost(prompt_tokens: int, completion_tokens: int) -> float:
+def calculate_cost(prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0, model: str = None) -> float:
 
-    """Calculate the cost of OpenAI API usage."""
-    prompt_cost = prompt_tokens * GPT4_TURBO_PROMPT_PRICE
+    """Calculate the cost of OpenAI API usage (at `model`'s price in model_routes.json when it has one)."""
+    routed_cost = ROUTER.cost(model, prompt_tokens, completion_tokens, cached_tokens) if model else None
+    if routed_cost is not None:
+        return routed_cost
+    prompt_cost = (prompt_tokens - cached_tokens) * GPT4_TURBO_PROMPT_PRICE
+    prompt_cost += cached_tokens * GPT4_TURBO_CACHED_PROMPT_PRICE
     completion_cost = completion_tokens * GPT4_TURBO_COMPLETION_PRICE
     return prompt_cost + completion_cost
 
 
-    print("total:", prompt_tokens)
+def get_cached_tokens(usage) -> int:
+    """Prompt tokens served from the provider's prompt-prefix cache."""
+    details = getattr(usage, "prompt_tokens_details", None)
+    return getattr(details, "cached_tokens", None) or 0
+
+
+def track_usage(usage, choice=None, seconds: float = 0.0):
+    """Add one completion's token usage and cost to the session totals and to its route's."""
+    cached_tokens = get_cached_tokens(usage)
+    cost = calculate_cost(usage.prompt_tokens, usage.completion_tokens, cached_tokens, choice.model if choice else None)
+    st.session_state.total_tokens += usage.total_tokens
+    st.session_state.prompt_tokens += usage.prompt_tokens
+    st.session_state.cached_tokens += cached_tokens
+    st.session_state.total_cost += cost
+    if choice is not None:
+        route = st.session_state.route_stats.setdefault(choice.route, {"model": choice.model, "calls": 0, "seconds": 0.0, "tokens": 0, "cost": 0.0})
+        route["calls"] += 1
+        route["seconds"] += seconds
+        route["tokens"] += usage.total_tokens
+        route["cost"] += cost
+
+def route_stats_html() -> str:
+    """One line per model route used this session: calls, mean latency, tokens and cost."""
+    return "".join(
+        f"<div><strong>{name}</strong> ({route['model']}): {route['calls']}× "
+        f"{route['seconds'] / route['calls']:.2f}s, {route['tokens']:,} tok, ${route['cost']:.4f}</div>"
+        for name, route in sorted(st.session_state.route_stats.items())
+    )
 
 def display_cost_info():
     """Display cost information in a fixed position on the right side."""
@@ -139,9 +181,16 @@ def display_cost_info():
         <div>
             <strong>Cost:</strong> ${st.session_state.total_cost:.4f}
         </div>
+        <div>
+            <strong>Cached:</strong> {st.session_state.cached_tokens:,} ({st.session_state.cached_tokens / max(st.session_state.prompt_tokens, 1):.0%})
+        </div>
+        <div>
+            <strong>First call:</strong> {st.session_state.first_call_seconds:.2f}s
+        </div>
         <div>
             <strong>Messages:</strong> {len([m for m in st.session_state.messages if m['type'] == 'user'])}
         </div>
+        {route_stats_html()}
     </div>
     """, unsafe_allow_html=True)
 
@@ -604,12 +653,40 @@ st.markdown(
 
 
 
-# Initialize session state
+# Chat entries reloaded from the conversation store for a returning session.
+UI_HISTORY_LIMIT = 100
+# Only real chat entries are persisted; schema dumps are debug-only UI.
+PERSISTED_UI_TYPES = {"user", "assistant", "function_call"}
+
+
+@st.cache_resource
+def load_conversation_store():
+    """One conversation store per process, shared by all sessions."""
+    return get_conversation_store()
+
+
+# Initialize session state. The thread id lives in the URL so any replica
+# can resume the conversation from the shared store.
+if 'thread_id' not in st.session_state:
+    st.session_state.thread_id = st.query_params.get("thread") or str(uuid.uuid4())
+    st.query_params["thread"] = st.session_state.thread_id
+
 if 'messages' not in st.session_state:
-    st.session_state.messages = []
+    st.session_state.messages = load_conversation_store().load(
+        st.session_state.thread_id, "ui", UI_HISTORY_LIMIT
+    )
+
 
-if 'thread' not in st.session_state:
-    st.session_state.thread = AssistantThread()
+def get_session_thread() -> AssistantThread:
+    """This session's AssistantThread, loaded lazily and evicted from memory when idle."""
+    return get_thread(st.session_state.thread_id, load_conversation_store())
+
+
+def add_ui_message(message: dict):
+    """Append a chat entry to the UI history and persist it."""
+    st.session_state.messages.append(message)
+    if message["type"] in PERSISTED_UI_TYPES:
+        load_conversation_store().append(st.session_state.thread_id, "ui", message)
 
 if 'total_tokens' not in st.session_state:
     st.session_state.total_tokens = 0
@@ -617,6 +694,18 @@ if 'total_tokens' not in st.session_state:
 if 'total_cost' not in st.session_state:
     st.session_state.total_cost = 0.0
 
+if 'prompt_tokens' not in st.session_state:
+    st.session_state.prompt_tokens = 0
+
+if 'cached_tokens' not in st.session_state:
+    st.session_state.cached_tokens = 0
+
+if 'first_call_seconds' not in st.session_state:
+    st.session_state.first_call_seconds = 0.0
+
+if 'route_stats' not in st.session_state:
+    st.session_state.route_stats = {}
+
 if 'client' not in st.session_state:
     api_key = os.getenv("OPENAI_API_KEY")
     if api_key:
@@ -797,16 +886,16 @@ def display_schema(schema_name, schema_content):
 
 def execute_sql(query: str, db_path="mydb.sqlite"):
     """Execute a SQL query and return results, while printing the query."""
-    print("\n[LLM → SQL] Executing query:\n", query)  # 👈 print query in console
+    log.info("sql_query", extra={"payload": query})
 
     try:
         conn = sqlite3.connect(db_path)
         df = pd.read_sql_query(query, conn)
         conn.close()
-        print("[SQL → Result] Query executed successfully ✅")  # log success
+        log.info("sql_query_succeeded")
         return df
     except Exception as e:
-        print("[SQL → Error] ❌", str(e))  # log error
+        log.warning("sql_query_failed", extra={"error": str(e)})
         return {"error": str(e)}
         
 
@@ -892,9 +981,6 @@ def main():
     if 'schema_limit_counter' not in st.session_state:
         st.session_state.schema_limit_counter = 0
 
-    if 'thread' not in st.session_state:
-        st.session_state.thread = Thread()
-
     if 'chat_history' not in st.session_state:
         st.session_state.chat_history = []
 
@@ -951,7 +1037,7 @@ def main():
             st.session_state.last_processed_input = user_input
 
             # Add user message to chat history
-            st.session_state.messages.append({
+            add_ui_message({
                 "type": "user",
                 "content": user_input
             }) 
@@ -962,11 +1048,11 @@ def main():
         
         # Check if this is a simple greeting first
         greeting_response = handle_simple_greetings(user_input)
-        print("greeting_response",greeting_response)
+        log.debug("greeting_response", extra={"payload": greeting_response})
         
         if greeting_response:
             # Handle greeting locally without LLM call
-            st.session_state.messages.append({
+            add_ui_message({
                 "type": "assistant",
                 "content": greeting_response
             })
@@ -976,9 +1062,6 @@ def main():
             st.rerun()
             return
         
-        # Add to thread for LLM processing
-        st.session_state.thread.add_user_message(user_input)
-        
         # Process with OpenAI
 
         # 🔹 Immediately display the user message
@@ -1011,7 +1094,7 @@ def main():
                 include_schema = st.session_state.schema_limit_counter < 10
 
                 # Get message history
-                history = st.session_state.thread.get_history()
+                history = get_session_thread().get_history()
 
                 # if include_schema:
                 #     messages_to_send = history
@@ -1033,12 +1116,12 @@ def main():
                         st.session_state.schema_limit_counter += 1
 
                         # 🔹 Add schema & tools to chat history for UI rendering
-                        st.session_state.messages.append({
+                        add_ui_message({
                             "type": "schema",
                             "schema_name": "Function Schemas",
                             "schema_content": ALL_FUNCTION_SCHEMAS
                         })
-                        st.session_state.messages.append({
+                        add_ui_message({
                             "type": "tools",
                             "tools": ALL_FUNCTION_SCHEMAS
                         })
@@ -1050,124 +1133,39 @@ def main():
 
 #----------------------------------------------------
 
-                # First API call
-                response = st.session_state.client.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=st.session_state.thread.get_history(),
-                    tools=ALL_FUNCTION_SCHEMAS,
-                    tool_choice="auto"
-                    
-                )
-                print("response_1",response)
-                
-                assistant_message = response.choices[0].message
-                
-                # Track tokens and cost
-                if hasattr(response, 'usage') and response.usage:
-                    st.session_state.total_tokens += response.usage.total_tokens
-                    call_cost = calculate_cost(response.usage.prompt_tokens, response.usage.completion_tokens)
-                    st.session_state.total_cost += call_cost
-                
-                # Add assistant message to thread
-                st.session_state.thread.add_assistant_message({
-                    "role": "assistant",
-                    "content": assistant_message.content,
-                    "tool_calls": assistant_message.tool_calls
-                })
-                                
-                # Handle tool calls
-                if assistant_message.tool_calls:
-                    for tool_call in assistant_message.tool_calls:
-                        function_name = tool_call.function.name
-                        arguments = tool_call.function.arguments
-                        parsed_args = json.loads(arguments)
-                        for attempt in range(3):  # Retry up to 3 times
-                            try:
-                                tool_result = call_tool(function_name, **parsed_args)
-                                break
-                            except Exception as e:
-                                if attempt < 2:
-                                    #logger.warning(f"Attempt {attempt + 1} failed: {str(e)}. Retrying...")
-                                    time.sleep(2 ** attempt)  # Exponential backoff
-                                else:
-                                    raise
-
-
-                        # Convert result to JSON string
-                        if isinstance(tool_result, dict):
-                            tool_result_str = json.dumps(tool_result, indent=2, default=str)
-                        else:
-                            tool_result_str = json.dumps({"result": tool_result}, indent=2, default=str)
-                                            # Convert result to JSON string
-                        if isinstance(tool_result, dict):
-                            tool_result_str = json.dumps(tool_result, indent=2, default=str)
-                        else:
-                            tool_result_str = json.dumps({"result": tool_result}, indent=2, default=str)
-
-                        # Add function call to chat history with actual result
-                        st.session_state.messages.append({
-                            "type": "function_call",
-                            "function_name": function_name,
-                            "arguments": arguments,
-                            "result": tool_result_str
-                        })
-                        print("tool_result_str_1",tool_result_str)
-
-                        # Add tool response to thread
-                        st.session_state.thread.add_assistant_message({
-                            "role": "tool",
-                            "tool_call_id": tool_call.id,
-                            "content": tool_result_str
-                        })
-
-                    # Use same schema rule for final response (don’t include after limit)
-                    if st.session_state.schema_limit_counter < 10:
-                        final_messages_to_send = st.session_state.thread.get_history()
-                        final_tools_to_send = ALL_FUNCTION_SCHEMAS
-                    else:
-                        schema_messages = st.session_state.thread.get_history()[:3]
-                        recent_messages = st.session_state.thread.get_history()[-6:]
-                        final_messages_to_send = schema_messages + recent_messages
-                        final_tools_to_send = []
-
-                    # Get final response
-                    final_response = st.session_state.client.chat.completions.create(
-                        model="gpt-4o-mini",
-                        messages=st.session_state.thread.get_history(),
-                        tools=ALL_FUNCTION_SCHEMAS,
-                        tool_choice="auto"
-                    )
-                    final_message = final_response.choices[0].message
-
-                    # Track tokens for final response
-                    if hasattr(final_response, 'usage') and final_response.usage:
-                        st.session_state.total_tokens += final_response.usage.total_tokens
-                        final_cost = calculate_cost(final_response.usage.prompt_tokens, final_response.usage.completion_tokens)
-                        st.session_state.total_cost += final_cost
-
-                    # Add final assistant message
-                    st.session_state.thread.add_assistant_message({
-                        "role": "assistant",
-                        "content": final_message.content
+                # The turn itself (LLM calls and tools) runs outside the UI;
+                # here we only record usage and render what it produced.
+                with log_context(thread_id=st.session_state.thread_id, turn_id=uuid.uuid4().hex[:12]):
+                    turn_started = time.perf_counter()
+                    # KOALA_PROFILE (or ?profile=1 when KOALA_PROFILE_ALLOW_QUERY is set) profiles the turn.
+                    mode = profile_mode(st.query_params.get("profile"))
+                    with profile_turn(st.session_state.thread_id, mode) if mode else nullcontext():
+                        result = run_turn(st.session_state.client, get_session_thread(), user_input)
+                    st.session_state.first_call_seconds = result.first_call_seconds
+                    for response, (choice, seconds) in zip(result.responses, result.completions):
+                        if getattr(response, "usage", None):
+                            track_usage(response.usage, choice, seconds)
+                    log.info("llm_response", extra={"payload": result.responses[0]})
+
+                    for message in result.ui_messages:
+                        add_ui_message(message)
+                        if message["type"] == "function_call":
+                            log.info("tool_result", extra={"tool": message["function_name"], "payload": message["result"]})
+
+                    if len(result.responses) > 1:
+                        log.info("final_message", extra={"payload": result.responses[-1].choices[0].message})
+
+                    log.info("turn_completed", extra={
+                        "tool_calls": sum(1 for m in result.ui_messages if m["type"] == "function_call"),
+                        "templated": result.templated,
+                        "routes": [choice.route for choice, _ in result.completions],
+                        "first_call_ms": round(result.first_call_seconds * 1000, 1),
+                        "llm_ms": round(result.timings["llm"] * 1000, 1),
+                        "tools_ms": round(result.timings["tools"] * 1000, 1),
+                        "render_ms": round(result.timings["render"] * 1000, 1),
+                        "turn_ms": round((time.perf_counter() - turn_started) * 1000, 1)
                     })
 
-                    print("final_message_1",final_message)
-
-                    # Add to chat history
-                    if final_message.content:
-                        st.session_state.messages.append({
-                            "type": "assistant",
-                            "content": final_message.content
-                        })
-
-                else:
-                    # No function calls, just add the response
-                    if assistant_message.content:
-                        st.session_state.messages.append({
-                            "type": "assistant",
-                            "content": assistant_message.content
-                        })
-
                 # Clear the input for next message by incrementing counter
                 st.session_state.input_counter += 1
                 st.rerun()
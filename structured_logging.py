@@ -0,0 +1,147 @@
+"""
+Queue-backed structured logging.
+
+Request threads only put records on a queue; a QueueListener thread
+formats them as one JSON object per line and writes them to stdout or
+KOALA_LOG_FILE. Formatting (including repr/JSON of large payloads) happens
+on the listener thread, never on the turn's thread.
+
+Records carry `thread_id` and `turn_id` from log_context(), plus any
+extra fields passed by the caller (timings, tool names, ...). A `payload`
+extra is truncated to KOALA_LOG_MAX_PAYLOAD characters, and records with a
+payload are kept at KOALA_LOG_PAYLOAD_SAMPLE_RATE; warnings and errors are
+never sampled.
+
+    log = get_logger("app")
+    with log_context(thread_id=thread.thread_id, turn_id=turn_id):
+        log.info("turn_completed", extra={"llm_ms": 812.4, "tools_ms": 35.1})
+        log.info("llm_response", extra={"payload": response})
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+
+DEFAULT_MAX_PAYLOAD_CHARS = 2000
+DEFAULT_PAYLOAD_SAMPLE_RATE = 0.1
+
+# Attributes every LogRecord has; anything else on a record is an extra field.
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_log_context: ContextVar[Dict[str, Any]] = ContextVar("log_context", default={})
+
+@contextmanager
+def log_context(**fields):
+    """Attach fields (thread_id, turn_id, ...) to every record logged inside this block."""
+    token = _log_context.set({**_log_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _log_context.reset(token)
+
+def _to_jsonable(value: Any) -> Any:
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    return repr(value)
+
+def truncate(value: Any, limit: int = DEFAULT_MAX_PAYLOAD_CHARS) -> str:
+    text = value if isinstance(value, str) else json.dumps(value, default=_to_jsonable, ensure_ascii=False)
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}… [{len(text) - limit} more chars]"
+
+class JsonFormatter(logging.Formatter):
+    def __init__(self, max_payload_chars: int = DEFAULT_MAX_PAYLOAD_CHARS):
+        super().__init__()
+        self.max_payload_chars = max_payload_chars
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "event": record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key in _RECORD_ATTRIBUTES:
+                continue
+            entry[key] = truncate(value, self.max_payload_chars) if key == "payload" else value
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=_to_jsonable, ensure_ascii=False)
+
+class ContextFilter(logging.Filter):
+    """Runs on the calling thread: adds log_context() fields and samples payload records."""
+
+    def __init__(self, payload_sample_rate: float = DEFAULT_PAYLOAD_SAMPLE_RATE):
+        super().__init__()
+        self.payload_sample_rate = payload_sample_rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if (
+            record.levelno < logging.WARNING
+            and hasattr(record, "payload")
+            and self.payload_sample_rate < 1.0
+            and random.random() >= self.payload_sample_rate
+        ):
+            return False
+        for key, value in _log_context.get().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    QueueHandler that leaves formatting to the listener thread.
+
+    The stdlib handler formats in prepare(), i.e. on the calling thread;
+    here only the exception text is rendered eagerly (tracebacks hold
+    frames), the message and payload are formatted by the listener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+_setup_lock = threading.Lock()
+_listener: Optional[QueueListener] = None
+
+def setup_logging(stream=None) -> None:
+    """
+    Start the listener and route the "koala" logger through the queue.
+    Idempotent; the KOALA_LOG_* variables are read on the first call.
+    """
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return
+        path = os.getenv("KOALA_LOG_FILE")
+        output = logging.FileHandler(path, encoding="utf-8") if path else logging.StreamHandler(stream or sys.stdout)
+        output.setFormatter(JsonFormatter(int(os.getenv("KOALA_LOG_MAX_PAYLOAD", DEFAULT_MAX_PAYLOAD_CHARS))))
+        records: queue.SimpleQueue = queue.SimpleQueue()
+        handler = DeferredQueueHandler(records)
+        handler.addFilter(ContextFilter(float(os.getenv("KOALA_LOG_PAYLOAD_SAMPLE_RATE", DEFAULT_PAYLOAD_SAMPLE_RATE))))
+
+        root = logging.getLogger("koala")
+        root.setLevel(os.getenv("KOALA_LOG_LEVEL", "INFO").upper())
+        root.addHandler(handler)
+        root.propagate = False
+
+        _listener = QueueListener(records, output, respect_handler_level=False)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+def get_logger(name: str) -> logging.Logger:
+    setup_logging()
+    return logging.getLogger(f"koala.{name}")
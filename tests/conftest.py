@@ -0,0 +1,28 @@
+"""
+Every test session runs against a throwaway SQLite database.
+
+src.database.db binds DATABASE_URL when it is first imported, so the URL is
+set here, before any test imports tools. Replica settings are blanked (not
+removed, so a local .env cannot fill them back in) and the change poller is
+off; tests that need replicas build their own RoutingSessionFactory.
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+DATABASE_URL = f"sqlite:///{tempfile.mkdtemp()}/test.db"
+os.environ["DATABASE_URL"] = DATABASE_URL
+os.environ["DATABASE_REPLICA_URLS"] = ""
+os.environ["MYSQL_REPLICA_HOSTS"] = ""
+os.environ["KOALA_CHANGE_POLL_SECONDS"] = "0"
+
+@pytest.fixture(scope="session")
+def seeded_database() -> str:
+    """DATABASE_URL, filled with the benchmarks' "small" seed."""
+    from benchmarks.seed import seed_database
+    seed_database(DATABASE_URL, "small")
+    return DATABASE_URL
@@ -0,0 +1,63 @@
+"""
+RoutingSessionFactory with a primary and a replica as two local SQLite files.
+
+Each file has a one-row `origin` table naming itself, so a query shows
+which database a session was bound to.
+"""
+import pytest
+from sqlalchemy import Column, String, create_engine, text
+from sqlalchemy.orm import declarative_base
+from src.database.db import RoutingSessionFactory, route, write_scope
+
+Base = declarative_base()
+
+class Origin(Base):
+    __tablename__ = "origin"
+    name = Column(String, primary_key=True)
+
+def _database(path, name: str) -> str:
+    url = f"sqlite:///{path / name}.db"
+    with create_engine(url).begin() as connection:
+        Base.metadata.create_all(connection)
+        connection.execute(text("INSERT INTO origin VALUES (:name)"), {"name": name})
+    return url
+
+def _origin(factory: RoutingSessionFactory) -> str:
+    with factory() as session:
+        return session.execute(text("SELECT name FROM origin ORDER BY rowid LIMIT 1")).scalar()
+
+def _write(factory: RoutingSessionFactory):
+    with factory() as session:
+        session.add(Origin(name="booking"))
+        session.commit()
+
+@pytest.fixture
+def factory(tmp_path):
+    return RoutingSessionFactory(_database(tmp_path, "primary"), [_database(tmp_path, "replica")], read_your_writes=60.0)
+
+def test_reads_go_to_the_replica(factory):
+    with route("read"):
+        assert _origin(factory) == "replica"
+
+def test_writes_and_primary_reads_go_to_the_primary(factory):
+    with route("write"):
+        assert _origin(factory) == "primary"
+    with route("primary"):
+        assert _origin(factory) == "primary"
+
+def test_reads_after_a_write_are_pinned_to_the_primary_in_that_scope_only(factory):
+    with write_scope("thread-a"):
+        with route("write"):
+            _write(factory)
+        with route("read"):
+            assert _origin(factory) == "primary"
+    with write_scope("thread-b"), route("read"):
+        assert _origin(factory) == "replica"
+
+def test_failing_replica_falls_back_to_the_primary(tmp_path):
+    # SQLite cannot open a file in a directory that does not exist, so the health check fails.
+    factory = RoutingSessionFactory(_database(tmp_path, "primary"), [f"sqlite:///{tmp_path}/missing/replica.db"])
+    with route("read"):
+        assert _origin(factory) == "primary"
+        assert _origin(factory) == "primary"
+    assert factory._down_until[0] > 0
@@ -0,0 +1,41 @@
+"""
+Statements per tool call against TOOL_QUERY_BUDGETS.
+
+Each budgeted tool is called through call_tool with the benchmark's
+arguments, at several limits where it takes one, and the statements are
+counted with db.count_statements(). An N+1 query shows up as a count that
+grows with the limit and fails here. Every call is made once first, so
+in-memory indexes are built before counting, and TOOL_CACHE is cleared
+before each counted call so cached tools hit the database.
+"""
+import inspect
+import pytest
+from benchmarks.bench_tools import BENCH_CALLS
+from src.database.db import count_statements
+from tools import AVAILABLE_TOOLS, TOOL_QUERY_BUDGETS, call_tool
+from tools.cache import TOOL_CACHE, is_error_result
+
+LIMITS = (1, 5, 20)
+
+def _cases():
+    for name in sorted(TOOL_QUERY_BUDGETS):
+        if "limit" in inspect.signature(AVAILABLE_TOOLS[name]).parameters:
+            for limit in LIMITS:
+                yield pytest.param(name, dict(BENCH_CALLS[name], limit=limit), id=f"{name}-limit{limit}")
+        else:
+            yield pytest.param(name, BENCH_CALLS[name], id=name)
+
+def test_every_tool_has_a_budget():
+    assert sorted(AVAILABLE_TOOLS) == sorted(TOOL_QUERY_BUDGETS)
+
+@pytest.mark.parametrize("name,kwargs", list(_cases()))
+def test_statements_within_budget(seeded_database, name, kwargs):
+    TOOL_CACHE.invalidate()
+    call_tool(name, **kwargs)
+
+    TOOL_CACHE.invalidate()
+    with count_statements() as statements:
+        result = call_tool(name, **kwargs)
+
+    assert not is_error_result(result), result
+    assert statements[0] <= TOOL_QUERY_BUDGETS[name], f"{name} issued {statements[0]} statements"
@@ -1,9 +1,17 @@
-from typing import Any, Dict, List, Optional
+import os
+import random
+import threading
+import time
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from tools.resort_tools import (
     get_city_from_resort, 
     get_available_resorts, 
     get_resort_details, 
-    search_resorts_by_amenities
+    search_resorts_by_amenities,
+    resort_details_batchable,
+    get_resort_details_batch
 )
 from tools.booking_tools import (
     get_user_bookings, 
@@ -12,9 +20,33 @@ from tools.booking_tools import (
     get_cancellation_policy
 )
 from tools.search_tools import search_available_future_listings_merged
+from tools.geo_tools import search_resorts_near
+from tools.semantic_tools import search_resorts_semantic
+from tools.price_tools import get_price_stats
+from tools.availability_tools import get_availability_calendar
 from tools.utils import get_user_profile, test_database_connection
-from src.database.db import get_database_url, initialize_database
+from src.database.db import (
+    get_database_url, initialize_database, route, deadline, count_statements,
+    remaining_time, is_statement_timeout, is_transient_error
+)
 from tools.schema_utils import generate_schema
+from tools.templates import format_cancellation_policy, format_payment_methods
+from tools.cache import TOOL_CACHE, cache_key, is_error_result, make_key
+from tools.single_flight import SingleFlight
+from tools.change_feed import ChangeEvent, ChangePoller, SignatureWatch, TimestampWatch
+from tools.listing_snapshot import LISTING_SNAPSHOT
+from tools.availability_tools import AVAILABILITY_CALENDAR
+from tools.geo_tools import RESORT_GEO_INDEX
+from tools.location_index import LOCATION_TYPE_INDEX
+from tools.amenity_matcher import AMENITY_MATCHER
+from tools.semantic_tools import SEMANTIC_INDEX
+from src.database.models import (
+    PtRtListing, Resort, ResortMigration, LocationType, ResortLocationMaster, Amenity, ResortAmenity,
+    ResortReview, ResortImage, UnitType, Listing, EsPlaceOfInterests, EsPoiLocations
+)
+from structured_logging import get_logger
+
+log = get_logger("tools")
 
 # Registry for Streamlit UI compatibility
 AVAILABLE_TOOLS = {
@@ -26,6 +58,10 @@ AVAILABLE_TOOLS = {
     "search_available_future_listings_enhanced_v2": search_available_future_listings_merged, # Alias
     "get_city_from_resort": get_city_from_resort,
     "search_resorts_by_amenities": search_resorts_by_amenities,
+    "search_resorts_near": search_resorts_near,
+    "search_resorts_semantic": search_resorts_semantic,
+    "get_price_stats": get_price_stats,
+    "get_availability_calendar": get_availability_calendar,
     "get_user_profile": get_user_profile,
     "test_database_connection": test_database_connection,
     "get_database_url": get_database_url,
@@ -34,18 +70,321 @@ AVAILABLE_TOOLS = {
     "get_cancellation_policy": get_cancellation_policy,
 }
 
+# Read/write nature of each tool. "read" tools are served from replicas,
+# "primary" tools are read-only but must see the user's own writes from any
+# process, and "write" tools (and anything missing here) stay on the primary.
+TOOL_MODES = {
+    "get_user_bookings": "primary",
+    "get_available_resorts": "read",
+    "get_resort_details": "read",
+    "search_available_future_listings_merged": "read",
+    "search_available_future_listings_enhanced": "read",
+    "search_available_future_listings_enhanced_v2": "read",
+    "get_city_from_resort": "read",
+    "search_resorts_by_amenities": "read",
+    "search_resorts_near": "read",
+    "search_resorts_semantic": "read",
+    "get_price_stats": "read",
+    "get_availability_calendar": "read",
+    "get_user_profile": "read",
+    "test_database_connection": "write",
+    "get_database_url": "read",
+    "book_resort_listing": "write",
+    "get_payment_methods": "read",
+    "get_cancellation_policy": "read",
+}
+
+# Per-tool deadline in seconds. The deadline covers retries and is pushed down
+# to MySQL as MAX_EXECUTION_TIME so a slow scan is cancelled server-side.
+DEFAULT_TOOL_DEADLINE = 8.0
+TOOL_DEADLINES = {
+    "search_available_future_listings_merged": 10.0,
+    "search_available_future_listings_enhanced": 10.0,
+    "search_available_future_listings_enhanced_v2": 10.0,
+    "get_available_resorts": 10.0,
+    "book_resort_listing": 15.0,
+}
+
+# Most SQL statements one call of each tool may issue, whatever its limit or
+# result size. A call over budget is logged when KOALA_QUERY_BUDGETS is "log"
+# (the default); benchmarks.bench_tools fails on it. Tools missing here are
+# unchecked. Budgets include the occasional refresh of an in-memory index.
+TOOL_QUERY_BUDGETS = {
+    "get_user_bookings": 1,
+    "get_available_resorts": 4,
+    "get_resort_details": 4,
+    "search_available_future_listings_merged": 1,
+    "search_available_future_listings_enhanced": 1,
+    "search_available_future_listings_enhanced_v2": 1,
+    "get_city_from_resort": 3,
+    "search_resorts_by_amenities": 4,
+    "search_resorts_near": 4,
+    "search_resorts_semantic": 5,
+    "get_price_stats": 1,
+    "get_availability_calendar": 1,
+    "get_user_profile": 3,
+    "test_database_connection": 1,
+    "get_database_url": 0,
+    "book_resort_listing": 4,
+    "get_payment_methods": 0,
+    "get_cancellation_policy": 0,
+}
+
+QUERY_BUDGET_MODE = os.getenv("KOALA_QUERY_BUDGETS", "log")  # "log" or "off"
+
+# Tools that can serve several calls with one set of queries:
+# name -> (accepts(kwargs), batch(list of kwargs) -> one result per call).
+# call_tool_many groups accepted calls to the same tool into one batch.
+BATCH_TOOLS = {
+    "get_resort_details": (resort_details_batchable, get_resort_details_batch),
+}
+
+# Tools whose results render locally: name -> formatter(result, arguments),
+# returning the answer text or None (tools/templates.py). When every call of
+# a turn renders, chat_turn answers without the final LLM call.
+TEMPLATE_FORMATTERS = {
+    "get_payment_methods": format_payment_methods,
+    "get_cancellation_policy": format_cancellation_policy,
+}
+
+# Change-data-driven invalidation (tools/change_feed.py). A change to a
+# table drops the TOOL_CACHE entries tagged with it and calls these;
+# other changes rebuild the index.
+INDEX_SUBSCRIBERS = {
+    "pt_rt_listings": [RESORT_GEO_INDEX.invalidate],
+    "resorts": [
+        LISTING_SNAPSHOT.invalidate, RESORT_GEO_INDEX.invalidate, LOCATION_TYPE_INDEX.invalidate, SEMANTIC_INDEX.invalidate
+    ],
+    "resort_migration": [LOCATION_TYPE_INDEX.invalidate],
+    "location_types": [LOCATION_TYPE_INDEX.invalidate],
+    "resort_location_master": [LOCATION_TYPE_INDEX.invalidate],
+    "amenities": [AMENITY_MATCHER.invalidate, SEMANTIC_INDEX.invalidate],
+    "resort_amenities": [SEMANTIC_INDEX.invalidate],
+    "resort_reviews": [SEMANTIC_INDEX.invalidate],
+}
+
+# Called with the ids of the changed rows (ChangeEvent.row_ids): the listing
+# indexes re-read exactly those rows and apply them as deltas.
+ROW_SUBSCRIBERS = {
+    "pt_rt_listings": [LISTING_SNAPSHOT.apply_ids, AVAILABILITY_CALENDAR.apply_ids],
+}
+
+CHANGE_WATCHES = [
+    TimestampWatch(PtRtListing.l_updated_at, resort_column=PtRtListing.resort_id),
+    TimestampWatch(PtRtListing.updated_at, resort_column=PtRtListing.resort_id),
+    TimestampWatch(PtRtListing.resort_updated_at, table="resorts", resort_column=PtRtListing.resort_id),
+    SignatureWatch([
+        Resort, ResortMigration, LocationType, ResortLocationMaster, Amenity, ResortAmenity,
+        ResortReview, ResortImage, UnitType, Listing, EsPlaceOfInterests, EsPoiLocations
+    ]),
+]
+
+CHANGE_POLL_SECONDS = float(os.getenv("KOALA_CHANGE_POLL_SECONDS", "10"))  # 0 turns the poller off
+
+MAX_TOOL_ATTEMPTS = 3
+RETRY_BASE_DELAY = 0.1
+
+_tool_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="tool")
+
+# Identical read calls in flight at the same time share one execution.
+SINGLE_FLIGHT = SingleFlight()
+
+def _timeout_result(tool_name: str, seconds: float) -> Dict[str, Any]:
+    return {
+        "error": "timeout",
+        "tool": tool_name,
+        "timeout_seconds": seconds,
+        "message": (
+            f"'{tool_name}' did not finish within {seconds:g} seconds and was cancelled. "
+            "Try again with narrower filters such as a specific resort, location or dates."
+        )
+    }
+
+def _check_query_budget(tool_name: str, statements: int):
+    budget = TOOL_QUERY_BUDGETS.get(tool_name)
+    if QUERY_BUDGET_MODE == "log" and budget is not None and statements > budget:
+        log.warning("query_budget_exceeded", extra={"tool": tool_name, "statements": statements, "budget": budget})
+
+def _run_with_retries(tool_name: str, run: Callable[[], Any]) -> Any:
+    """Run a tool inside its route and deadline, retrying transient errors with full jitter."""
+    mode = TOOL_MODES.get(tool_name, "write")
+    seconds = TOOL_DEADLINES.get(tool_name, DEFAULT_TOOL_DEADLINE)
+    with route(mode), deadline(seconds):
+        for attempt in range(MAX_TOOL_ATTEMPTS):
+            try:
+                with count_statements() as statements:
+                    result = run()
+                _check_query_budget(tool_name, statements[0])
+                return result
+            except Exception as e:
+                # Writes are not retried: a dropped connection during commit
+                # could otherwise book the same listing twice.
+                retryable = mode != "write" and is_transient_error(e) and not is_statement_timeout(e)
+                if not retryable or attempt == MAX_TOOL_ATTEMPTS - 1:
+                    raise
+                delay = random.uniform(0, RETRY_BASE_DELAY * 2 ** attempt)
+                if delay >= remaining_time():
+                    raise
+                time.sleep(delay)
+
+def _submit(tool_name: str, run: Callable[[], Any], kwargs: Optional[Dict[str, Any]] = None):
+    """
+    Start a tool call on the executor. With `kwargs`, a read tool call joins
+    an identical call already in flight instead of running again.
+    """
+    context = contextvars.copy_context()
+    start = lambda: _tool_executor.submit(context.run, _run_with_retries, tool_name, run)
+    if kwargs is None or TOOL_MODES.get(tool_name) != "read":
+        return start(), time.monotonic()
+    future, joined = SINGLE_FLIGHT.submit(make_key(tool_name, kwargs), tool_name, start)
+    if joined:
+        log.debug("tool_call_coalesced", extra={"tool": tool_name})
+    return future, time.monotonic()
+
+def _result(tool_name: str, future, submitted_at: float) -> Any:
+    """Wait for a submitted tool call until its deadline and turn failures into error results."""
+    seconds = TOOL_DEADLINES.get(tool_name, DEFAULT_TOOL_DEADLINE)
+    try:
+        return future.result(timeout=max(submitted_at + seconds - time.monotonic(), 0))
+    except FutureTimeoutError:
+        return _timeout_result(tool_name, seconds)
+    except Exception as e:
+        if is_statement_timeout(e):
+            return _timeout_result(tool_name, seconds)
+        return {"error": f"Error calling tool '{tool_name}': {str(e)}"}
+
 def call_tool(tool_name: str, **kwargs) -> Any:
     """
     Call a tool function by name with given arguments.
     Used by streamlit_app.py to interact with the backend.
+
+    Errors come back as {"error": ...} dicts. A tool that runs past its
+    deadline returns a structured timeout result instead of blocking the turn.
+    A read call identical to one already in flight waits for that call's
+    result instead of running again.
     """
     if tool_name not in AVAILABLE_TOOLS:
         return {"error": f"Tool '{tool_name}' not found"}
-    
+
+    tool = AVAILABLE_TOOLS[tool_name]
+    return _result(tool_name, *_submit(tool_name, lambda: tool(**kwargs), kwargs))
+
+def _run_batch(tool_name: str, calls: List[Dict[str, Any]], keys: List[Optional[str]]) -> List[Any]:
+    """Run a BATCH_TOOLS batch and store each call's result in TOOL_CACHE, as the single-call path would."""
+    tool = AVAILABLE_TOOLS[tool_name]
+    tables = getattr(tool, "cache_tables", ())
+    generation = TOOL_CACHE.generation(tables)
+    results = BATCH_TOOLS[tool_name][1](calls)
+    if isinstance(results, list) and len(results) == len(calls):
+        for key, value in zip(keys, results):
+            if key is not None and not is_error_result(value):
+                TOOL_CACHE.set(key, value, tool.cache_ttl, tables, generation)
+    return results
+
+def _settle(batch, futures: List[Future]):
+    """Hand each call of a finished batch its own result."""
     try:
-        return AVAILABLE_TOOLS[tool_name](**kwargs)
+        results = batch.result()
     except Exception as e:
-        return {"error": f"Error calling tool '{tool_name}': {str(e)}"}
+        for future in futures:
+            future.set_exception(e)
+        return
+    if not isinstance(results, list) or len(results) != len(futures):
+        # The batch returned one error for all of its calls.
+        results = [results] * len(futures)
+    for future, value in zip(futures, results):
+        future.set_result(value)
+
+def call_tool_many(calls: List[Tuple[str, Dict[str, Any]]]) -> List[Any]:
+    """
+    Call several tools at once, returning one result per (tool_name, kwargs)
+    pair in the same order, with the same error handling as call_tool.
+
+    Two or more calls to a tool in BATCH_TOOLS that it accepts run as one
+    batch (one session, `IN (...)` queries); all other calls run
+    concurrently on the tool executor. Batched calls behave like single
+    ones otherwise: cached results are used and the batch's results are
+    cached, and a call identical to one already in flight joins it (and
+    later identical calls join the batch) instead of running again.
+    """
+    results: List[Any] = [None] * len(calls)
+    done = [False] * len(calls)
+    groups: Dict[str, List[int]] = {}
+    for index, (tool_name, kwargs) in enumerate(calls):
+        if tool_name not in AVAILABLE_TOOLS:
+            results[index], done[index] = {"error": f"Tool '{tool_name}' not found"}, True
+        elif tool_name in BATCH_TOOLS and BATCH_TOOLS[tool_name][0](kwargs):
+            groups.setdefault(tool_name, []).append(index)
+
+    pending = []
+    for tool_name, indexes in groups.items():
+        tool = AVAILABLE_TOOLS[tool_name]
+        keys = {index: cache_key(tool, calls[index][1]) for index in indexes}
+        misses = []
+        for index in indexes:
+            hit, value = TOOL_CACHE.get(keys[index]) if keys[index] is not None else (False, None)
+            if hit:
+                results[index], done[index] = value, True
+            else:
+                misses.append(index)
+        if len(misses) < 2:
+            continue
+
+        # Each call gets a future of its own, registered with SINGLE_FLIGHT so
+        # identical calls join it; the batch fills in the ones it owns.
+        owned, futures = [], []
+        for index in misses:
+            future, joined = SINGLE_FLIGHT.submit(make_key(tool_name, calls[index][1]), tool_name, Future)
+            if not joined:
+                owned.append(index)
+                futures.append(future)
+            pending.append((tool_name, index, (future, time.monotonic())))
+            done[index] = True
+        if owned:
+            batch, _ = _submit(tool_name, lambda n=tool_name, c=[calls[i][1] for i in owned], k=[keys[i] for i in owned]: _run_batch(n, c, k))
+            batch.add_done_callback(lambda b, f=futures: _settle(b, f))
+
+    for index, (tool_name, kwargs) in enumerate(calls):
+        if done[index]:
+            continue
+        tool = AVAILABLE_TOOLS[tool_name]
+        pending.append((tool_name, index, _submit(tool_name, lambda t=tool, k=kwargs: t(**k), kwargs)))
+
+    for tool_name, index, (future, submitted_at) in pending:
+        results[index] = _result(tool_name, future, submitted_at)
+    return results
+
+def _drop_cached_results(event: ChangeEvent):
+    TOOL_CACHE.invalidate([event.table])
+
+def _subscribers() -> Dict[str, List[Callable[[ChangeEvent], Any]]]:
+    """Callbacks per watched table: drop its cached results, then refresh the indexes built from it."""
+    return {
+        table: (
+            [_drop_cached_results]
+            + [lambda event, refresh=refresh: refresh() for refresh in INDEX_SUBSCRIBERS.get(table, ())]
+            + [lambda event, apply=apply: apply(event.row_ids) for apply in ROW_SUBSCRIBERS.get(table, ())]
+        )
+        for watch in CHANGE_WATCHES
+        for table in watch.tables
+    }
+
+_change_poller: Optional[ChangePoller] = None
+_change_poller_lock = threading.Lock()
+
+def start_change_poller() -> Optional[ChangePoller]:
+    """Start the background change poller once per process (no-op when KOALA_CHANGE_POLL_SECONDS is 0)."""
+    global _change_poller
+    with _change_poller_lock:
+        if _change_poller is None and CHANGE_POLL_SECONDS > 0:
+            _change_poller = ChangePoller(CHANGE_WATCHES, _subscribers(), CHANGE_POLL_SECONDS)
+            _change_poller.start()
+        return _change_poller
 
-# Automatically generate schemas for all available tools
-ALL_FUNCTION_SCHEMAS = [generate_schema(func) for func in AVAILABLE_TOOLS.values()]
+# Automatically generate schemas for all available tools. Sorted by registry
+# name so the serialized tool list (part of the cached prompt prefix) is
+# identical across processes and deploys.
+ALL_FUNCTION_SCHEMAS = [
+    generate_schema(AVAILABLE_TOOLS[name], tool_name=name)
+    for name in sorted(AVAILABLE_TOOLS)
+]
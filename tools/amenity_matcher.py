@@ -0,0 +1,214 @@
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple
+import numpy as np
+from sqlalchemy import func, select
+from src.database.db import SessionLocal
+from src.database.models import Amenity
+
+NGRAM = 3
+
+# Alternative phrasings of common amenity terms, applied to whole words of a
+# term before matching ("free wifi" also searches "free internet").
+SYNONYMS: Dict[str, List[str]] = {
+    "wifi": ["internet", "wireless internet"],
+    "wi fi": ["wifi", "internet"],
+    "internet": ["wifi"],
+    "gym": ["fitness center", "fitness room", "exercise room"],
+    "fitness": ["gym", "exercise"],
+    "workout": ["fitness center", "gym"],
+    "jacuzzi": ["hot tub", "whirlpool"],
+    "whirlpool": ["hot tub", "jacuzzi"],
+    "hot tub": ["jacuzzi", "whirlpool"],
+    "swimming pool": ["pool"],
+    "swimming": ["pool"],
+    "bbq": ["barbecue", "grill"],
+    "barbecue": ["bbq", "grill"],
+    "grill": ["bbq", "barbecue"],
+    "washer": ["laundry", "washing machine"],
+    "dryer": ["laundry"],
+    "laundry": ["washer", "dryer", "washing machine"],
+    "kitchen": ["kitchenette"],
+    "kitchenette": ["kitchen"],
+    "parking": ["garage", "car park"],
+    "pets": ["pet friendly", "pets allowed"],
+    "pet": ["pet friendly", "pets allowed"],
+    "dog": ["pet friendly", "pets allowed"],
+    "kids": ["children", "kids club", "playground"],
+    "children": ["kids", "kids club"],
+    "family": ["kids club", "playground"],
+    "beach": ["beachfront", "oceanfront", "beach access"],
+    "ocean": ["oceanfront", "beach"],
+    "bar": ["lounge"],
+    "lounge": ["bar"],
+    "ac": ["air conditioning"],
+    "air conditioning": ["ac", "air conditioner"],
+    "tv": ["television", "cable"],
+    "restaurant": ["dining", "on site restaurant"],
+    "dining": ["restaurant"],
+    "golf": ["golf course"],
+    "tennis": ["tennis court"],
+    "games": ["game room", "arcade"],
+    "arcade": ["game room"],
+    "sauna": ["steam room", "spa"],
+}
+
+def _normalize(text: Optional[str]) -> str:
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", (text or "").lower()).split())
+
+def _ngrams(text: str) -> List[str]:
+    padded = f" {text} "
+    return [padded[i:i + NGRAM] for i in range(len(padded) - NGRAM + 1)]
+
+def expand(term: str) -> List[str]:
+    """The normalized term plus its synonym variants."""
+    base = _normalize(term)
+    variants = [base] if base else []
+    for phrase, alternatives in SYNONYMS.items():
+        if re.search(rf"\b{re.escape(phrase)}\b", base):
+            for alternative in alternatives:
+                variant = re.sub(rf"\b{re.escape(phrase)}\b", alternative, base)
+                if variant not in variants:
+                    variants.append(variant)
+    return variants
+
+class AmenityMatcher:
+    """
+    Maps free-text amenity terms ("pool", "jacuzzi", "wifi") to amenity ids.
+
+    Amenity.name and Amenity.vrbo_name are indexed as rows of a character
+    trigram TF-IDF matrix (L2-normalized, IDF over all names). Every term
+    and its synonym variants become rows of a query matrix, and one pair of
+    matrix products scores them against all names at once:
+
+    - coverage: the IDF-weighted share of the query's trigrams found in the
+      name. It is 1.0 when the term is a substring of the name, so "pool"
+      still matches "Outdoor Pool" as the old ILIKE '%pool%' did.
+    - cosine similarity, which tolerates spelling and word order
+      ("hottub", "tub hot").
+
+    A name matches a term when either score clears its threshold. The
+    matrices are rebuilt when a signature of the amenities table (count,
+    max id and the summed lengths of both name columns, as the table has no
+    updated-at column) changes, checked at most every `refresh_interval`
+    seconds, and unconditionally every `rebuild_interval` seconds for
+    renames that keep the length. A build publishes (vocabulary, idf,
+    matrix, row_ids, names) as one tuple, so a match never combines one
+    build's vocabulary with another's matrix.
+    """
+
+    def __init__(
+        self,
+        refresh_interval: float = 600.0,
+        rebuild_interval: float = 3600.0,
+        min_coverage: float = 0.85,
+        min_cosine: float = 0.7
+    ):
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        self.min_coverage = min_coverage
+        self.min_cosine = min_cosine
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self._built_at = 0.0
+        self._signature = None
+        # (vocabulary, idf, matrix, row_ids, names), replaced as a whole by build().
+        self.view: Tuple[Dict[str, int], np.ndarray, np.ndarray, np.ndarray, Dict[int, str]] = (
+            {}, np.empty(0, dtype=np.float32), np.empty((0, 0), dtype=np.float32), np.empty(0, dtype=np.int64), {}
+        )
+
+    @property
+    def names(self) -> Dict[int, str]:
+        return self.view[4]
+
+    def _signature_query(self, session):
+        return session.execute(
+            select(
+                func.count(Amenity.id),
+                func.max(Amenity.id),
+                func.coalesce(func.sum(func.length(Amenity.name)), 0),
+                func.coalesce(func.sum(func.length(Amenity.vrbo_name)), 0)
+            )
+        ).one()
+
+    def build(self, session):
+        amenities = session.execute(select(Amenity.id, Amenity.name, Amenity.vrbo_name)).all()
+        texts, row_ids, names = [], [], {}
+        for amenity_id, name, vrbo_name in amenities:
+            names[amenity_id] = name
+            for text in {_normalize(name), _normalize(vrbo_name)}:
+                if text:
+                    texts.append(_ngrams(text))
+                    row_ids.append(amenity_id)
+
+        vocabulary: Dict[str, int] = {}
+        for grams in texts:
+            for gram in grams:
+                vocabulary.setdefault(gram, len(vocabulary))
+        counts = np.zeros((len(texts), len(vocabulary)), dtype=np.float32)
+        for row, grams in enumerate(texts):
+            for gram in grams:
+                counts[row, vocabulary[gram]] += 1
+
+        document_frequency = (counts > 0).sum(axis=0)
+        idf = (np.log((1 + len(texts)) / (1 + document_frequency)) + 1).astype(np.float32)
+        matrix = counts * idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.where(norms == 0, 1, norms)
+
+        self.view = (vocabulary, idf, matrix, np.array(row_ids, dtype=np.int64), names)
+        self._built_at = time.monotonic()
+
+    def ensure_fresh(self):
+        if time.monotonic() - self._checked_at < self.refresh_interval:
+            return
+        with self._lock:
+            if time.monotonic() - self._checked_at < self.refresh_interval:
+                return
+            with SessionLocal() as session:
+                signature = tuple(self._signature_query(session))
+                if signature != self._signature or time.monotonic() - self._built_at >= self.rebuild_interval:
+                    self.build(session)
+                    self._signature = signature
+            self._checked_at = time.monotonic()
+
+    def invalidate(self):
+        """Force a rebuild on the next match."""
+        self._checked_at = 0.0
+        self._signature = None
+
+    def match(self, terms: List[str]) -> List[Set[int]]:
+        """The amenity ids matching each term, one set per term (empty when nothing matches)."""
+        self.ensure_fresh()
+        vocabulary, idf, matrix, row_ids, _ = self.view
+        variants, owners = [], []
+        for index, term in enumerate(terms):
+            for variant in expand(term):
+                variants.append(variant)
+                owners.append(index)
+        if not variants or not len(row_ids):
+            return [set() for _ in terms]
+
+        # Trigrams missing from the vocabulary still count against coverage.
+        queries = np.zeros((len(variants), len(vocabulary)), dtype=np.float32)
+        missing = np.zeros(len(variants), dtype=np.float32)
+        for row, variant in enumerate(variants):
+            for gram in set(_ngrams(variant)):
+                column = vocabulary.get(gram)
+                if column is None:
+                    missing[row] += idf.max()
+                else:
+                    queries[row, column] = idf[column]
+        weight = queries.sum(axis=1) + missing
+        coverage = queries @ (matrix > 0).T.astype(np.float32) / np.maximum(weight, 1e-9)[:, None]
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        cosine = (queries / np.where(norms == 0, 1, norms)) @ matrix.T
+        matched = (coverage >= self.min_coverage) | (cosine >= self.min_cosine)
+
+        results: List[Set[int]] = [set() for _ in terms]
+        for row, column in zip(*np.nonzero(matched)):
+            results[owners[row]].add(int(row_ids[column]))
+        return results
+
+AMENITY_MATCHER = AmenityMatcher()
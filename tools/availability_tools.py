@@ -0,0 +1,262 @@
+import threading
+import time
+from typing import List, Dict, Any, Optional, Tuple
+from datetime import date, datetime, timedelta
+import numpy as np
+from sqlalchemy import select
+from src.database.db import SessionLocal
+from src.database.models import PtRtListing
+
+CalendarKey = Tuple[int, str]
+
+class CalendarView:
+    """One published state of the calendar; never modified once a query can see it."""
+
+    def __init__(self, origin: Optional[date], coverage: Dict[CalendarKey, np.ndarray], resort_names: Dict[int, str]):
+        self.origin = origin
+        self.coverage = coverage
+        self.resort_names = resort_names
+
+    def find_resort_ids(self, resort_name: str) -> List[int]:
+        needle = resort_name.strip().lower()
+        return [rid for rid, name in self.resort_names.items() if name and needle in name.lower()]
+
+    def windows(self, key: CalendarKey, first: int, last: int, nights: int) -> np.ndarray:
+        """Check-in day indexes in [first, last] whose next `nights` nights are all covered."""
+        covered = self.coverage[key][first:last + nights] > 0
+        if covered.size < nights:
+            return np.empty(0, dtype=np.int64)
+        runs = np.concatenate(([0], np.cumsum(covered, dtype=np.int64)))
+        starts = np.flatnonzero(runs[nights:] - runs[:-nights] == nights)
+        return starts[starts <= last - first] + first
+
+    def available_nights(self, key: CalendarKey, first: int, last: int) -> np.ndarray:
+        return np.flatnonzero(self.coverage[key][first:last + 1] > 0) + first
+
+class AvailabilityCalendar:
+    """
+    Day-indexed availability per (resort_id, unit type), built from pt_rt_listings.
+
+    Each key holds a count of active listings covering every night from
+    `origin` to `origin + horizon_days`; a night is available when its count
+    is non-zero. Counts rather than bits let a cancelled or sold listing be
+    subtracted without rescanning the others. Listings changed since the
+    last refresh (by l_updated_at) are applied incrementally; the whole
+    calendar is rebuilt when the day rolls over.
+
+    Queries read `view`, a CalendarView that is replaced in one assignment:
+    builds fill new dicts and deltas copy the arrays they touch, so a query
+    never sees a half-built or half-updated calendar.
+    """
+
+    def __init__(self, horizon_days: int = 540, refresh_interval: float = 60.0):
+        self.horizon_days = horizon_days
+        self.refresh_interval = refresh_interval
+        self._lock = threading.RLock()
+        self._refreshed_at = 0.0
+        self.high_water: Optional[datetime] = None
+        self.view = CalendarView(None, {}, {})
+        self._spans: Dict[int, Tuple[CalendarKey, int, int]] = {}
+
+    @property
+    def origin(self) -> Optional[date]:
+        return self.view.origin
+
+    @staticmethod
+    def _columns():
+        return (
+            PtRtListing.id,
+            PtRtListing.resort_id,
+            PtRtListing.resort_name,
+            PtRtListing.unit_type_name,
+            PtRtListing.listing_check_in,
+            PtRtListing.listing_check_out,
+            PtRtListing.listing_status,
+            PtRtListing.listing_has_deleted,
+            PtRtListing.l_updated_at
+        )
+
+    def _apply(self, rows, origin: date, coverage: Dict[CalendarKey, np.ndarray], resort_names: Dict[int, str]) -> None:
+        """
+        Add, move or remove each listing's nights according to its current
+        state. `coverage` is a new dict; an array in it is copied before its
+        first change, since the published view may still share it.
+        """
+        copied = set()
+
+        def counts(key: CalendarKey) -> np.ndarray:
+            if key not in copied:
+                coverage[key] = coverage[key].copy() if key in coverage else np.zeros(self.horizon_days, dtype=np.uint16)
+                copied.add(key)
+            return coverage[key]
+
+        for row in rows:
+            previous = self._spans.pop(row.id, None)
+            if previous is not None:
+                key, start, end = previous
+                counts(key)[start:end] -= 1
+
+            if row.l_updated_at and (self.high_water is None or row.l_updated_at > self.high_water):
+                self.high_water = row.l_updated_at
+
+            if row.listing_status != "active" or row.listing_has_deleted or not row.listing_check_in or not row.listing_check_out:
+                continue
+            start = max((row.listing_check_in.date() - origin).days, 0)
+            end = min((row.listing_check_out.date() - origin).days, self.horizon_days)
+            if end <= start:
+                continue
+            key = (row.resort_id, row.unit_type_name or "Unit")
+            counts(key)[start:end] += 1
+            self._spans[row.id] = (key, start, end)
+            resort_names[row.resort_id] = row.resort_name
+
+    def build(self, session) -> None:
+        with self._lock:
+            today = date.today()
+            origin = datetime.combine(today, datetime.min.time())
+            rows = session.execute(
+                select(*self._columns()).where(
+                    PtRtListing.listing_status == "active",
+                    PtRtListing.listing_has_deleted == 0,
+                    PtRtListing.listing_check_out > origin,
+                    PtRtListing.listing_check_in < origin + timedelta(days=self.horizon_days)
+                )
+            ).all()
+            coverage, resort_names = {}, {}
+            self.high_water = None
+            self._spans = {}
+            self._apply(rows, today, coverage, resort_names)
+            self.view = CalendarView(today, coverage, resort_names)
+            self._refreshed_at = time.monotonic()
+
+    def refresh(self, session) -> None:
+        """Apply listings updated since the high-water mark, or rebuild on a new day."""
+        with self._lock:
+            if self.view.origin != date.today() or self.high_water is None:
+                self.build(session)
+                return
+            rows = session.execute(
+                select(*self._columns())
+                .where(PtRtListing.l_updated_at >= self.high_water)
+                .order_by(PtRtListing.l_updated_at)
+            ).all()
+            self._publish(rows)
+            self._refreshed_at = time.monotonic()
+
+    def _publish(self, rows) -> None:
+        """Apply changed rows to copies of the current view and swap them in."""
+        if rows:
+            view = self.view
+            coverage, resort_names = dict(view.coverage), dict(view.resort_names)
+            self._apply(rows, view.origin, coverage, resort_names)
+            self.view = CalendarView(view.origin, coverage, resort_names)
+
+    def apply_ids(self, listing_ids) -> None:
+        """
+        Re-read the listings with these ids and apply them, whichever
+        timestamp their change bumped (a listing sold with only updated_at
+        set is not seen by the l_updated_at delta).
+        """
+        with self._lock:
+            if not listing_ids or self.high_water is None or self.view.origin != date.today():
+                self.expire()
+                return
+            with SessionLocal() as session:
+                rows = session.execute(select(*self._columns()).where(PtRtListing.id.in_(list(listing_ids)))).all()
+            self._publish(rows)
+
+    def ensure_fresh(self) -> None:
+        if time.monotonic() - self._refreshed_at < self.refresh_interval and self.origin == date.today():
+            return
+        with SessionLocal() as session:
+            self.refresh(session)
+
+    def expire(self) -> None:
+        """Apply changed listings on the next query instead of waiting for the refresh interval."""
+        self._refreshed_at = 0.0
+
+AVAILABILITY_CALENDAR = AvailabilityCalendar()
+
+def _ranges(days: np.ndarray, origin: date) -> List[Dict[str, str]]:
+    """Collapse sorted day indexes into from/to date ranges."""
+    if days.size == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(days) != 1)
+    starts = np.concatenate(([days[0]], days[breaks + 1]))
+    ends = np.concatenate((days[breaks], [days[-1]]))
+    return [
+        {"from": (origin + timedelta(days=int(s))).isoformat(), "to": (origin + timedelta(days=int(e))).isoformat()}
+        for s, e in zip(starts, ends)
+    ]
+
+def get_availability_calendar(
+    resort_name: Optional[str] = None,
+    resort_id: Optional[int] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    nights: Optional[int] = None,
+    unit_type: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Show when a resort has availability between two dates, optionally only check-in dates that fit a stay of a given number of nights.
+
+    :param resort_name: Optional name of the resort.
+    :param resort_id: Optional ID of the resort.
+    :param start_date: Optional earliest check-in date (YYYY-MM-DD), defaults to today.
+    :param end_date: Optional latest check-in date (YYYY-MM-DD), defaults to 90 days from the start date.
+    :param nights: Optional length of stay in nights; returns the check-in dates that allow it.
+    :param unit_type: Optional unit type to filter by, such as 1 Bedroom or Studio.
+    """
+    calendar = AVAILABILITY_CALENDAR
+    calendar.ensure_fresh()
+    view = calendar.view
+
+    try:
+        start = datetime.strptime(start_date, "%Y-%m-%d").date() if start_date else view.origin
+        end = datetime.strptime(end_date, "%Y-%m-%d").date() if end_date else start + timedelta(days=90)
+    except ValueError:
+        return {"error": "Dates must be in YYYY-MM-DD format"}
+    first = max((start - view.origin).days, 0)
+    last = min((end - view.origin).days, calendar.horizon_days - 1)
+    if last < first:
+        return {"error": "The date range is in the past or too far in the future."}
+
+    if resort_id:
+        try:
+            resort_ids = [int(resort_id)]
+        except (ValueError, TypeError):
+            return {"error": "Invalid resort_id"}
+    elif resort_name:
+        resort_ids = view.find_resort_ids(resort_name)[:3]
+    else:
+        return {"error": "Provide a resort_name or resort_id."}
+
+    nights = int(nights) if nights else None
+    resorts = []
+    for rid in resort_ids:
+        units = []
+        for key in sorted(k for k in view.coverage if k[0] == rid):
+            if unit_type and unit_type.strip().lower() not in key[1].lower():
+                continue
+            if nights:
+                days = view.windows(key, first, last, nights)
+                entry = {"unit_type": key[1], "check_in_dates": _ranges(days, view.origin)}
+            else:
+                days = view.available_nights(key, first, last)
+                entry = {"unit_type": key[1], "available_nights": _ranges(days, view.origin)}
+            if days.size:
+                units.append(entry)
+        resorts.append({
+            "resort_id": rid,
+            "resort_name": view.resort_names.get(rid),
+            "availability": units or "No availability in this range"
+        })
+
+    if not resorts:
+        return {"error": f"No listings found for resort '{resort_name}'"}
+    return {
+        "start_date": (view.origin + timedelta(days=first)).isoformat(),
+        "end_date": (view.origin + timedelta(days=last)).isoformat(),
+        "nights": nights,
+        "resorts": resorts
+    }
@@ -18,9 +18,11 @@ def get_user_bookings(user_email: str, upcoming_limit: int = 3, past_limit: int
     try:
         today = date.today()
         bookings = (
-            session.query(Booking)
+            session.query(Resort.name, Listing.check_in, Listing.check_out, Listing.status)
+            .select_from(Booking)
             .join(User, Booking.user_id == User.id)
             .join(Listing, Booking.listing_id == Listing.id)
+            .join(Resort, Listing.resort_id == Resort.id)
             .filter(User.email == user_email)
             .all()
         )
@@ -28,12 +30,12 @@ def get_user_bookings(user_email: str, upcoming_limit: int = 3, past_limit: int
         upcoming, past = [], []
         for b in bookings:
             data = {
-                "resort_name": b.listing.resort.name,
-                "check_in": b.listing.check_in.strftime("%Y-%m-%d"),
-                "check_out": b.listing.check_out.strftime("%Y-%m-%d"),
-                "status": b.listing.status
+                "resort_name": b.name,
+                "check_in": b.check_in.strftime("%Y-%m-%d"),
+                "check_out": b.check_out.strftime("%Y-%m-%d"),
+                "status": b.status
             }
-            if b.listing.check_in.date() >= today:
+            if b.check_in.date() >= today:
                 upcoming.append(data)
             else:
                 past.append(data)
@@ -0,0 +1,146 @@
+"""
+In-process TTL cache for tool results.
+
+Entries are keyed by tool name plus the fully bound arguments (defaults
+applied, so `f(limit=10)` and `f()` share an entry) and tagged with the
+tables they were read from, so a change to a table can drop exactly the
+entries that depend on it. Each invalidation also bumps the tables'
+generation; a result computed while its tables were invalidated is not
+stored, so a slow call cannot re-cache data that was already stale.
+Cached values are shared between callers and must be treated as read-only.
+"""
+import functools
+import inspect
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+def make_key(tool_name: str, arguments: Dict[str, Any]) -> str:
+    return tool_name + ":" + json.dumps(arguments, sort_keys=True, default=str, separators=(",", ":"))
+
+def bind_arguments(func: Callable, args: tuple, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    bound = inspect.signature(func).bind(*args, **kwargs)
+    bound.apply_defaults()
+    return dict(bound.arguments)
+
+def cache_key(func: Callable, kwargs: Dict[str, Any]) -> Optional[str]:
+    """The TOOL_CACHE key of `func(**kwargs)`, or None when `func` is not @cached or the arguments do not bind."""
+    if getattr(func, "cache_tables", None) is None:
+        return None
+    try:
+        return make_key(func.__name__, bind_arguments(func, (), kwargs))
+    except TypeError:
+        return None
+
+class ToolCache:
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Any, frozenset]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._generations: Dict[str, int] = {}
+        self._clears = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[1]
+
+    def _generation(self, tables: Iterable[str]) -> Tuple[int, ...]:
+        return (self._clears,) + tuple(self._generations.get(table, 0) for table in tables)
+
+    def generation(self, tables: Iterable[str]) -> Tuple[int, ...]:
+        """Opaque token that changes whenever any of `tables` is invalidated."""
+        with self._lock:
+            return self._generation(tables)
+
+    def set(self, key: str, value: Any, ttl: float, tables: Iterable[str] = (), generation: Optional[Tuple[int, ...]] = None):
+        """Store `value`, unless `generation` (taken before computing it) is out of date."""
+        tables = tuple(tables)
+        with self._lock:
+            if generation is not None and generation != self._generation(tables):
+                return
+            self._entries[key] = (time.monotonic() + ttl, value, frozenset(tables))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, tables: Optional[Iterable[str]] = None) -> int:
+        """Drop entries that read from any of `tables` (everything when None). Returns the count dropped."""
+        with self._lock:
+            if tables is None:
+                dropped = len(self._entries)
+                self._entries.clear()
+                self._clears += 1
+                return dropped
+            tables = set(tables)
+            for table in tables:
+                self._generations[table] = self._generations.get(table, 0) + 1
+            stale = [key for key, (_, _, tags) in self._entries.items() if tags & tables]
+            for key in stale:
+                del self._entries[key]
+            return len(stale)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+TOOL_CACHE = ToolCache()
+
+def is_error_result(value: Any, depth: int = 2) -> bool:
+    """
+    Whether a tool result reports an error: a dict with an "error" key, or one
+    inside a list or dict value up to `depth` levels down (get_available_resorts
+    returns [{"error": ...}], for instance).
+    """
+    if isinstance(value, dict):
+        if "error" in value:
+            return True
+        items = value.values()
+    elif isinstance(value, (list, tuple)):
+        items = value
+    else:
+        return False
+    return depth > 0 and any(is_error_result(item, depth - 1) for item in items)
+
+def cached(ttl: float, tables: Iterable[str] = ()):
+    """
+    Cache a tool's results in TOOL_CACHE for `ttl` seconds, tagged with `tables`.
+
+    Error results (see is_error_result) are never cached.
+    """
+    tables = tuple(tables)
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = make_key(func.__name__, bind_arguments(func, args, kwargs))
+            hit, value = TOOL_CACHE.get(key)
+            if hit:
+                return value
+            generation = TOOL_CACHE.generation(tables)
+            value = func(*args, **kwargs)
+            if not is_error_result(value):
+                TOOL_CACHE.set(key, value, ttl, tables, generation)
+            return value
+
+        wrapper.cache_tables = tables
+        wrapper.cache_ttl = ttl
+        return wrapper
+
+    return decorator
@@ -0,0 +1,215 @@
+"""
+Change-data-driven invalidation for tool caches and in-memory indexes.
+
+A background ChangePoller asks the database every few seconds what changed
+and publishes a ChangeEvent per table to the callbacks subscribed to it
+(tools/__init__.py wires TOOL_CACHE and the indexes). Cached results can
+then live for a long TTL: the TTL only bounds staleness if the poller
+stops, it is not what keeps sold listings out of search results.
+
+Two kinds of watch:
+
+- TimestampWatch follows an updated-at column with a (timestamp, id)
+  high-water mark and fetches changed rows in keyset-paged batches, so a
+  burst of updates that share one timestamp is neither skipped nor
+  re-read. pt_rt_listings is watched on l_updated_at and updated_at, and on
+  resort_updated_at, whose changes are published as table "resorts".
+- SignatureWatch covers tables without timestamps (amenities, reviews,
+  ...): a change of any table's content signature (see below) is
+  published as a change to that table.
+
+Watches start at the current high-water marks; history is not replayed.
+"""
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+from sqlalchemy import Integer, String, Text, and_, func, or_, select
+from src.database.db import SessionLocal
+from structured_logging import get_logger
+
+log = get_logger("changes")
+
+class ChangeEvent(NamedTuple):
+    table: str
+    source: str
+    row_ids: Tuple[int, ...] = ()
+    resort_ids: FrozenSet[int] = frozenset()
+
+class TimestampWatch:
+    """Rows of one table whose `column` moved past the (timestamp, id) high-water mark."""
+
+    def __init__(self, column, table: Optional[str] = None, resort_column=None, batch_size: int = 500, max_batches: int = 20):
+        self.column = column
+        self.id_column = column.class_.id
+        self.table = table or column.class_.__tablename__
+        self.resort_column = resort_column
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self.high_water: Optional[Tuple[datetime, int]] = None
+
+    @property
+    def name(self) -> str:
+        return f"{self.column.class_.__tablename__}.{self.column.key}"
+
+    @property
+    def tables(self) -> List[str]:
+        return [self.table]
+
+    def start(self, session) -> None:
+        latest = session.execute(select(func.max(self.column))).scalar()
+        if latest is None:
+            self.high_water = (datetime.min, 0)
+            return
+        last_id = session.execute(select(func.max(self.id_column)).where(self.column == latest)).scalar()
+        self.high_water = (latest, last_id or 0)
+
+    def poll(self, session) -> List[ChangeEvent]:
+        """Fetch rows changed since the high-water mark, up to `max_batches` batches per poll."""
+        if self.high_water is None:
+            self.start(session)
+            return []
+        columns = [self.column, self.id_column] + ([self.resort_column] if self.resort_column is not None else [])
+        events = []
+        for _ in range(self.max_batches):
+            since, since_id = self.high_water
+            rows = session.execute(
+                select(*columns)
+                .where(or_(self.column > since, and_(self.column == since, self.id_column > since_id)))
+                .order_by(self.column, self.id_column)
+                .limit(self.batch_size)
+            ).all()
+            if not rows:
+                break
+            self.high_water = (rows[-1][0], rows[-1][1])
+            events.append(ChangeEvent(
+                table=self.table,
+                source=self.name,
+                row_ids=tuple(row[1] for row in rows),
+                resort_ids=frozenset(row[2] for row in rows) if self.resort_column is not None else frozenset()
+            ))
+            if len(rows) < self.batch_size:
+                break
+        return events
+
+def _content_aggregates(model) -> List[Any]:
+    """
+    count and max id, plus the sums of the other integer columns (flags
+    such as has_deleted, foreign keys) and of the lengths of the text
+    columns, so in-place UPDATEs move the signature too.
+    """
+    total = lambda value: select(func.coalesce(func.sum(value), 0)).scalar_subquery()
+    aggregates = [select(func.count(model.id)).scalar_subquery(), select(func.max(model.id)).scalar_subquery()]
+    for column in model.__table__.columns:
+        if column.primary_key:
+            continue
+        if isinstance(column.type, Integer):
+            aggregates.append(total(column))
+        elif isinstance(column.type, (String, Text)):
+            aggregates.append(total(func.length(column)))
+    return aggregates
+
+class SignatureWatch:
+    """
+    Tables without an updated-at column. A table's signature is its count,
+    max id, the sums of its integer columns and text lengths (one statement
+    for all tables), and its row count per status value (one statement per
+    table with a `status` column), so soft deletes, status flips such as a
+    listing going from active to booked, reassigned foreign keys and most
+    text edits are caught. A text edit that keeps the length (a same-length
+    rename) is not; results cached from these tables then fall back to
+    their TTL.
+    """
+
+    name = "signatures"
+
+    def __init__(self, models: List[Any]):
+        self.models = models
+        self.tables = [model.__tablename__ for model in models]
+        self.signatures: Optional[Dict[str, Tuple]] = None
+
+    def _query(self, session) -> Dict[str, Tuple]:
+        aggregates = [_content_aggregates(model) for model in self.models]
+        values = iter(session.execute(select(*[column for columns in aggregates for column in columns])).one())
+        signatures = {}
+        for model, columns in zip(self.models, aggregates):
+            signature = tuple(next(values) for _ in columns)
+            status = model.__table__.columns.get("status")
+            if status is not None:
+                counts = session.execute(select(status, func.count()).group_by(status)).all()
+                signature += (frozenset((value, count) for value, count in counts),)
+            signatures[model.__tablename__] = signature
+        return signatures
+
+    def start(self, session) -> None:
+        self.signatures = self._query(session)
+
+    def poll(self, session) -> List[ChangeEvent]:
+        if self.signatures is None:
+            self.start(session)
+            return []
+        current = self._query(session)
+        changed = [table for table, signature in current.items() if self.signatures.get(table) != signature]
+        self.signatures = current
+        return [ChangeEvent(table=table, source=self.name) for table in changed]
+
+class ChangePoller(threading.Thread):
+    """Polls every watch every `interval` seconds and publishes the changes to subscribers."""
+
+    def __init__(self, watches: List[Any], subscribers: Dict[str, List[Callable[[ChangeEvent], Any]]], interval: float = 10.0):
+        super().__init__(name="change-poller", daemon=True)
+        self.watches = watches
+        self.subscribers = subscribers
+        self.interval = interval
+        self.polls = 0
+        self.events = 0
+        self.failures = 0
+        self.last_poll_at: Optional[float] = None
+        self._done = threading.Event()
+
+    def publish(self, event: ChangeEvent) -> None:
+        for callback in self.subscribers.get(event.table, ()):
+            try:
+                callback(event)
+            except Exception as e:
+                log.warning("change_subscriber_failed", extra={"table": event.table, "error": str(e)})
+        self.events += 1
+        log.debug("change_published", extra={
+            "table": event.table, "source": event.source, "rows": len(event.row_ids), "resorts": len(event.resort_ids)
+        })
+
+    def poll_once(self) -> int:
+        """Poll every watch once; returns the number of events published."""
+        published = 0
+        with SessionLocal() as session:
+            for watch in self.watches:
+                for event in watch.poll(session):
+                    self.publish(event)
+                    published += 1
+        self.polls += 1
+        self.last_poll_at = time.time()
+        return published
+
+    def run(self):
+        while True:
+            try:
+                self.poll_once()
+            except Exception as e:
+                # A failed poll keeps its high-water marks and is retried.
+                self.failures += 1
+                log.warning("change_poll_failed", extra={"error": str(e)})
+            if self._done.wait(self.interval):
+                return
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "polls": self.polls,
+            "events": self.events,
+            "failures": self.failures,
+            "last_poll_at": self.last_poll_at,
+            "high_water": {w.name: str(w.high_water) for w in self.watches if isinstance(w, TimestampWatch)}
+        }
@@ -0,0 +1,238 @@
+import threading
+import time
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+from sqlalchemy import func, select
+from src.database.db import SessionLocal
+from src.database.models import PtRtListing, EsPlaceOfInterests, EsPoiLocations
+from tools.cache import cached
+
+EARTH_RADIUS_MILES = 3958.8
+MILES_PER_DEGREE_LAT = 69.0
+# Name matches fetched per table when resolving a place; the first with valid coordinates wins.
+PLACE_CANDIDATES = 10
+
+BASE_LIST_URL = "https://www.go-koala.com/resort/"
+
+def haversine_miles(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Great-circle distance in miles from one point to arrays of points (all in degrees)."""
+    lat1, lon1 = np.radians(lat), np.radians(lon)
+    lat2, lon2 = np.radians(lats), np.radians(lons)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def _parse_coordinate(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def _parse_point(lattitude: Optional[str], longitude: Optional[str]) -> Optional[Tuple[float, float]]:
+    """(lat, lon) from string columns, or None when blank, unparseable, out of range or the 0,0 placeholder."""
+    lat, lon = _parse_coordinate(lattitude), _parse_coordinate(longitude)
+    if lat is None or lon is None or (lat == 0 and lon == 0) or abs(lat) > 90 or abs(lon) > 180:
+        return None
+    return lat, lon
+
+class ResortGeoIndex:
+    """
+    In-memory grid index over resort coordinates from pt_rt_listings.
+
+    Resorts are bucketed into `cell_degrees` lat/lon cells; a radius query
+    only computes distances for resorts in the cells the radius touches.
+    The index checks a cheap (count, last update) signature every
+    `refresh_interval` seconds and rebuilds itself when resorts change.
+    A rebuild publishes (resorts, lats, lons, cells) as one tuple, so a
+    query never mixes cell indices from one build with arrays of another.
+    """
+
+    def __init__(self, cell_degrees: float = 0.5, refresh_interval: float = 300.0):
+        self.cell_degrees = cell_degrees
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self._signature = None
+        # (resorts, lats, lons, cells), replaced as a whole by build().
+        self.view: Tuple[List[Dict[str, Any]], np.ndarray, np.ndarray, Dict[Tuple[int, int], np.ndarray]] = (
+            [], np.empty(0), np.empty(0), {}
+        )
+
+    @property
+    def resorts(self) -> List[Dict[str, Any]]:
+        return self.view[0]
+
+    def _signature_query(self, session):
+        return session.execute(
+            select(func.count(func.distinct(PtRtListing.resort_id)), func.max(PtRtListing.resort_updated_at))
+            .where(PtRtListing.resort_has_deleted == 0)
+        ).one()
+
+    def build(self, session):
+        rows = session.execute(
+            select(
+                PtRtListing.resort_id,
+                func.max(PtRtListing.resort_name).label("resort_name"),
+                func.max(PtRtListing.resort_slug).label("resort_slug"),
+                func.max(PtRtListing.resort_city).label("city"),
+                func.max(PtRtListing.resort_state).label("state"),
+                func.max(PtRtListing.resort_country).label("country"),
+                func.max(PtRtListing.resort_lattitude).label("lattitude"),
+                func.max(PtRtListing.resort_longitude).label("longitude")
+            )
+            .where(PtRtListing.resort_has_deleted == 0)
+            .group_by(PtRtListing.resort_id)
+        ).all()
+
+        resorts, lats, lons = [], [], []
+        for row in rows:
+            point = _parse_point(row.lattitude, row.longitude)
+            if point is None:
+                continue
+            lat, lon = point
+            resorts.append({
+                "resort_id": row.resort_id,
+                "resort_name": row.resort_name,
+                "resort_slug": row.resort_slug,
+                "city": row.city,
+                "state": row.state,
+                "country": row.country
+            })
+            lats.append(lat)
+            lons.append(lon)
+
+        lats, lons = np.array(lats, dtype=np.float64), np.array(lons, dtype=np.float64)
+        keys = np.stack([np.floor(lats / self.cell_degrees), np.floor(lons / self.cell_degrees)], axis=1).astype(np.int64)
+        cells: Dict[Tuple[int, int], List[int]] = {}
+        for index, (i, j) in enumerate(keys.tolist()):
+            cells.setdefault((i, j), []).append(index)
+
+        self.view = (resorts, lats, lons, {key: np.array(indices, dtype=np.int64) for key, indices in cells.items()})
+
+    def stale(self) -> bool:
+        """Whether the next ensure_fresh() would query the database."""
+        return time.monotonic() - self._checked_at >= self.refresh_interval
+
+    def ensure_fresh(self):
+        if not self.stale():
+            return
+        with self._lock:
+            if time.monotonic() - self._checked_at < self.refresh_interval:
+                return
+            with SessionLocal() as session:
+                signature = tuple(self._signature_query(session))
+                if signature != self._signature:
+                    self.build(session)
+                    self._signature = signature
+            self._checked_at = time.monotonic()
+
+    def invalidate(self):
+        """Force a rebuild on the next query."""
+        self._checked_at = 0.0
+        self._signature = None
+
+    def _candidates(self, view, lat: float, lon: float, radius_miles: float) -> np.ndarray:
+        resorts, _, _, cells = view
+        lat_span = radius_miles / MILES_PER_DEGREE_LAT
+        lon_span = radius_miles / (MILES_PER_DEGREE_LAT * max(np.cos(np.radians(lat)), 0.01))
+        i_range = range(int(np.floor((lat - lat_span) / self.cell_degrees)), int(np.floor((lat + lat_span) / self.cell_degrees)) + 1)
+        j_range = range(int(np.floor((lon - lon_span) / self.cell_degrees)), int(np.floor((lon + lon_span) / self.cell_degrees)) + 1)
+        if len(i_range) * len(j_range) > len(cells):
+            return np.arange(len(resorts))
+        found = [cells[(i, j)] for i in i_range for j in j_range if (i, j) in cells]
+        return np.concatenate(found) if found else np.empty(0, dtype=np.int64)
+
+    def nearest(self, lat: float, lon: float, radius_miles: float, limit: int) -> List[Tuple[Dict[str, Any], float]]:
+        self.ensure_fresh()
+        view = self.view
+        resorts, lats, lons, _ = view
+        candidates = self._candidates(view, lat, lon, radius_miles)
+        if candidates.size == 0:
+            return []
+        distances = haversine_miles(lat, lon, lats[candidates], lons[candidates])
+        inside = distances <= radius_miles
+        candidates, distances = candidates[inside], distances[inside]
+        order = np.argsort(distances)[:limit]
+        return [(resorts[candidates[k]], float(distances[k])) for k in order]
+
+RESORT_GEO_INDEX = ResortGeoIndex()
+
+def _resolve_place(place_name: str) -> Optional[Dict[str, Any]]:
+    """
+    Find coordinates for a place of interest (e.g. an airport) or a POI location by name.
+    Matches with blank or invalid coordinates are skipped.
+    """
+    pattern = f"%{place_name.strip()}%"
+    with SessionLocal() as session:
+        pois = session.execute(
+            select(EsPlaceOfInterests)
+            .where(
+                (EsPlaceOfInterests.term.ilike(pattern)) | (EsPlaceOfInterests.full_term.ilike(pattern)),
+                EsPlaceOfInterests.lattitude.isnot(None),
+                EsPlaceOfInterests.longitude.isnot(None)
+            )
+            .limit(PLACE_CANDIDATES)
+        ).scalars().all()
+        for poi in pois:
+            point = _parse_point(poi.lattitude, poi.longitude)
+            if point is not None:
+                return {"name": poi.full_term or poi.term, "lat": point[0], "lon": point[1]}
+
+        locations = session.execute(
+            select(EsPoiLocations)
+            .where(
+                (EsPoiLocations.name.ilike(pattern)) | (EsPoiLocations.full_name.ilike(pattern)),
+                EsPoiLocations.has_deleted == 0
+            )
+            .limit(PLACE_CANDIDATES)
+        ).scalars().all()
+        for location in locations:
+            point = _parse_point(location.lattitude, location.longitude)
+            if point is not None:
+                return {"name": location.full_name or location.name, "lat": point[0], "lon": point[1]}
+    return None
+
+@cached(ttl=3600, tables=("resorts", "pt_rt_listings", "es_place_of_interests", "es_poi_locations"))
+def search_resorts_near(
+    latitude: Optional[float] = None,
+    longitude: Optional[float] = None,
+    place_name: Optional[str] = None,
+    radius_miles: float = 20,
+    limit: int = 5
+) -> Dict[str, Any]:
+    """
+    Find resorts near a coordinate or a named place of interest, ranked by distance.
+
+    :param latitude: Optional latitude of the center point in degrees.
+    :param longitude: Optional longitude of the center point in degrees.
+    :param place_name: Optional place of interest or area to search around, such as an airport or attraction.
+    :param radius_miles: Search radius in miles (default 20).
+    :param limit: Maximum number of resorts to return (default 5).
+    """
+    origin = None
+    if latitude is not None and longitude is not None:
+        origin = {"name": None, "lat": float(latitude), "lon": float(longitude)}
+    elif place_name:
+        origin = _resolve_place(place_name)
+        if not origin:
+            return {"error": f"Place '{place_name}' not found"}
+    else:
+        return {"error": "Provide latitude and longitude or a place_name."}
+
+    matches = RESORT_GEO_INDEX.nearest(origin["lat"], origin["lon"], float(radius_miles), int(limit))
+    results = [
+        {
+            "resort_id": resort["resort_id"],
+            "resort_name": resort["resort_name"],
+            "city": resort["city"],
+            "state": resort["state"],
+            "country": resort["country"],
+            "distance_miles": round(distance, 1),
+            "url": f"{BASE_LIST_URL}{resort['resort_slug'] or resort['resort_name'].lower().replace(' ', '-')}"
+        }
+        for resort, distance in matches
+    ]
+    return {
+        "center": {"place": origin["name"], "latitude": origin["lat"], "longitude": origin["lon"]},
+        "radius_miles": radius_miles,
+        "results": results or "No resorts found within the radius"
+    }
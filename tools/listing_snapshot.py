@@ -0,0 +1,326 @@
+import os
+import threading
+import time
+from collections import namedtuple
+from typing import Dict, List, Optional, Tuple
+from datetime import date, datetime
+from decimal import ROUND_HALF_UP, Decimal
+import numpy as np
+from sqlalchemy import select
+from src.database.db import SessionLocal
+from src.database.models import PtRtListing, UnitType
+
+CENT = Decimal("0.01")
+SNAPSHOT_ENABLED = os.getenv("KOALA_LISTING_SNAPSHOT", "off").lower() in ("1", "on", "true", "yes")
+
+NUMERIC_COLUMNS = {
+    "id": np.int64,
+    "resort_id": np.int32,
+    "check_in": np.int32,
+    "check_out": np.int32,
+    "price": np.float64,
+    "alive": np.bool_,
+}
+STRING_COLUMNS = ("resort_name", "resort_slug", "price_text", "cancelation_policy", "unit_type", "sleeps")
+
+# Same attributes as the rows of the SQL listing search, so both feed _listing_row_to_dict.
+SnapshotRow = namedtuple("SnapshotRow", [
+    "id", "resort_id", "resort_name", "resort_slug", "listing_check_in", "listing_check_out",
+    "listing_price_night", "price_value", "listing_cancelation_policy_option", "unit_type_name",
+    "sleeps", "unit_type_name_fallback"
+])
+
+def _price(value: Optional[str]) -> Decimal:
+    # Mirrors cast(listing_price_night AS DECIMAL(10, 2)): rounded to cents,
+    # unparseable prices sort as 0.
+    try:
+        return Decimal(value.strip()).quantize(CENT, rounding=ROUND_HALF_UP)
+    except (AttributeError, ArithmeticError):
+        return Decimal(0).quantize(CENT)
+
+class _Strings:
+    """Interned strings for one column; code 0 is None."""
+
+    def __init__(self):
+        self.values: List[Optional[str]] = [None]
+        self.codes: Dict[str, int] = {}
+
+    def code(self, value: Optional[str]) -> int:
+        if value is None:
+            return 0
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def matching(self, needle: str) -> np.ndarray:
+        """Codes of the values containing `needle`, case-insensitively (like ILIKE '%needle%')."""
+        needle = needle.lower()
+        return np.array([code for code, value in enumerate(self.values) if value and needle in value.lower()], dtype=np.int32)
+
+class ListingSnapshot:
+    """
+    Columnar in-process copy of the active future rows of pt_rt_listings.
+
+    Each column is a NumPy array (ids, resort ids, check-in/out as day
+    ordinals, numeric price); text columns are stored as codes into
+    per-column interned string tables. Searches are vectorized masks over
+    the arrays followed by a partial sort of the top rows only.
+
+    Like AvailabilityCalendar, listings changed since the last refresh (by
+    l_updated_at) are applied as a delta; deltas never mutate the arrays a
+    concurrent search is reading, they build new ones and swap them in.
+    Rows that stop being active are masked out rather than removed, so the
+    snapshot is rebuilt (and compacted) every `rebuild_interval` seconds and
+    when the day rolls over.
+    """
+
+    def __init__(self, refresh_interval: float = 30.0, rebuild_interval: float = 3600.0):
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        self._lock = threading.Lock()
+        self._refreshed_at = 0.0
+        self._built_at = 0.0
+        self.origin: Optional[date] = None
+        self.high_water: Optional[datetime] = None
+        # Arrays and the string tables their codes point into, swapped together.
+        self.view: Tuple[Dict[str, np.ndarray], Dict[str, _Strings]] = (
+            self._empty(), {name: _Strings() for name in STRING_COLUMNS}
+        )
+        self._positions: Dict[int, int] = {}
+
+    @staticmethod
+    def _empty() -> Dict[str, np.ndarray]:
+        columns = {name: np.empty(0, dtype=dtype) for name, dtype in NUMERIC_COLUMNS.items()}
+        columns.update({name: np.empty(0, dtype=np.int32) for name in STRING_COLUMNS})
+        return columns
+
+    @staticmethod
+    def _select():
+        return (
+            select(
+                PtRtListing.id,
+                PtRtListing.resort_id,
+                PtRtListing.resort_name,
+                PtRtListing.resort_slug,
+                PtRtListing.listing_check_in,
+                PtRtListing.listing_check_out,
+                PtRtListing.listing_price_night,
+                PtRtListing.listing_cancelation_policy_option,
+                PtRtListing.unit_type_name,
+                PtRtListing.listing_status,
+                PtRtListing.listing_has_deleted,
+                PtRtListing.l_updated_at,
+                UnitType.id.label("unit_type_id"),
+                UnitType.sleeps,
+                UnitType.name.label("unit_type_name_fallback")
+            )
+            .outerjoin(UnitType, PtRtListing.unit_type_id == UnitType.id)
+        )
+
+    def _live(self, row) -> bool:
+        # Same rows the SQL search can return: active, not deleted, with a unit type, not yet started.
+        return (
+            row.listing_status == "active"
+            and not row.listing_has_deleted
+            and row.unit_type_id is not None
+            and row.listing_check_in is not None
+            and row.listing_check_out is not None
+            and row.listing_check_in.date() >= self.origin
+        )
+
+    @staticmethod
+    def _encode(row, s: Dict[str, _Strings]) -> Tuple:
+        return (
+            row.id,
+            row.resort_id,
+            row.listing_check_in.toordinal(),
+            row.listing_check_out.toordinal(),
+            float(_price(row.listing_price_night)),
+            True,
+            s["resort_name"].code(row.resort_name),
+            s["resort_slug"].code(row.resort_slug),
+            s["price_text"].code(row.listing_price_night),
+            s["cancelation_policy"].code(row.listing_cancelation_policy_option),
+            s["unit_type"].code(row.unit_type_name or row.unit_type_name_fallback),
+            s["sleeps"].code(row.sleeps)
+        )
+
+    @classmethod
+    def _arrays(cls, encoded: List[Tuple]) -> Dict[str, np.ndarray]:
+        names = list(NUMERIC_COLUMNS) + list(STRING_COLUMNS)
+        dtypes = list(NUMERIC_COLUMNS.values()) + [np.int32] * len(STRING_COLUMNS)
+        if not encoded:
+            return cls._empty()
+        return {
+            name: np.fromiter((values[i] for values in encoded), dtype=dtype, count=len(encoded))
+            for i, (name, dtype) in enumerate(zip(names, dtypes))
+        }
+
+    def _track(self, row) -> None:
+        if row.l_updated_at and (self.high_water is None or row.l_updated_at > self.high_water):
+            self.high_water = row.l_updated_at
+
+    def build(self, session) -> None:
+        with self._lock:
+            self.origin = date.today()
+            self.high_water = None
+            strings = {name: _Strings() for name in STRING_COLUMNS}
+            origin = datetime.combine(self.origin, datetime.min.time())
+            rows = session.execute(
+                self._select().where(
+                    PtRtListing.listing_status == "active",
+                    PtRtListing.listing_has_deleted == 0,
+                    PtRtListing.listing_check_in >= origin
+                )
+            ).all()
+            encoded = []
+            for row in rows:
+                self._track(row)
+                if self._live(row):
+                    encoded.append(self._encode(row, strings))
+            columns = self._arrays(encoded)
+            self.view = (columns, strings)
+            self._positions = {int(listing_id): i for i, listing_id in enumerate(columns["id"])}
+            self._refreshed_at = self._built_at = time.monotonic()
+
+    def apply(self, rows) -> None:
+        """Apply changed listings: update rows in place, append new ones, mask out the rest."""
+        with self._lock:
+            current, strings = self.view
+            columns = {name: array.copy() for name, array in current.items()}
+            appended = []
+            for row in rows:
+                self._track(row)
+                position = self._positions.get(row.id)
+                if not self._live(row):
+                    if position is not None:
+                        columns["alive"][position] = False
+                    continue
+                values = self._encode(row, strings)
+                if position is None:
+                    self._positions[row.id] = len(columns["id"]) + len(appended)
+                    appended.append(values)
+                    continue
+                for name, value in zip(columns, values):
+                    columns[name][position] = value
+            if appended:
+                tail = self._arrays(appended)
+                columns = {name: np.concatenate((array, tail[name])) for name, array in columns.items()}
+            self.view = (columns, strings)
+            self._refreshed_at = time.monotonic()
+
+    def refresh(self, session) -> None:
+        """Apply listings updated since the high-water mark, or rebuild when due."""
+        if (
+            self.origin != date.today()
+            or self.high_water is None
+            or time.monotonic() - self._built_at >= self.rebuild_interval
+        ):
+            self.build(session)
+            return
+        rows = session.execute(
+            self._select()
+            .where(PtRtListing.l_updated_at >= self.high_water)
+            .order_by(PtRtListing.l_updated_at)
+        ).all()
+        self.apply(rows)
+
+    def ensure_fresh(self) -> None:
+        if time.monotonic() - self._refreshed_at < self.refresh_interval and self.origin == date.today():
+            return
+        with SessionLocal() as session:
+            self.refresh(session)
+
+    def expire(self) -> None:
+        """Apply changed listings on the next search instead of waiting for the refresh interval."""
+        self._refreshed_at = 0.0
+
+    def apply_ids(self, listing_ids) -> None:
+        """
+        Re-read the listings with these ids and apply them, whichever
+        timestamp their change bumped (a listing sold with only updated_at
+        set is not seen by the l_updated_at delta).
+        """
+        if not listing_ids or self.high_water is None or self.origin != date.today():
+            self.expire()
+            return
+        with SessionLocal() as session:
+            rows = session.execute(self._select().where(PtRtListing.id.in_(list(listing_ids)))).all()
+        self.apply(rows)
+
+    def invalidate(self) -> None:
+        """Force a full rebuild on the next search."""
+        self._refreshed_at = 0.0
+        self.high_water = None
+
+    def search(
+        self,
+        resort_name: Optional[str] = None,
+        resort_id: Optional[int] = None,
+        check_in: Optional[date] = None,
+        check_out: Optional[date] = None,
+        check_in_range: Optional[Tuple[date, Optional[date]]] = None,
+        limit: int = 10,
+        price_sort: str = "asc",
+        after: Optional[Tuple[Decimal, int]] = None
+    ) -> List[SnapshotRow]:
+        """
+        The first `limit` matching rows ordered by (price, id).
+
+        Filters match the SQL search: resort name substring, resort id, exact
+        check-in/out dates or a check-in range, and the (price, id) seek
+        position of a cursor.
+        """
+        self.ensure_fresh()
+        columns, strings = self.view
+        mask = columns["alive"].copy()
+        if resort_name:
+            mask &= np.isin(columns["resort_name"], strings["resort_name"].matching(resort_name.strip()))
+        if resort_id is not None:
+            mask &= columns["resort_id"] == resort_id
+        if check_in and check_out:
+            mask &= (columns["check_in"] == check_in.toordinal()) & (columns["check_out"] == check_out.toordinal())
+        elif check_in_range:
+            first, last = check_in_range
+            mask &= columns["check_in"] >= first.toordinal()
+            if last is not None:
+                mask &= columns["check_in"] <= last.toordinal()
+
+        descending = price_sort == "desc"
+        price = -columns["price"] if descending else columns["price"]
+        ids = -columns["id"] if descending else columns["id"]
+        if after is not None:
+            after_price = -float(after[0]) if descending else float(after[0])
+            after_id = -after[1] if descending else after[1]
+            mask &= (price > after_price) | ((price == after_price) & (ids > after_id))
+
+        candidates = np.flatnonzero(mask)
+        if limit < candidates.size:
+            # Keep every row priced at or below the limit-th price, then order
+            # only those; ties on the boundary price still sort by id.
+            kth = price[candidates[np.argpartition(price[candidates], limit - 1)[limit - 1]]]
+            candidates = candidates[price[candidates] <= kth]
+        order = candidates[np.lexsort((ids[candidates], price[candidates]))][:limit]
+        return [self._row(columns, strings, i) for i in order]
+
+    @staticmethod
+    def _row(columns: Dict[str, np.ndarray], strings: Dict[str, _Strings], i: int) -> SnapshotRow:
+        text = {name: strings[name].values[columns[name][i]] for name in STRING_COLUMNS}
+        return SnapshotRow(
+            id=int(columns["id"][i]),
+            resort_id=int(columns["resort_id"][i]),
+            resort_name=text["resort_name"],
+            resort_slug=text["resort_slug"],
+            listing_check_in=datetime.fromordinal(int(columns["check_in"][i])),
+            listing_check_out=datetime.fromordinal(int(columns["check_out"][i])),
+            listing_price_night=text["price_text"],
+            price_value=_price(text["price_text"]),
+            listing_cancelation_policy_option=text["cancelation_policy"],
+            unit_type_name=text["unit_type"],
+            sleeps=text["sleeps"],
+            unit_type_name_fallback=None
+        )
+
+LISTING_SNAPSHOT = ListingSnapshot()
@@ -0,0 +1,170 @@
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple
+from sqlalchemy import func, select
+from src.database.db import SessionLocal
+from src.database.models import LocationType, ResortLocationMaster, ResortMigration
+
+def _normalize(value: Optional[str]) -> str:
+    return (value or "").strip().lower()
+
+class LocationTypeIndex:
+    """
+    In-memory inverted indexes over resorts: location type -> resort ids, and
+    country / state / city -> resort ids.
+
+    Location types come from the normalized location_types table (named by
+    resort_location_master); resorts without rows there fall back to the
+    comma-separated ResortMigration.location_types column, split once at
+    build time. Lookups keep the old substring semantics ("beach" matches
+    "Beachfront") by matching against the few distinct keys rather than
+    scanning rows.
+
+    Every `refresh_interval` seconds the index compares a signature of the
+    three tables and rebuilds when it changed. None of them has an
+    updated-at column, so besides (count, max id) the signature sums the
+    flags and foreign keys (soft deletes, status flips, reassigned masters)
+    and the lengths of the text columns it reads (location_types csv,
+    country/state/city, names). An edit that keeps every length is only
+    picked up by the unconditional rebuild every `rebuild_interval`
+    seconds, or sooner through the change feed's invalidate().
+
+    Queries read `view`, a (types, geo, resort_types) tuple that a build
+    replaces in one assignment.
+    """
+
+    GEO_FIELDS = ("country", "state", "city")
+
+    def __init__(self, refresh_interval: float = 300.0, rebuild_interval: float = 3600.0):
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self._built_at = 0.0
+        self._signature = None
+        self.view: Tuple[Dict[str, Set[int]], Dict[str, Dict[str, Set[int]]], Dict[int, List[str]]] = (
+            {}, {field: {} for field in self.GEO_FIELDS}, {}
+        )
+
+    @property
+    def types(self) -> Dict[str, Set[int]]:
+        return self.view[0]
+
+    @property
+    def geo(self) -> Dict[str, Dict[str, Set[int]]]:
+        return self.view[1]
+
+    @property
+    def resort_types(self) -> Dict[int, List[str]]:
+        return self.view[2]
+
+    @staticmethod
+    def _aggregates(model, columns, lengths):
+        total = lambda value: select(func.coalesce(func.sum(value), 0)).scalar_subquery()
+        return (
+            [select(func.count(model.id)).scalar_subquery(), select(func.max(model.id)).scalar_subquery()]
+            + [total(column) for column in columns]
+            + [total(func.length(column)) for column in lengths]
+        )
+
+    def _signature_query(self, session):
+        return session.execute(
+            select(
+                *self._aggregates(
+                    ResortMigration,
+                    [ResortMigration.resort_has_deleted, ResortMigration.resort_id],
+                    [ResortMigration.location_types, ResortMigration.country, ResortMigration.state, ResortMigration.city]
+                ),
+                *self._aggregates(
+                    LocationType,
+                    [LocationType.status, LocationType.resort_id, LocationType.resort_location_master_id],
+                    [LocationType.types]
+                ),
+                *self._aggregates(ResortLocationMaster, [], [ResortLocationMaster.name])
+            )
+        ).one()
+
+    def build(self, session):
+        resorts = session.execute(
+            select(
+                ResortMigration.resort_id,
+                ResortMigration.country,
+                ResortMigration.state,
+                ResortMigration.city,
+                ResortMigration.location_types
+            ).where(ResortMigration.resort_has_deleted == 0)
+        ).all()
+        normalized = session.execute(
+            select(LocationType.resort_id, func.coalesce(ResortLocationMaster.name, LocationType.types))
+            .outerjoin(ResortLocationMaster, LocationType.resort_location_master_id == ResortLocationMaster.id)
+            .where(LocationType.status == 1)
+        ).all()
+
+        resort_types: Dict[int, Set[str]] = {}
+        for resort_id, name in normalized:
+            if name and name.strip():
+                resort_types.setdefault(resort_id, set()).add(name.strip())
+
+        geo: Dict[str, Dict[str, Set[int]]] = {field: {} for field in self.GEO_FIELDS}
+        for row in resorts:
+            for field in self.GEO_FIELDS:
+                key = _normalize(getattr(row, field))
+                if key:
+                    geo[field].setdefault(key, set()).add(row.resort_id)
+            if row.resort_id not in resort_types and row.location_types:
+                names = {t.strip() for t in row.location_types.split(",") if t.strip()}
+                if names:
+                    resort_types[row.resort_id] = names
+
+        types: Dict[str, Set[int]] = {}
+        for resort_id, names in resort_types.items():
+            for name in names:
+                types.setdefault(_normalize(name), set()).add(resort_id)
+
+        self.view = (types, geo, {resort_id: sorted(names) for resort_id, names in resort_types.items()})
+        self._built_at = time.monotonic()
+
+    def ensure_fresh(self):
+        if time.monotonic() - self._checked_at < self.refresh_interval:
+            return
+        with self._lock:
+            if time.monotonic() - self._checked_at < self.refresh_interval:
+                return
+            with SessionLocal() as session:
+                signature = tuple(self._signature_query(session))
+                if signature != self._signature or time.monotonic() - self._built_at >= self.rebuild_interval:
+                    self.build(session)
+                    self._signature = signature
+            self._checked_at = time.monotonic()
+
+    def invalidate(self):
+        """Force a rebuild on the next query."""
+        self._checked_at = 0.0
+        self._signature = None
+
+    @staticmethod
+    def _match(postings: Dict[str, Set[int]], term: str) -> Set[int]:
+        needle = _normalize(term)
+        matched: Set[int] = set()
+        for key, ids in postings.items():
+            if needle in key:
+                matched |= ids
+        return matched
+
+    def resort_ids(
+        self,
+        location_type: str,
+        country: Optional[str] = None,
+        state: Optional[str] = None,
+        city: Optional[str] = None
+    ) -> Set[int]:
+        """Resort ids with a matching location type, intersected with any country/state/city given."""
+        self.ensure_fresh()
+        types, geo, _ = self.view
+        ids = self._match(types, location_type)
+        for field, term in (("country", country), ("state", state), ("city", city)):
+            if ids and term and term.strip():
+                ids &= self._match(geo[field], term)
+        return ids
+
+LOCATION_TYPE_INDEX = LocationTypeIndex()
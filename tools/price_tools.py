@@ -0,0 +1,154 @@
+from typing import List, Dict, Any, Optional
+from datetime import datetime
+from sqlalchemy import func, select, cast, case, extract, Numeric
+from src.database.db import SessionLocal
+from src.database.models import PtRtListing
+from tools.cache import cached
+
+PRICE_GROUPS = ("resort", "unit_type", "month")
+# Aggregates groups can be ordered by; prices ascending, listings descending.
+PRICE_ORDERS = ("median_price", "min_price", "avg_price", "max_price", "listings", "group")
+
+def _round(value) -> Optional[float]:
+    return None if value is None else round(float(value), 2)
+
+@cached(ttl=600, tables=("pt_rt_listings",))
+def get_price_stats(
+    resort_name: Optional[str] = None,
+    resort_id: Optional[int] = None,
+    unit_type: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    group_by: Optional[List[str]] = None,
+    order_by: Optional[str] = None,
+    limit: int = 24
+) -> Dict[str, Any]:
+    """
+    Get min, median, average and max nightly prices of available future listings, grouped by resort, unit type and/or month.
+
+    :param resort_name: Optional name of the resort to filter by.
+    :param resort_id: Optional ID of the resort to filter by.
+    :param unit_type: Optional unit type to filter by, such as 1 Bedroom or Studio.
+    :param start_date: Optional earliest check-in date (YYYY-MM-DD), defaults to today.
+    :param end_date: Optional latest check-in date (YYYY-MM-DD).
+    :param group_by: Any of resort, unit_type, month (default month). Use month to find the cheapest month.
+    :param order_by: Order of the groups, one of median_price, min_price, avg_price, max_price (cheapest first), listings (most first) or group (by month, resort or unit type). Defaults to group for month alone, median_price otherwise.
+    :param limit: Maximum number of groups to return (default 24).
+    """
+    if isinstance(group_by, str):
+        group_by = [group_by]
+    group_by = [g for g in (group_by or ["month"]) if g in PRICE_GROUPS]
+    if not group_by:
+        return {"error": f"group_by must contain one of: {', '.join(PRICE_GROUPS)}"}
+    order_by = order_by or ("group" if group_by == ["month"] else "median_price")
+    if order_by not in PRICE_ORDERS:
+        return {"error": f"order_by must be one of: {', '.join(PRICE_ORDERS)}"}
+
+    try:
+        start = datetime.strptime(start_date, "%Y-%m-%d") if start_date else None
+        end = datetime.strptime(end_date, "%Y-%m-%d") if end_date else None
+    except ValueError:
+        return {"error": "Dates must be in YYYY-MM-DD format"}
+    today = datetime.combine(datetime.today().date(), datetime.min.time())
+    start = max(start, today) if start else today
+
+    price = cast(PtRtListing.listing_price_night, Numeric(10, 2))
+    group_cols = []
+    if "resort" in group_by:
+        group_cols += [PtRtListing.resort_id.label("resort_id"), PtRtListing.resort_name.label("resort_name")]
+    if "unit_type" in group_by:
+        group_cols.append(PtRtListing.unit_type_name.label("unit_type"))
+    if "month" in group_by:
+        group_cols += [
+            extract("year", PtRtListing.listing_check_in).label("year"),
+            extract("month", PtRtListing.listing_check_in).label("month")
+        ]
+
+    conditions = [
+        PtRtListing.listing_status == "active",
+        PtRtListing.listing_has_deleted == 0,
+        PtRtListing.listing_check_in >= start,
+        price > 0
+    ]
+    if end:
+        conditions.append(PtRtListing.listing_check_in <= end)
+    if resort_name:
+        conditions.append(PtRtListing.resort_name.ilike(f"%{resort_name.strip()}%"))
+    if resort_id:
+        try:
+            conditions.append(PtRtListing.resort_id == int(resort_id))
+        except (ValueError, TypeError):
+            pass
+    if unit_type:
+        conditions.append(PtRtListing.unit_type_name.ilike(f"%{unit_type.strip()}%"))
+
+    # Rank prices inside each group so the median comes out of the same
+    # statement as min/avg/max: it is the mean of the middle one or two rows.
+    ranked = (
+        select(
+            *group_cols,
+            price.label("price"),
+            func.row_number().over(partition_by=group_cols, order_by=price).label("rn"),
+            func.count().over(partition_by=group_cols).label("cnt")
+        )
+        .where(*conditions)
+        .subquery()
+    )
+    keys = [ranked.c[col.name] for col in group_cols]
+    middle = ranked.c.rn.in_([(ranked.c.cnt + 1) // 2, (ranked.c.cnt + 2) // 2])
+    aggregates = {
+        "listings": func.count(),
+        "min_price": func.min(ranked.c.price),
+        "median_price": func.avg(case((middle, ranked.c.price))),
+        "avg_price": func.avg(ranked.c.price),
+        "max_price": func.max(ranked.c.price)
+    }
+    if order_by == "group":
+        order = keys
+    elif order_by == "listings":
+        order = [aggregates["listings"].desc(), *keys]
+    else:
+        order = [aggregates[order_by], *keys]
+    stmt = (
+        select(
+            *keys,
+            *(value.label(name) for name, value in aggregates.items()),
+            # Groups before the limit, so a cut list can say so.
+            func.count().over().label("total_groups")
+        )
+        .group_by(*keys)
+        .order_by(*order)
+        .limit(limit)
+    )
+
+    with SessionLocal() as session:
+        rows = session.execute(stmt).all()
+
+    groups = []
+    for row in rows:
+        group = {}
+        if "resort" in group_by:
+            group["resort_id"] = row.resort_id
+            group["resort_name"] = row.resort_name
+        if "unit_type" in group_by:
+            group["unit_type"] = row.unit_type
+        if "month" in group_by:
+            group["month"] = f"{int(row.year):04d}-{int(row.month):02d}"
+        group.update({
+            "listings": row.listings,
+            "min_price": _round(row.min_price),
+            "median_price": _round(row.median_price),
+            "avg_price": _round(row.avg_price),
+            "max_price": _round(row.max_price)
+        })
+        groups.append(group)
+
+    total_groups = rows[0].total_groups if rows else 0
+    return {
+        "group_by": group_by,
+        "order_by": order_by,
+        "price_unit": "USD per night",
+        "groups": groups or "No listings found",
+        "total_groups": total_groups,
+        "truncated": total_groups > len(groups)
+    }
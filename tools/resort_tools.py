@@ -1,7 +1,11 @@
 from typing import List, Dict, Any, Optional
 from sqlalchemy.orm import Session
-from sqlalchemy import func, or_
-from src.database.db import SessionLocal
+from sqlalchemy import func, or_, case, select, lambda_stmt, true
+from sqlalchemy.exc import DBAPIError
+from src.database.db import SessionLocal, DeadlineExceeded
+from tools.location_index import LOCATION_TYPE_INDEX
+from tools.amenity_matcher import AMENITY_MATCHER
+from tools.cache import cached
 from src.database.models import Resort, Amenity, ResortAmenity, ResortImage, ResortReview, User, UnitType, Listing, Booking, ResortMigration, EsPoiLocations, EsPlaceOfInterests, PtRtListing
 
 CATEGORY_MAPPING = {
@@ -13,6 +17,7 @@ CATEGORY_MAPPING = {
 
 BASE_URL = "https://koalaadmin-prod.s3.us-east-2.amazonaws.com/uploads/resorts"
 
+@cached(ttl=3600, tables=("resorts", "es_poi_locations", "es_place_of_interests"))
 def get_city_from_resort(resort_name: str, categories: List[str] = None) -> Dict[str, Any]:
     with SessionLocal() as session:
         try:
@@ -71,9 +76,66 @@ def get_city_from_resort(resort_name: str, categories: List[str] = None) -> Dict
                 },
                 "pois": results or "No POIs found"
             }
+        except (DBAPIError, DeadlineExceeded):
+            raise
         except Exception as e:
             return {"error": str(e)}
 
+# Active listing counts per resort. Built once; every get_available_resorts
+# call reuses it inside a cached lambda statement.
+_ACTIVE_LISTING_COUNTS = (
+    select(
+        PtRtListing.resort_id,
+        func.count(PtRtListing.id).label("active_count")
+    )
+    .where(
+        PtRtListing.listing_status == "active",
+        PtRtListing.listing_has_deleted == 0
+    )
+    .group_by(PtRtListing.resort_id)
+    .subquery()
+)
+
+def _available_resorts_stmt(
+    country: str = None,
+    city: str = None,
+    state: str = None,
+    resort_status: str = "active",
+    limit: int = 10,
+    resort_ids: Optional[List[int]] = None
+):
+    """
+    Resorts ranked by active listings. `resort_ids` (already narrowed by
+    location type and country/state/city in LOCATION_TYPE_INDEX) replaces
+    the location filters when given.
+    """
+    listing_subq = _ACTIVE_LISTING_COUNTS
+    stmt = lambda_stmt(
+        lambda: select(ResortMigration, listing_subq.c.active_count)
+        .join(listing_subq, ResortMigration.resort_id == listing_subq.c.resort_id)
+        .where(
+            ResortMigration.resort_has_deleted == 0,
+            ResortMigration.resort_status == resort_status
+        )
+    )
+
+    if resort_ids is not None:
+        stmt += lambda s: s.where(ResortMigration.resort_id.in_(resort_ids))
+    else:
+        if country:
+            country_pattern = f"%{country.strip()}%"
+            stmt += lambda s: s.where(ResortMigration.country.ilike(country_pattern))
+        if city:
+            city_pattern = f"%{city.strip()}%"
+            stmt += lambda s: s.where(ResortMigration.city.ilike(city_pattern))
+        if state:
+            state_pattern = f"%{state.strip()}%"
+            stmt += lambda s: s.where(ResortMigration.state.ilike(state_pattern))
+
+    stmt += lambda s: s.order_by(listing_subq.c.active_count.desc()).limit(limit)
+    return stmt
+
+@cached(ttl=1800, tables=("resort_migration", "location_types", "resort_location_master", "pt_rt_listings", "resorts"))
 def get_available_resorts(
     country: str = None,
     city: str = None,
@@ -84,40 +146,22 @@ def get_available_resorts(
 ) -> List[Dict[str, Any]]:
     with SessionLocal() as session:
         try:
-            listing_subq = (
-                session.query(
-                    PtRtListing.resort_id,
-                    func.count(PtRtListing.id).label("active_count")
-                )
-                .filter(
-                    PtRtListing.listing_status == "active",
-                    PtRtListing.listing_has_deleted == 0
-                )
-                .group_by(PtRtListing.resort_id)
-                .order_by(func.count(PtRtListing.id).desc())
-                .subquery()
-            )
-
-            query = (
-                session.query(ResortMigration, listing_subq.c.active_count)
-                .join(listing_subq, ResortMigration.resort_id == listing_subq.c.resort_id)
-                .filter(ResortMigration.resort_has_deleted == 0)
-                .filter(ResortMigration.resort_status == resort_status)
-            )
-
-            if country:
-                query = query.filter(ResortMigration.country.ilike(f"%{country.strip()}%"))
-            if city:
-                query = query.filter(ResortMigration.city.ilike(f"%{city.strip()}%"))
-            if state:
-                query = query.filter(ResortMigration.state.ilike(f"%{state.strip()}%"))
-            if location_type:
-                query = query.filter(ResortMigration.location_types.ilike(f"%{location_type.strip()}%"))
-
-            resorts = query.order_by(listing_subq.c.active_count.desc()).limit(limit).all()
+            index = LOCATION_TYPE_INDEX
+            resort_ids = None
+            if location_type and location_type.strip():
+                resort_ids = sorted(index.resort_ids(location_type, country=country, state=state, city=city))
+                if not resort_ids:
+                    return []
+            else:
+                index.ensure_fresh()
+            stmt = _available_resorts_stmt(country, city, state, resort_status, limit, resort_ids)
+            resorts = session.execute(stmt).all()
 
             result = []
             for resort, active_count in resorts:
+                location_types = index.resort_types.get(resort.resort_id)
+                if location_types is None:
+                    location_types = [t.strip() for t in resort.location_types.split(",")] if resort.location_types else []
                 result.append({
                     "id": resort.id,
                     "resort_id": resort.resort_id,
@@ -127,15 +171,136 @@ def get_available_resorts(
                     "country": resort.country,
                     "address": resort.address,
                     "resort_slug": resort.resort_slug,
-                    "location_types": [t.strip() for t in resort.location_types.split(",")] if resort.location_types else [],
+                    "location_types": location_types,
                     "resort_status": resort.resort_status,
                     "resort_google_rating": resort.resort_google_rating,
                     "active_listings_count": active_count
                 })
             return result
+        except (DBAPIError, DeadlineExceeded):
+            raise
         except Exception as e:
             return [{"error": str(e)}]
 
+# Correlated per-resort summaries, selected alongside the resort itself so
+# a details lookup costs one statement instead of one per summary.
+_TOP_IMAGE = (
+    select(ResortImage.image)
+    .where(ResortImage.resort_id == Resort.id)
+    .order_by(ResortImage.image_order.asc())
+    .limit(1)
+    .correlate(Resort)
+    .scalar_subquery()
+    .label("top_image")
+)
+
+_LISTING_COUNTS = {
+    status: (
+        select(func.count(Listing.id))
+        .where(Listing.resort_id == Resort.id, Listing.has_deleted == 0, Listing.status == status)
+        .correlate(Resort)
+        .scalar_subquery()
+        .label(f"{status}_count")
+    )
+    for status in ("active", "pending", "booked")
+}
+
+def _resort_lookup_stmt(rid: Optional[int], names: List[str], with_summary: bool = True):
+    """
+    One statement resolving a resort by ID, then by each name pattern in
+    order of preference, optionally with its top image and listing counts.
+    """
+    matches = ([Resort.id == rid] if rid is not None else []) + [Resort.name.ilike(f"%{name}%") for name in names]
+    columns = [Resort]
+    if with_summary:
+        columns += [_TOP_IMAGE, *_LISTING_COUNTS.values()]
+    return (
+        select(*columns)
+        .where(Resort.has_deleted == 0, or_(*matches))
+        .order_by(case(*[(match, rank) for rank, match in enumerate(matches)], else_=len(matches)), Resort.id)
+        .limit(1)
+    )
+
+def _resorts_by_ids_stmt(ids: List[int], with_summary: bool = True):
+    columns = [Resort]
+    if with_summary:
+        columns += [_TOP_IMAGE, *_LISTING_COUNTS.values()]
+    return select(*columns).where(Resort.id.in_(ids), Resort.has_deleted == 0)
+
+def _resort_amenities_stmt(ids: List[int]):
+    return lambda_stmt(
+        lambda: select(ResortAmenity.resort_id, Amenity.id, Amenity.name)
+        .join(ResortAmenity, ResortAmenity.amenity_id == Amenity.id)
+        .where(ResortAmenity.resort_id.in_(ids))
+    )
+
+def _unit_types_stmt(ids: List[int]):
+    return lambda_stmt(lambda: select(UnitType).where(UnitType.resort_id.in_(ids), UnitType.has_deleted == 0))
+
+def _top_reviews_stmt(ids: List[int]):
+    def ranked_reviews():
+        ranked = (
+            select(
+                ResortReview.resort_id,
+                ResortReview.author_name,
+                ResortReview.rating,
+                ResortReview.text,
+                func.row_number().over(
+                    partition_by=ResortReview.resort_id,
+                    order_by=ResortReview.rating.desc()
+                ).label("rn")
+            )
+            .where(ResortReview.resort_id.in_(ids))
+            .subquery()
+        )
+        return select(ranked).where(ranked.c.rn <= 3).order_by(ranked.c.resort_id, ranked.c.rn)
+    return lambda_stmt(ranked_reviews)
+
+def _resort_details(session: Session, rows, amenities_only: bool = False) -> Dict[int, Dict[str, Any]]:
+    """
+    Details for resort rows from _resort_lookup_stmt or _resorts_by_ids_stmt,
+    keyed by resort ID. Costs the same three statements however many
+    resorts are passed (one when `amenities_only`).
+    """
+    ids = [row[0].id for row in rows]
+    amenities: Dict[int, List[Dict[str, Any]]] = {rid: [] for rid in ids}
+    for a in session.execute(_resort_amenities_stmt(ids)).all():
+        amenities[a.resort_id].append({"id": a.id, "name": a.name})
+
+    if amenities_only:
+        return {
+            row[0].id: {"resort_id": row[0].id, "resort_name": row[0].name, "amenities": amenities[row[0].id]}
+            for row in rows
+        }
+
+    unit_types: Dict[int, List[Dict[str, Any]]] = {rid: [] for rid in ids}
+    for ut in session.execute(_unit_types_stmt(ids)).scalars().all():
+        unit_types[ut.resort_id].append({"id": ut.id, "name": ut.name})
+
+    reviews: Dict[int, List[Dict[str, Any]]] = {rid: [] for rid in ids}
+    for review in session.execute(_top_reviews_stmt(ids)).all():
+        reviews[review.resort_id].append(
+            {"author_name": review.author_name, "rating": review.rating, "text": review.text}
+        )
+
+    details = {}
+    for row in rows:
+        resort = row[0]
+        details[resort.id] = {
+            "id": resort.id,
+            "name": resort.name,
+            "address": resort.address,
+            "city": resort.city,
+            "description": resort.description,
+            "unit_types": unit_types[resort.id],
+            "listings_by_status": {status: getattr(row, f"{status}_count") for status in _LISTING_COUNTS},
+            "top_image": {"url": f"{BASE_URL}/{resort.id}/{row.top_image}"} if row.top_image else None,
+            "amenities": amenities[resort.id],
+            "reviews": reviews[resort.id]
+        }
+    return details
+
+@cached(ttl=3600, tables=("resorts", "amenities", "resort_amenities", "resort_images", "resort_reviews", "unit_types", "listings"))
 def get_resort_details(
     resort_id: Optional[int] = None,
     resort_name: Optional[str] = None,  
@@ -147,162 +312,138 @@ def get_resort_details(
     session: Session = SessionLocal()
     try:
         if list_resorts_with_amenities:
-            resorts = session.query(Resort).filter(Resort.has_deleted == 0).limit(limit).all()
+            resorts = session.execute(
+                lambda_stmt(lambda: select(Resort.id, Resort.name).where(Resort.has_deleted == 0).limit(limit))
+            ).all()
+            amenities_by_resort: Dict[int, List[Dict[str, Any]]] = {r.id: [] for r in resorts}
+            amenity_ids = set().union(*AMENITY_MATCHER.match(amenities_list)) if amenities_list else None
+            if resorts and amenity_ids != set():
+                rows = session.execute(
+                    select(ResortAmenity.resort_id, Amenity.id, Amenity.name)
+                    .join(Amenity, ResortAmenity.amenity_id == Amenity.id)
+                    .where(
+                        ResortAmenity.resort_id.in_(list(amenities_by_resort)),
+                        ResortAmenity.amenity_id.in_(sorted(amenity_ids)) if amenity_ids else true()
+                    )
+                ).all()
+                for row in rows:
+                    amenities_by_resort[row.resort_id].append({"id": row.id, "name": row.name})
             return {
                 "resorts_with_amenities": [
-                    {
-                        "resort_id": r.id,
-                        "resort_name": r.name,
-                        "amenities": [
-                            {"id": a.id, "name": a.name}
-                            for a in session.query(Amenity.id, Amenity.name)
-                            .join(ResortAmenity, ResortAmenity.amenity_id == Amenity.id)
-                            .filter(
-                                ResortAmenity.resort_id == r.id,
-                                or_(*[Amenity.name.ilike(f"%{amenity}%") for amenity in amenities_list])
-                                if amenities_list else True
-                            )
-                            .all()
-                        ]
-                    }
+                    {"resort_id": r.id, "resort_name": r.name, "amenities": amenities_by_resort[r.id]}
                     for r in resorts
                 ]
             }
         elif resort_id or resort_name:
-            resort = None
-            
-            # 1. Try by ID first if provided
+            rid = None
             if resort_id:
                 try:
-                    # Ensure it's an integer
                     rid = int(resort_id)
-                    resort = session.query(Resort).filter(Resort.id == rid, Resort.has_deleted == 0).first()
                 except (ValueError, TypeError):
                     pass # Not a valid integer ID
-            
-            # 2. Try by Name if ID failed or wasn't provided
-            if not resort and resort_name:
+
+            # ID first, then the full name, then (for long names) the last two
+            # words, which usually hold the core name
+            # (e.g., "Club Wyndham Bonnet Creek" -> "Bonnet Creek").
+            names = []
+            if resort_name:
                 name_search = resort_name.strip()
-                resort = session.query(Resort).filter(Resort.name.ilike(f"%{name_search}%"), Resort.has_deleted == 0).first()
-                
-                # 3. Fuzzy fallback: If name is long, try matching parts of it 
-                # (e.g., "Club Wyndham Bonnet Creek" -> try "Bonnet Creek")
-                if not resort and len(name_search.split()) > 2:
-                    words = name_search.split()
-                    # Try the last two words which usually contain the core name
-                    short_name = " ".join(words[-2:])
-                    resort = session.query(Resort).filter(Resort.name.ilike(f"%{short_name}%"), Resort.has_deleted == 0).first()
+                names.append(name_search)
+                if len(name_search.split()) > 2:
+                    names.append(" ".join(name_search.split()[-2:]))
 
-            if not resort:
+            row = None
+            if rid is not None or names:
+                row = session.execute(_resort_lookup_stmt(rid, names, with_summary=not amenities_only)).first()
+            if not row:
                 return {"error": "Resort not found."}
-
-            amenities_data = [
-                {"id": a.id, "name": a.name}
-                for a in session.query(Amenity.id, Amenity.name)
-                .join(ResortAmenity, ResortAmenity.amenity_id == Amenity.id)
-                .filter(ResortAmenity.resort_id == resort.id)
-                .all()
-            ]
-
-            if amenities_only:
-                return {
-                    "resort_id": resort.id,
-                    "resort_name": resort.name,
-                    "amenities": amenities_data
-                }
-
-            top_image = (
-                session.query(ResortImage)
-                .filter(ResortImage.resort_id == resort.id)
-                .order_by(ResortImage.image_order.asc())
-                .first()
-            )
-            image_data = (
-                {"url": f"{BASE_URL}/{resort.id}/{top_image.image}"}
-                if top_image and top_image.image
-                else None
-            )
-
-            unit_types = session.query(UnitType).filter(
-                UnitType.resort_id == resort.id, UnitType.has_deleted == 0
-            ).all()
-
-            listings_stats = {
-                status: session.query(Listing).filter(
-                    Listing.resort_id == resort.id,
-                    Listing.has_deleted == 0,
-                    Listing.status == status
-                ).count()
-                for status in ['active', 'pending', 'booked']
-            }
-
-            reviews = (
-                session.query(ResortReview)
-                .filter(ResortReview.resort_id == resort.id)
-                .order_by(ResortReview.rating.desc())
-                .limit(3)
-                .all()
-            )
-            reviews_data = [
-                {"author_name": review.author_name, "rating": review.rating, "text": review.text}
-                for review in reviews
-            ]
-
-            return {
-                "id": resort.id,
-                "name": resort.name,
-                "address": resort.address,
-                "city": resort.city,
-                "description": resort.description,
-                "unit_types": [{"id": ut.id, "name": ut.name} for ut in unit_types],
-                "listings_by_status": listings_stats,
-                "top_image": image_data,
-                "amenities": amenities_data,
-                "reviews": reviews_data
-            }
+            return _resort_details(session, [row], amenities_only)[row[0].id]
         return {"error": "Missing parameters."}
+    except (DBAPIError, DeadlineExceeded):
+        raise
     except Exception as e:
         return {"error": str(e)}
     finally:
         session.close()
 
+def _batch_resort_id(kwargs: Dict[str, Any]) -> Optional[int]:
+    try:
+        return int(kwargs.get("resort_id"))
+    except (ValueError, TypeError):
+        return None
+
+def resort_details_batchable(kwargs: Dict[str, Any]) -> bool:
+    """Whether a get_resort_details call can be served by get_resort_details_batch."""
+    return not kwargs.get("list_resorts_with_amenities") and _batch_resort_id(kwargs) is not None
+
+def get_resort_details_batch(calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Serve several get_resort_details calls by resort ID with one set of
+    statements (`resort_id IN (...)`), returning one result per call.
+
+    A call whose ID is not found falls back to get_resort_details, so a
+    resort_name on it is still honoured.
+    """
+    ids = sorted({_batch_resort_id(kwargs) for kwargs in calls})
+    with SessionLocal() as session:
+        rows = session.execute(_resorts_by_ids_stmt(ids)).all()
+        details = _resort_details(session, rows) if rows else {}
+
+    results = []
+    for kwargs in calls:
+        found = details.get(_batch_resort_id(kwargs))
+        if found is None:
+            results.append(get_resort_details(**kwargs))
+        elif kwargs.get("amenities_only"):
+            results.append({"resort_id": found["id"], "resort_name": found["name"], "amenities": found["amenities"]})
+        else:
+            results.append(found)
+    return results
+
+@cached(ttl=3600, tables=("resorts", "amenities", "resort_amenities"))
 def search_resorts_by_amenities(
     amenities: List[str], 
     limit: int = 5, 
     match_all: bool = True
 ) -> List[Dict[str, Any]]:
+    # Each requested term maps to a group of amenity ids ("pool" -> Indoor
+    # Pool, Outdoor Pool); a resort satisfies a term with any id of its group.
+    groups = [sorted(ids) for ids in AMENITY_MATCHER.match(amenities) if ids]
+    if not groups: return []
+
     session = SessionLocal()
     try:
-        amenity_ids = [
-            a[0] for a in session.query(Amenity.id)
-            .filter(func.lower(Amenity.name).in_([name.lower() for name in amenities]))
-            .all()
-        ]
-        if not amenity_ids: return []
-
         if match_all:
-            subquery = (
-                session.query(ResortAmenity.resort_id)
-                .filter(ResortAmenity.amenity_id.in_(amenity_ids))
-                .group_by(ResortAmenity.resort_id)
-                .having(func.count(func.distinct(ResortAmenity.amenity_id)) == len(amenity_ids))
-                .subquery()
-            )
-            resorts_query = session.query(Resort).filter(Resort.id.in_(subquery))
+            resorts_query = session.query(Resort.id, Resort.name).filter(*[
+                Resort.id.in_(select(ResortAmenity.resort_id).where(ResortAmenity.amenity_id.in_(group)))
+                for group in groups
+            ])
         else:
+            amenity_ids = sorted({amenity_id for group in groups for amenity_id in group})
             resorts_query = (
-                session.query(Resort)
+                session.query(Resort.id, Resort.name)
                 .join(ResortAmenity, Resort.id == ResortAmenity.resort_id)
                 .filter(ResortAmenity.amenity_id.in_(amenity_ids))
                 .distinct()
             )
 
         resorts = resorts_query.filter(Resort.has_deleted == 0).limit(limit).all()
+        if not resorts: return []
+
+        amenities_by_resort: Dict[int, List[str]] = {r.id: [] for r in resorts}
+        rows = (
+            session.query(ResortAmenity.resort_id, Amenity.name)
+            .join(Amenity, ResortAmenity.amenity_id == Amenity.id)
+            .filter(ResortAmenity.resort_id.in_(list(amenities_by_resort)))
+            .all()
+        )
+        for resort_id, name in rows:
+            amenities_by_resort[resort_id].append(name)
         return [
             {
                 "resort_id": r.id,
                 "resort_name": r.name,
-                "amenities": [ra.amenity.name for ra in r.resort_amenities]
+                "amenities": amenities_by_resort[r.id]
             }
             for r in resorts
         ]
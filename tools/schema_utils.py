@@ -29,10 +29,11 @@ def get_openai_type(py_type: Any) -> str:
         return "object"
     return "string"  # Default fallback
 
-def generate_schema(func: callable) -> Dict[str, Any]:
+def generate_schema(func: callable, tool_name: Optional[str] = None) -> Dict[str, Any]:
     """
     Generate an OpenAI-compatible function schema from a Python function.
     Uses docstrings for descriptions and type hints for parameter types.
+    `tool_name` overrides the function name, for registry aliases.
     """
     signature = inspect.signature(func)
     type_hints = get_type_hints(func)
@@ -78,7 +79,7 @@ def generate_schema(func: callable) -> Dict[str, Any]:
     return {
         "type": "function",
         "function": {
-            "name": func.__name__,
+            "name": tool_name or func.__name__,
             "description": description,
             "parameters": parameters
         }
@@ -1,9 +1,14 @@
-from typing import List, Dict, Any, Optional
+import base64
+import json
+from typing import List, Dict, Any, Optional, Iterator, Tuple
 from datetime import datetime, timedelta
+from decimal import Decimal
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, or_, cast, Numeric, extract
+from sqlalchemy import func, and_, or_, cast, Numeric, extract, select, lambda_stmt
 from src.database.db import SessionLocal
 from src.database.models import PtRtListing, UnitType, Resort
+from tools.listing_snapshot import LISTING_SNAPSHOT, SNAPSHOT_ENABLED
+from tools.cache import cached
 
 CANCELLATION_POLICY_DESCRIPTIONS = {
     "flexible": "Full refund if canceled at least 3 days before check-in.",
@@ -24,13 +29,136 @@ def normalize_future_dates(check_in_str: str, check_out_str: str):
         co = co.replace(year=co.year + 1)
     return ci.strftime("%Y-%m-%d"), co.strftime("%Y-%m-%d")
 
+def _date_filters(listing_check_in: Optional[str], listing_check_out: Optional[str]):
+    """
+    (check_in, check_out, window_start, window_end): exact dates when both
+    parse, otherwise the check-in window to search instead (the next 90
+    days, or everything from today when the dates were given but invalid).
+    """
+    today = datetime.combine(datetime.today().date(), datetime.min.time())
+    if listing_check_in and listing_check_out:
+        try:
+            ci_str, co_str = normalize_future_dates(listing_check_in, listing_check_out)
+            return datetime.strptime(ci_str, "%Y-%m-%d"), datetime.strptime(co_str, "%Y-%m-%d"), None, None
+        except Exception:
+            return None, None, today, None
+    return None, None, today, today + timedelta(days=90)
+
+def encode_cursor(price: Decimal, listing_id: int, price_sort: str) -> str:
+    """Encode the (price, id) of the last row on a page as an opaque continuation cursor."""
+    payload = json.dumps({"p": str(price), "i": listing_id, "s": price_sort}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[Decimal, int, str]:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    return Decimal(payload["p"]), int(payload["i"]), payload["s"]
+
+def _future_listings_stmt(
+    resort_name: Optional[str] = None,
+    resort_id: Optional[int] = None,
+    listing_check_in: Optional[str] = None,
+    listing_check_out: Optional[str] = None,
+    limit: Optional[int] = 10,
+    price_sort: str = "asc",
+    after: Optional[Tuple[Decimal, int]] = None
+):
+    """
+    Build the cached listing search statement; each branch below is its own cached lambda.
+
+    Rows are ordered by (price, id) so `after` can seek past the last row of the
+    previous page instead of re-reading it. The price is cast to DECIMAL(10, 2)
+    in the select, the seek and the order by alike (MySQL's bare DECIMAL rounds
+    to whole dollars), which a functional index on
+    (CAST(listing_price_night AS DECIMAL(10, 2)), id) can serve.
+    """
+    stmt = lambda_stmt(
+        lambda: select(
+            PtRtListing.id,
+            PtRtListing.resort_id,
+            PtRtListing.resort_name,
+            PtRtListing.resort_slug,
+            PtRtListing.listing_check_in,
+            PtRtListing.listing_check_out,
+            PtRtListing.listing_price_night,
+            cast(PtRtListing.listing_price_night, Numeric(10, 2)).label("price_value"),
+            PtRtListing.listing_cancelation_policy_option,
+            PtRtListing.listing_cancelation_date,
+            PtRtListing.unit_type_name,
+            UnitType.sleeps,
+            UnitType.name.label("unit_type_name_fallback")
+        )
+        .join(UnitType, PtRtListing.unit_type_id == UnitType.id)
+        .where(PtRtListing.listing_status == "active", PtRtListing.listing_has_deleted == 0)
+    )
+
+    if resort_name:
+        name_pattern = f"%{resort_name.strip()}%"
+        stmt += lambda s: s.where(PtRtListing.resort_name.ilike(name_pattern))
+
+    if resort_id:
+        try:
+            rid = int(resort_id)
+            stmt += lambda s: s.where(PtRtListing.resort_id == rid)
+        except (ValueError, TypeError):
+            pass
+
+    # Simplified date logic for MCP
+    ci_date, co_date, window_start, window_end = _date_filters(listing_check_in, listing_check_out)
+    if ci_date:
+        stmt += lambda s: s.where(
+            PtRtListing.listing_check_in == ci_date,
+            PtRtListing.listing_check_out == co_date
+        )
+    elif window_end is None:
+        stmt += lambda s: s.where(PtRtListing.listing_check_in >= window_start)
+    else:
+        stmt += lambda s: s.where(PtRtListing.listing_check_in.between(window_start, window_end))
+
+    if after is not None:
+        after_price, after_id = after
+        if price_sort == "desc":
+            stmt += lambda s: s.where(or_(
+                cast(PtRtListing.listing_price_night, Numeric(10, 2)) < after_price,
+                and_(cast(PtRtListing.listing_price_night, Numeric(10, 2)) == after_price, PtRtListing.id < after_id)
+            ))
+        else:
+            stmt += lambda s: s.where(or_(
+                cast(PtRtListing.listing_price_night, Numeric(10, 2)) > after_price,
+                and_(cast(PtRtListing.listing_price_night, Numeric(10, 2)) == after_price, PtRtListing.id > after_id)
+            ))
+
+    if price_sort == "desc":
+        stmt += lambda s: s.order_by(cast(PtRtListing.listing_price_night, Numeric(10, 2)).desc(), PtRtListing.id.desc())
+    else:
+        stmt += lambda s: s.order_by(cast(PtRtListing.listing_price_night, Numeric(10, 2)).asc(), PtRtListing.id.asc())
+
+    if limit is not None:
+        stmt += lambda s: s.limit(limit)
+    return stmt
+
+def _listing_row_to_dict(row) -> Dict[str, Any]:
+    slug = row.resort_slug or row.resort_name.lower().replace(" ", "-")
+    return {
+        "resort_id": row.resort_id,
+        "resort_name": row.resort_name,
+        "unit_type": row.unit_type_name or row.unit_type_name_fallback,
+        "sleeps": row.sleeps,
+        "check_in": row.listing_check_in.strftime("%Y-%m-%d"),
+        "check_out": row.listing_check_out.strftime("%Y-%m-%d"),
+        "price": f"${row.listing_price_night}",
+        "url": f"{BASE_LIST_URL}{slug}"
+    }
+
+@cached(ttl=1800, tables=("pt_rt_listings", "unit_types", "resorts"))
 def search_available_future_listings_merged(
     resort_name: Optional[str] = None, 
     resort_id: Optional[int] = None,
     listing_check_in: Optional[str] = None, 
     listing_check_out: Optional[str] = None, 
     limit: int = 10,
-    price_sort: str = "asc"
+    price_sort: str = "asc",
+    cursor: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Search for available resort listings with date and price filters.
@@ -41,81 +169,81 @@ def search_available_future_listings_merged(
     :param listing_check_out: Optional check-out date (YYYY-MM-DD).
     :param limit: Maximum number of results to return (default 10).
     :param price_sort: Sort by price, 'asc' (default) or 'desc'.
+    :param cursor: Optional next_cursor from a previous call with the same filters, returns the next page.
     """
+    after = None
+    if cursor:
+        try:
+            after_price, after_id, cursor_sort = decode_cursor(cursor)
+        except Exception:
+            return {"error": "Invalid cursor. Repeat the search without a cursor."}
+        after = (after_price, after_id)
+        price_sort = cursor_sort
+
+    if SNAPSHOT_ENABLED:
+        results = _snapshot_search(resort_name, resort_id, listing_check_in, listing_check_out, limit + 1, price_sort, after)
+        return _listings_page(results, limit, price_sort)
+
     session = SessionLocal()
     try:
-        base_query = (
-            session.query(
-                PtRtListing.id,
-                PtRtListing.resort_id,
-                PtRtListing.resort_name,
-                PtRtListing.resort_slug,
-                PtRtListing.listing_check_in,
-                PtRtListing.listing_check_out,
-                PtRtListing.listing_price_night,
-                PtRtListing.listing_cancelation_policy_option,
-                PtRtListing.listing_cancelation_date,
-                PtRtListing.unit_type_name,
-                UnitType.sleeps,
-                UnitType.name.label("unit_type_name_fallback")
-            )
-            .join(UnitType, PtRtListing.unit_type_id == UnitType.id)
+        stmt = _future_listings_stmt(
+            resort_name, resort_id, listing_check_in, listing_check_out, limit + 1, price_sort, after
         )
+        results = session.execute(stmt).all()
+        return _listings_page(results, limit, price_sort)
+    finally:
+        session.close()
 
-        filter_conditions = []
-        if resort_name:
-            filter_conditions.append(PtRtListing.resort_name.ilike(f"%{resort_name.strip()}%"))
-        
-        if resort_id:
-            try:
-                rid = int(resort_id)
-                filter_conditions.append(PtRtListing.resort_id == rid)
-            except (ValueError, TypeError):
-                pass
-
-        today = datetime.combine(datetime.today().date(), datetime.min.time())
-        ninety_days = today + timedelta(days=90)
-        
-        # Simplified date logic for MCP
-        if listing_check_in and listing_check_out:
-            try:
-                ci_str, co_str = normalize_future_dates(listing_check_in, listing_check_out)
-                ci_date = datetime.strptime(ci_str, "%Y-%m-%d")
-                co_date = datetime.strptime(co_str, "%Y-%m-%d")
-                filter_conditions += [
-                    PtRtListing.listing_check_in == ci_date,
-                    PtRtListing.listing_check_out == co_date
-                ]
-            except Exception:
-                # If date parsing fails, fall back to future window or just skip date filter
-                filter_conditions.append(PtRtListing.listing_check_in >= today)
-        else:
-            filter_conditions.append(PtRtListing.listing_check_in.between(today, ninety_days))
+def _listings_page(results, limit: int, price_sort: str) -> Dict[str, Any]:
+    """Response for up to limit + 1 ordered rows: the first `limit`, and a cursor if there are more."""
+    page = results[:limit]
+    response = {"results": [_listing_row_to_dict(row) for row in page]}
+    if len(results) > limit and page:
+        last = page[-1]
+        response["next_cursor"] = encode_cursor(last.price_value, last.id, price_sort)
+    return response
 
-        query = base_query.filter(and_(*filter_conditions))
-        
-        price_col = cast(PtRtListing.listing_price_night, Numeric)
-        if price_sort == "desc":
-            query = query.order_by(price_col.desc())
-        else:
-            query = query.order_by(price_col.asc())
-
-        results = query.limit(limit).all()
-
-        results_list = []
-        for row in results:
-            slug = row.resort_slug or row.resort_name.lower().replace(" ", "-")
-            results_list.append({
-                "resort_id": row.resort_id,
-                "resort_name": row.resort_name,
-                "unit_type": row.unit_type_name or row.unit_type_name_fallback,
-                "sleeps": row.sleeps,
-                "check_in": row.listing_check_in.strftime("%Y-%m-%d"),
-                "check_out": row.listing_check_out.strftime("%Y-%m-%d"),
-                "price": f"${row.listing_price_night}",
-                "url": f"{BASE_LIST_URL}{slug}"
-            })
-
-        return {"results": results_list}
+def _snapshot_search(resort_name, resort_id, listing_check_in, listing_check_out, limit, price_sort, after):
+    """The listing search answered from the in-process columnar snapshot (KOALA_LISTING_SNAPSHOT)."""
+    rid = None
+    if resort_id:
+        try:
+            rid = int(resort_id)
+        except (ValueError, TypeError):
+            pass
+    ci_date, co_date, window_start, window_end = _date_filters(listing_check_in, listing_check_out)
+    return LISTING_SNAPSHOT.search(
+        resort_name=resort_name,
+        resort_id=rid,
+        check_in=ci_date and ci_date.date(),
+        check_out=co_date and co_date.date(),
+        check_in_range=None if ci_date else (window_start.date(), window_end and window_end.date()),
+        limit=limit,
+        price_sort=price_sort,
+        after=after
+    )
+
+def iter_future_listings(
+    resort_name: Optional[str] = None,
+    resort_id: Optional[int] = None,
+    listing_check_in: Optional[str] = None,
+    listing_check_out: Optional[str] = None,
+    price_sort: str = "asc",
+    batch_size: int = 500
+) -> Iterator[Dict[str, Any]]:
+    """
+    Stream every matching listing with a server-side cursor, for exports.
+
+    Not exposed to the LLM; export_listings.py writes it out as CSV. Rows are
+    fetched `batch_size` at a time so memory stays flat regardless of the
+    result size.
+    """
+    session = SessionLocal()
+    try:
+        stmt = _future_listings_stmt(
+            resort_name, resort_id, listing_check_in, listing_check_out, None, price_sort
+        )
+        for row in session.execute(stmt, execution_options={"yield_per": batch_size}):
+            yield _listing_row_to_dict(row)
     finally:
         session.close()
@@ -0,0 +1,296 @@
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from sqlalchemy import func, select
+from src.database.db import SessionLocal
+from src.database.models import Resort, ResortReview, ResortAmenity, Amenity
+from tools.cache import cached
+
+INDEX_DIR = os.getenv("KOALA_SEMANTIC_INDEX_DIR", os.path.join("indexes", "semantic"))
+ARRAYS = ("terms", "offsets", "postings", "weights", "resort_ids", "ratings")
+# Superseded builds are deleted once they are this old, leaving time for
+# another process that built concurrently to finish loading its own.
+OLD_BUILD_SECONDS = 600
+
+BASE_LIST_URL = "https://www.go-koala.com/resort/"
+
+# Resort names and amenity names describe a resort more precisely than
+# free text, so their terms count this many times.
+FIELD_REPEATS = {"name": 2, "amenities": 2, "description": 1, "reviews": 1}
+
+STOPWORDS = {
+    "a", "an", "and", "any", "are", "as", "at", "be", "but", "by", "can", "do", "for", "from", "get",
+    "has", "have", "i", "in", "is", "it", "its", "looking", "me", "my", "of", "on", "or", "our", "show",
+    "so", "some", "that", "the", "their", "there", "this", "to", "us", "want", "was", "we", "were",
+    "which", "with", "would", "you", "your", "resort", "resorts", "place", "find", "need"
+}
+
+def _stem(word: str) -> str:
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 4 and word.endswith(("ches", "shes", "sses", "xes")):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return [_stem(word) for word in re.findall(r"[a-z0-9]+", (text or "").lower()) if word not in STOPWORDS]
+
+class SemanticIndex:
+    """
+    BM25 index of resorts over their name, description, amenity names and
+    review texts, for free-text requests ("quiet family resort near the
+    beach with good reviews").
+
+    The index is a compressed sparse column layout in plain arrays: sorted
+    `terms`, `offsets` into `postings` (resort rows) and `weights` (the
+    precomputed BM25 contribution of the term to that resort). A query sums
+    the weight slices of its terms with one bincount and takes the top k
+    with argpartition.
+
+    Builds are written as .npy files to a new directory under `directory`
+    and published by atomically replacing the CURRENT pointer; every
+    process memory-maps the current build, so a restart serves searches
+    without rebuilding and replicas share the page cache. A build is stale
+    when the (count, max id) signature of resorts, reviews and resort
+    amenities no longer matches, checked at most every `refresh_interval`
+    seconds.
+    """
+
+    def __init__(self, directory: str = INDEX_DIR, refresh_interval: float = 3600.0, k1: float = 1.2, b: float = 0.75):
+        self.directory = directory
+        self.refresh_interval = refresh_interval
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self.signature: Optional[Tuple] = None
+        self.arrays: Optional[Dict[str, np.ndarray]] = None
+
+    def _signature_query(self, session) -> Tuple:
+        return tuple(session.execute(
+            select(
+                select(func.count(Resort.id)).scalar_subquery(),
+                select(func.max(Resort.id)).scalar_subquery(),
+                select(func.count(ResortReview.id)).scalar_subquery(),
+                select(func.max(ResortReview.id)).scalar_subquery(),
+                select(func.count(ResortAmenity.id)).scalar_subquery(),
+                select(func.max(ResortAmenity.id)).scalar_subquery()
+            )
+        ).one())
+
+    def _documents(self, session) -> Tuple[List[int], List[Counter], List[float]]:
+        resorts = session.execute(
+            select(Resort.id, Resort.name, Resort.description, Resort.highlight_quote)
+            .where(Resort.has_deleted == 0)
+            .order_by(Resort.id)
+        ).all()
+        fields: Dict[int, Dict[str, List[str]]] = {
+            r.id: {"name": [r.name], "description": [r.description, r.highlight_quote], "amenities": [], "reviews": []}
+            for r in resorts
+        }
+        for resort_id, name in session.execute(
+            select(ResortAmenity.resort_id, Amenity.name).join(Amenity, ResortAmenity.amenity_id == Amenity.id)
+        ):
+            if resort_id in fields:
+                fields[resort_id]["amenities"].append(name)
+        ratings: Dict[int, List[float]] = {}
+        for resort_id, text, rating in session.execute(
+            select(ResortReview.resort_id, ResortReview.text, ResortReview.rating)
+        ):
+            if resort_id in fields:
+                fields[resort_id]["reviews"].append(text)
+                try:
+                    ratings.setdefault(resort_id, []).append(float(rating))
+                except (TypeError, ValueError):
+                    pass
+
+        resort_ids, documents, mean_ratings = [], [], []
+        for resort_id, texts in fields.items():
+            counts: Counter = Counter()
+            for field, values in texts.items():
+                for value in values:
+                    for token in tokenize(value):
+                        counts[token] += FIELD_REPEATS[field]
+            resort_ids.append(resort_id)
+            documents.append(counts)
+            scores = ratings.get(resort_id)
+            mean_ratings.append(sum(scores) / len(scores) if scores else np.nan)
+        return resort_ids, documents, mean_ratings
+
+    def _bm25(self, documents: List[Counter]) -> Dict[str, np.ndarray]:
+        lengths = np.array([sum(counts.values()) for counts in documents], dtype=np.float32)
+        average_length = float(lengths.mean()) if len(documents) else 0.0
+        postings_by_term: Dict[str, List[Tuple[int, int]]] = {}
+        for row, counts in enumerate(documents):
+            for term, tf in counts.items():
+                postings_by_term.setdefault(term, []).append((row, tf))
+
+        terms = sorted(postings_by_term)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        rows, frequencies = [], []
+        for index, term in enumerate(terms):
+            entries = postings_by_term[term]
+            offsets[index + 1] = offsets[index] + len(entries)
+            rows.extend(row for row, _ in entries)
+            frequencies.extend(tf for _, tf in entries)
+        postings = np.array(rows, dtype=np.int32)
+        tf = np.array(frequencies, dtype=np.float32)
+
+        document_frequency = np.diff(offsets).astype(np.float32)
+        idf = np.log(1 + (len(documents) - document_frequency + 0.5) / (document_frequency + 0.5))
+        norm = self.k1 * (1 - self.b + self.b * lengths[postings] / max(average_length, 1e-9))
+        weights = np.repeat(idf, np.diff(offsets)) * tf * (self.k1 + 1) / (tf + norm)
+        return {
+            "terms": np.array(terms, dtype=str),
+            "offsets": offsets,
+            "postings": postings,
+            "weights": weights.astype(np.float32)
+        }
+
+    def build(self, session, signature: Tuple) -> None:
+        """Index every resort, write the arrays to disk and switch to the memory-mapped copy."""
+        resort_ids, documents, ratings = self._documents(session)
+        arrays = self._bm25(documents)
+        arrays["resort_ids"] = np.array(resort_ids, dtype=np.int64)
+        arrays["ratings"] = np.array(ratings, dtype=np.float32)
+
+        build_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        path = os.path.join(self.directory, build_id)
+        os.makedirs(path, exist_ok=True)
+        for name in ARRAYS:
+            np.save(os.path.join(path, f"{name}.npy"), arrays[name])
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump({"signature": list(signature), "built_at": time.time()}, f)
+        pointer = os.path.join(self.directory, f"CURRENT.{build_id}")
+        with open(pointer, "w") as f:
+            f.write(build_id)
+        os.replace(pointer, os.path.join(self.directory, "CURRENT"))
+        self._load(build_id)
+        self._remove_old_builds(build_id)
+
+    def _load(self, build_id: str) -> None:
+        path = os.path.join(self.directory, build_id)
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        self.arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in ARRAYS}
+        self.signature = tuple(meta["signature"])
+
+    def load(self) -> bool:
+        """Memory-map the current build from disk, if there is one."""
+        try:
+            with open(os.path.join(self.directory, "CURRENT")) as f:
+                self._load(f.read().strip())
+            return True
+        except (OSError, ValueError, KeyError):
+            return False
+
+    def _remove_old_builds(self, keep: str) -> None:
+        # Unlinking files another process has mapped is safe on POSIX; the
+        # mapping stays valid until that process loads the new build.
+        cutoff = time.time() - OLD_BUILD_SECONDS
+        for entry in os.listdir(self.directory):
+            path = os.path.join(self.directory, entry)
+            if entry != keep and os.path.isdir(path) and os.path.getmtime(path) < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def ensure_fresh(self) -> None:
+        if self.arrays is not None and time.monotonic() - self._checked_at < self.refresh_interval:
+            return
+        with self._lock:
+            if self.arrays is not None and time.monotonic() - self._checked_at < self.refresh_interval:
+                return
+            if self.arrays is None:
+                self.load()
+            with SessionLocal() as session:
+                signature = self._signature_query(session)
+                if signature != self.signature:
+                    self.build(session, signature)
+            self._checked_at = time.monotonic()
+
+    def invalidate(self) -> None:
+        """Check the signature (and rebuild if stale) on the next search."""
+        self._checked_at = 0.0
+
+    def search(self, query: str, limit: int = 5) -> List[Tuple[int, float, Optional[float], List[str]]]:
+        """Top `limit` (resort_id, score, mean rating, matched terms) for a free-text query."""
+        self.ensure_fresh()
+        arrays = self.arrays
+        terms = arrays["terms"]
+        query_terms = list(dict.fromkeys(tokenize(query)))
+        positions = np.searchsorted(terms, query_terms) if query_terms else np.empty(0, dtype=np.int64)
+        found = [
+            (term, int(position)) for term, position in zip(query_terms, positions)
+            if position < len(terms) and terms[position] == term
+        ]
+        if not found:
+            return []
+
+        offsets, postings, weights = arrays["offsets"], arrays["postings"], arrays["weights"]
+        slices = [slice(offsets[position], offsets[position + 1]) for _, position in found]
+        rows = np.concatenate([postings[s] for s in slices])
+        scores = np.bincount(rows, weights=np.concatenate([weights[s] for s in slices]), minlength=len(arrays["resort_ids"]))
+
+        candidates = np.flatnonzero(scores > 0)
+        if limit < candidates.size:
+            candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+        top = candidates[np.argsort(-scores[candidates], kind="stable")]
+
+        matched = {row: [] for row in top.tolist()}
+        for (term, _), s in zip(found, slices):
+            for row in np.intersect1d(postings[s], top).tolist():
+                matched[row].append(term)
+        results = []
+        for row in top.tolist():
+            rating = float(arrays["ratings"][row])
+            results.append((int(arrays["resort_ids"][row]), float(scores[row]), None if np.isnan(rating) else rating, matched[row]))
+        return results
+
+SEMANTIC_INDEX = SemanticIndex()
+
+@cached(ttl=3600, tables=("resorts", "resort_reviews", "amenities", "resort_amenities"))
+def search_resorts_semantic(query: str, limit: int = 5) -> Dict[str, Any]:
+    """
+    Find resorts matching a free-text description of what the user wants, ranked by relevance over resort descriptions, amenities and guest reviews.
+
+    :param query: The user's own words, e.g. "quiet family resort near the beach with good reviews".
+    :param limit: Maximum number of resorts to return (default 5).
+    """
+    try:
+        limit = max(1, min(int(limit), 50))
+    except (ValueError, TypeError):
+        limit = 5
+    ranked = SEMANTIC_INDEX.search(query, limit)
+    if not ranked:
+        return {"query": query, "results": []}
+
+    with SessionLocal() as session:
+        resorts = {
+            r.id: r for r in session.execute(
+                select(Resort.id, Resort.name, Resort.slug, Resort.city, Resort.state, Resort.country)
+                .where(Resort.id.in_([resort_id for resort_id, _, _, _ in ranked]), Resort.has_deleted == 0)
+            )
+        }
+    results = []
+    for resort_id, score, rating, matched in ranked:
+        resort = resorts.get(resort_id)
+        if resort is None:
+            continue
+        results.append({
+            "resort_id": resort_id,
+            "resort_name": resort.name,
+            "location": ", ".join(part for part in (resort.city, resort.state, resort.country) if part),
+            "average_rating": round(rating, 1) if rating is not None else None,
+            "matched_terms": matched,
+            "relevance": round(score, 2),
+            "url": f"{BASE_LIST_URL}{resort.slug}"
+        })
+    return {"query": query, "results": results}
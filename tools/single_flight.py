@@ -0,0 +1,53 @@
+"""
+Single-flight coalescing of identical concurrent tool calls.
+
+While a call is in flight, an identical call (same tool, same arguments)
+joins it and receives the same result instead of running again, so a
+burst of sessions asking for the same resort costs one set of queries.
+Only the in-flight window is shared; once the call finishes the next one
+runs afresh (TOOL_CACHE decides what may be reused after that). Like
+cached values, shared results must be treated as read-only.
+"""
+import threading
+from collections import Counter
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Tuple
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, Future] = {}
+        self.executed: Counter = Counter()
+        self.coalesced: Counter = Counter()
+
+    def submit(self, key: str, group: str, start: Callable[[], Future]) -> Tuple[Future, bool]:
+        """
+        The in-flight future for `key`, or a new one from `start()`.
+        Returns (future, joined); `group` (the tool name) labels the metrics.
+        """
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.coalesced[group] += 1
+                return future, True
+            future = start()
+            self._in_flight[key] = future
+            self.executed[group] += 1
+        future.add_done_callback(lambda done: self._forget(key, done))
+        return future, False
+
+    def _forget(self, key: str, future: Future):
+        with self._lock:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            executed, coalesced = sum(self.executed.values()), sum(self.coalesced.values())
+            return {
+                "in_flight": len(self._in_flight),
+                "executed": executed,
+                "coalesced": coalesced,
+                "coalesced_rate": coalesced / (executed + coalesced) if executed + coalesced else 0.0,
+                "coalesced_by_tool": dict(self.coalesced)
+            }
@@ -0,0 +1,32 @@
+"""
+Local renderings of small, fixed tool results.
+
+Some tools return a handful of constant fields (accepted payment methods,
+the cancellation policy) that the model can only restate. A formatter here
+renders such a result in the assistant's answer style (emoji shortcodes,
+**bold** key details, "•" lists, a closing offer) so chat_turn can answer
+without the final LLM call. Formatters are registered per tool name in
+TEMPLATE_FORMATTERS (tools/__init__.py) and return None for results they
+cannot render, such as errors, which sends the turn back to the model.
+"""
+from typing import Any, Dict, Optional
+
+def format_payment_methods(result: Dict[str, Any], arguments: Dict[str, Any]) -> Optional[str]:
+    methods = result.get("payment_methods") if isinstance(result, dict) else None
+    if not methods:
+        return None
+    lines = "\n".join(f"• {method}" for method in methods)
+    return (
+        f":dollar: **Accepted payment methods**\n\n{lines}\n\n"
+        ":bellhop_bell: Found a stay you like? I can help you book it."
+    )
+
+def format_cancellation_policy(result: Dict[str, Any], arguments: Dict[str, Any]) -> Optional[str]:
+    if not isinstance(result, dict) or not result.get("policy") or not result.get("description"):
+        return None
+    subject = f"listing {arguments['listing_id']}" if arguments.get("listing_id") else "this booking"
+    return (
+        f":label: **Cancellation policy for {subject}: {result['policy'].title()}**\n\n"
+        f"• {result['description']}\n\n"
+        ":calendar: Want me to check listings or dates that fit this policy?"
+    )
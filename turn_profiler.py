@@ -0,0 +1,136 @@
+"""
+On-demand profiling of individual chat turns.
+
+Off by default; nothing is wrapped unless a switch is set, so the cost when
+off is one dictionary lookup per turn. Turn it on for the whole process
+with KOALA_PROFILE=sample|cprofile, optionally only keeping turns slower
+than KOALA_PROFILE_MIN_SECONDS. The `profile` query parameter
+(`?profile=1`, `?profile=cprofile`) turns it on for one session, but only
+when the operator sets KOALA_PROFILE_ALLOW_QUERY=1; otherwise any visitor
+could make every turn write files. Only the newest KOALA_PROFILE_MAX_FILES
+profiles are kept.
+
+"sample" polls the stacks of the turn's thread and the tool executor
+threads every few milliseconds and writes collapsed stacks
+(`<thread_id>-<timestamp>.folded`), the input format of flamegraph.pl,
+speedscope and inferno. Executor threads are shared, so under load their
+stacks may include other sessions' tools. "cprofile" runs the stdlib
+deterministic profiler on the turn's thread only and writes a `.prof`
+file for snakeviz, flameprof or pstats.
+"""
+import cProfile
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Optional
+from structured_logging import get_logger
+
+log = get_logger("profiler")
+
+PROFILE_ENV = os.getenv("KOALA_PROFILE", "")
+PROFILE_DIR = os.getenv("KOALA_PROFILE_DIR", "profiles")
+PROFILE_MIN_SECONDS = float(os.getenv("KOALA_PROFILE_MIN_SECONDS", "0"))
+PROFILE_ALLOW_QUERY = os.getenv("KOALA_PROFILE_ALLOW_QUERY", "").lower() in ("1", "true", "yes")
+PROFILE_MAX_FILES = int(os.getenv("KOALA_PROFILE_MAX_FILES", "200"))
+SAMPLE_INTERVAL = 0.005
+TOOL_THREAD_PREFIX = "tool"
+
+def profile_mode(query_value: Optional[str] = None) -> Optional[str]:
+    """
+    The profiler to use for this turn ("sample" or "cprofile"), or None when
+    off. `query_value` is ignored unless KOALA_PROFILE_ALLOW_QUERY is set.
+    """
+    value = ((query_value if PROFILE_ALLOW_QUERY else None) or PROFILE_ENV).strip().lower()
+    if value in ("1", "true", "yes", "sample"):
+        return "sample"
+    if value == "cprofile":
+        return "cprofile"
+    return None
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class StackSampler(threading.Thread):
+    """Counts collapsed stacks of the watched thread and the tool executor threads."""
+
+    def __init__(self, thread_ident: int, interval: float = SAMPLE_INTERVAL):
+        super().__init__(name="turn-profiler", daemon=True)
+        self.thread_ident = thread_ident
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._done = threading.Event()
+
+    def _watched(self):
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == self.thread_ident:
+                yield "turn", frame
+            elif names.get(ident, "").startswith(TOOL_THREAD_PREFIX):
+                yield names[ident], frame
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            for root, frame in self._watched():
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                # Idle executor threads only wait on their queue; skip them.
+                if root != "turn" and len(labels) <= 4:
+                    continue
+                self.stacks[";".join([root] + labels[::-1])] += 1
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+    def write(self, path: str):
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+def _prune(directory: str, keep: int):
+    """Delete all but the `keep` newest profile files in `directory`."""
+    paths = [
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.endswith((".prof", ".folded"))
+    ]
+    paths.sort(key=os.path.getmtime, reverse=True)
+    for path in paths[keep:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+@contextmanager
+def profile_turn(thread_id: str, mode: str = "sample", directory: str = PROFILE_DIR, min_seconds: float = PROFILE_MIN_SECONDS):
+    """Profile the enclosed block and write a file tagged with the conversation's thread_id."""
+    started = time.perf_counter()
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+    else:
+        profiler = StackSampler(threading.get_ident())
+        profiler.start()
+    try:
+        yield
+    finally:
+        if mode == "cprofile":
+            profiler.disable()
+        else:
+            profiler.stop()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_seconds:
+            os.makedirs(directory, exist_ok=True)
+            extension = "prof" if mode == "cprofile" else "folded"
+            path = os.path.join(directory, f"{thread_id}-{time.strftime('%Y%m%d-%H%M%S')}-{int(elapsed * 1000)}ms.{extension}")
+            if mode == "cprofile":
+                profiler.dump_stats(path)
+            else:
+                profiler.write(path)
+            _prune(directory, PROFILE_MAX_FILES)
+            log.info("turn_profile_written", extra={"path": path, "turn_ms": round(elapsed * 1000, 1)})